@@ -0,0 +1,183 @@
+# answer_cache.py – size-bounded LRU for deterministic answers, keyed on data version
+import copy
+import threading
+from collections import Counter, OrderedDict
+from functools import wraps
+
+import pandas as pd
+
+_MISSING = object()
+
+
+class AnswerCache:
+    """
+    Thread-safe LRU keyed by (intent/tool, parameters, data version).
+
+    Keys embed the data-version token of the tickets they were computed on,
+    so a reload with different tickets simply stops matching old entries;
+    those age out through LRU eviction.
+    """
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate_pct": round(self.hits / total * 100, 1) if total else 0.0,
+        }
+
+
+ANSWERS = AnswerCache()
+
+
+def data_token(obj):
+    """
+    Hashable token identifying the data behind `obj`, or None if unknown.
+
+    Store slices are recognised by the `data_version` attr the `TicketStore`
+    stamps on its frame plus their (contiguous) index span; frames that are
+    not store slices are not cached.
+    """
+    key = getattr(obj, "key", None)
+    if key is not None and not isinstance(obj, (pd.DataFrame, dict)):
+        return key
+    if isinstance(obj, dict):
+        return obj.get("data_version")
+    if isinstance(obj, pd.DataFrame):
+        version = obj.attrs.get("data_version")
+        if version is None:
+            return None
+        if obj.empty:
+            return (version, 0, obj.shape[1])
+        idx = obj.index
+        if idx.dtype.kind != "i":
+            return None
+        lo, hi = int(idx[0]), int(idx[-1])
+        if hi - lo + 1 != len(obj) or (len(obj) > 1 and not idx.is_monotonic_increasing):
+            return None
+        return (version, lo, hi, obj.shape[1])
+    if hasattr(obj, "version"):
+        return obj.version
+    return obj
+
+
+def cached(name: str | None = None, cache: AnswerCache = ANSWERS):
+    """Memoize a deterministic tool on (name, data tokens of its args); hits return a copy."""
+    def deco(fn):
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            pos = [data_token(a) for a in args]
+            kw = {k: data_token(v) for k, v in kwargs.items()}
+            if any(t is None for t in pos) or any(t is None for t in kw.values()):
+                return fn(*args, **kwargs)
+            key = (label, tuple(pos), tuple(sorted(kw.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return fn(*args, **kwargs)
+            return copy.deepcopy(cache.get_or_compute(key, lambda: fn(*args, **kwargs)))
+        return wrapper
+    return deco
+
+
+class SharedMemo(AnswerCache):
+    """
+    `AnswerCache` for intermediates several tools / intents share (window
+    roll-ups, scorecards, telemetry summaries), with per-name counters of
+    computations and reuses. Values are returned as is: treat them as
+    read-only.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        super().__init__(maxsize)
+        self.computed: Counter = Counter()
+        self.reused: Counter = Counter()
+        self.uncacheable: Counter = Counter()
+
+    def clear(self) -> None:
+        super().clear()
+        self.computed.clear()
+        self.reused.clear()
+        self.uncacheable.clear()
+
+    def stats(self) -> dict:
+        names = sorted(set(self.computed) | set(self.reused) | set(self.uncacheable))
+        return {
+            **super().stats(),
+            "reused_total": sum(self.reused.values()),
+            "by_name": {n: {"computed": self.computed[n], "reused": self.reused[n],
+                            "uncacheable": self.uncacheable[n]} for n in names},
+        }
+
+
+INTERMEDIATES = SharedMemo()
+
+
+def shared(name: str | None = None, memo: SharedMemo = INTERMEDIATES):
+    """Memoize an intermediate on (name, data tokens of its args); hits return the same (read-only) object."""
+    def deco(fn):
+        label = name or fn.__name__.lstrip("_")
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (label, tuple(data_token(a) for a in args), tuple(sorted((k, data_token(v)) for k, v in kwargs.items())))
+            try:
+                hash(key)
+                cacheable = None not in key[1] and all(t is not None for _, t in key[2])
+            except TypeError:
+                cacheable = False
+            if not cacheable:
+                memo.uncacheable[label] += 1
+                return fn(*args, **kwargs)
+            value = memo.get(key, _MISSING)
+            if value is _MISSING:
+                value = fn(*args, **kwargs)
+                memo.put(key, value)
+                memo.computed[label] += 1
+            else:
+                memo.reused[label] += 1
+            return value
+        return wrapper
+    return deco
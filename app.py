@@ -1,14 +1,18 @@
 import os
 import random
+from contextlib import nullcontext
 import pandas as pd
 import streamlit as st
 
-from dummy_data_gen import load_data
-from coach_core import get_kpis, handle_simple_prompt
-from instruction_set import GUIDELINES, SUGGESTED_PROMPTS
-from tone_style import COACH_STYLE
-from prompt_utils import build_system_prompt
-from model_utils import chat_call  # GPT-5 -> 4o -> 4o-mini fallback
+from dummy_data_gen import generate_samples, load_data
+from coach_core import get_kpis, handle_prompts_batch
+from instruction_set import SUGGESTED_PROMPTS
+from model_utils import HEALTH, LLM_POOL  # GPT-5 -> 4o -> 4o-mini fallback, skipping unhealthy models
+from answer_cache import ANSWERS, INTERMEDIATES
+from chat_pipeline import USE_TOOLS, answer_question
+from response_cache import RESPONSES
+from schema import memory_report
+from ticket_db import TicketDB
 
 
 # -----------------------------
@@ -32,10 +36,24 @@ st.markdown("""
 # ---------------------------------
 # Load data + compute KPIs (cached)
 # ---------------------------------
-@st.cache_data(show_spinner=False)
+# cache_resource: one shared, read-only kpis dict so the lazily built
+# rollup cube survives reruns instead of being unpickled per session.
+@st.cache_resource(show_spinner=False)
 def _load_all():
-    df_ = load_data(days_back=7, n_jobs_per_day=80)
-    k_ = get_kpis(df_)
+    samples, db = None, None
+    if os.getenv("TICKET_ARCHIVE"):
+        df_ = load_data(days_back=8, backend="arrow")  # today + the 7-day window
+    elif os.getenv("TICKET_DB"):
+        # headline KPIs from the last 8 days in memory; roll-ups, rankings and
+        # driver periods are pushed down to the database (any history length)
+        db = TicketDB(os.environ["TICKET_DB"])
+        df_ = db.read_days(8)
+    else:
+        df_ = load_data(days_back=7, n_jobs_per_day=80)
+        samples = generate_samples(df_)  # 5 s drum RPM / hydraulic pressure per truck
+    k_ = get_kpis(df_, samples=samples, db=db)
+    # prewarm the answer cache so suggestion clicks are instant
+    handle_prompts_batch(SUGGESTED_PROMPTS, k_)
     return df_, k_
 
 with st.spinner("Loading ticket data..."):
@@ -45,52 +63,29 @@ with st.spinner("Loading ticket data..."):
 # ---------------------------------
 # LLM helpers
 # ---------------------------------
-def build_data_context(k: dict) -> str:
-    """Compact snapshot the model can rely on."""
-    def fmt(x):
-        return "–" if x is None or pd.isna(x) else f"{x:.1f}" if isinstance(x, (float, int)) else str(x)
-
-    lines = [
-        "DATA SNAPSHOT (today)",
-        f"- Loads today: {k.get('loads_today', 0)}",
-        f"- Loads yesterday: {k.get('loads_yesterday', 0)}",
-        f"- Avg wait (min): {fmt(k.get('avg_wait_min'))}",
-        f"- Utilization (%): {fmt(k.get('utilization_pct'))}",
-        f"- Productivity ratio (%): {fmt(k.get('prod_ratio'))}",
-        f"- Productive minutes: {fmt(k.get('prod_prod_min'))}",
-        f"- Idle minutes: {fmt(k.get('prod_idle_min'))}",
-        f"- Active trucks: {k.get('n_trucks', 0)}",
-        f"- Fuel used today (L): {fmt(k.get('fuel_L_today'))}",
-        f"- Distance today (km): {fmt(k.get('distance_km_today'))}",
-        f"- Volume today (m³): {fmt(k.get('m3_today'))}",
-    ]
-    return "\n".join(lines)
-
-
 def process_user_question(user_input: str) -> str:
     """Route to rules first, then LLM with model fallback and data context."""
-    # Quick deterministic answers
-    simple = handle_simple_prompt(user_input, kpis)
-    if simple:
-        return simple
-
-    # Prompts
-    system_prompt = build_system_prompt(GUIDELINES, COACH_STYLE)
-    data_context = build_data_context(kpis)
-
-    history = [{"role": m["role"], "content": m["content"]} for m in st.session_state.chat_history]
-
-    model_used, text = chat_call(
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "system", "content": data_context},
-            *history,
-            {"role": "user", "content": user_input},
-        ],
-        temperature=0.3,
-    )
-    # Tag the model used (optional)
-    return f"_model: {model_used}_\n\n{text}"
+    timings = {}
+    reply = answer_question(user_input, kpis, st.session_state.chat_history, timings=timings)
+    if "prompt" in timings:
+        st.session_state.prompt_report = timings["prompt"]
+    return reply
+
+
+def stream_user_question(user_input: str) -> str:
+    """`process_user_question`, rendering the LLM reply into the current container as tokens arrive."""
+    timings = {}
+    # tool-calling loop: tools run between model rounds, so the reply comes whole
+    with st.spinner("Looking up the numbers...") if USE_TOOLS else nullcontext():
+        reply = answer_question(user_input, kpis, st.session_state.chat_history, stream=True, timings=timings)
+    if "prompt" in timings:
+        st.session_state.prompt_report = timings["prompt"]
+    if isinstance(reply, str):
+        st.markdown(reply)
+        return reply
+    st.write_stream(reply)
+    st.caption(f"model: {reply.model} · first token after {reply.ttft_s:.2f} s")
+    return reply.reply
 
 
 # -----------------------------
@@ -103,6 +98,22 @@ with st.sidebar.expander("⚙️ Advanced"):
     st.caption("Set `OPENAI_MODEL` to try a model first (falls back if missing).")
     st.code("OPENAI_MODEL=gpt-5-chat", language="bash")
     debug = st.checkbox("Show debug info", value=False)
+    if debug:
+        st.caption("Answer cache")
+        st.json(ANSWERS.stats())
+        st.caption("Shared intermediates")
+        st.json(INTERMEDIATES.stats())
+        st.caption("Model health")
+        st.json(HEALTH.stats())
+        st.caption("LLM pool")
+        st.json(LLM_POOL.stats())
+        st.caption("Last LLM prompt")
+        st.json(st.session_state.get("prompt_report", {}))
+        st.caption("LLM response cache")
+        st.json(RESPONSES.stats())
+        st.caption("Ticket frame memory")
+        mem = memory_report(df)
+        st.json({k: v for k, v in mem.items() if k != "columns"})
 
 
 # -----------------------------
@@ -188,8 +199,7 @@ if selected_tab == "Chat":
             st.markdown(user_input)
         with st.chat_message("assistant"):
             try:
-                reply = process_user_question(user_input)
-                st.markdown(reply)
+                reply = stream_user_question(user_input)
                 st.session_state.chat_history.append({"role": "assistant", "content": reply})
             except Exception as e:
                 st.error(f"Coach note unavailable: {e}")
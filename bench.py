@@ -0,0 +1,1061 @@
+# bench.py – offline performance benchmarks (run: python bench.py kpis --sizes 10000 1000000)
+import argparse
+import json
+import os
+import resource
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from answer_cache import ANSWERS, INTERMEDIATES
+from coach_core import INTENTS, _mins, _safe_mean, get_kpis, handle_prompts_batch, handle_simple_prompt
+from instruction_set import SUGGESTED_PROMPTS
+from dummy_data_gen import generate_samples, generate_tickets, iter_ticket_chunks, load_data, read_ticket_chunks, write_ticket_chunks
+from ingest import TELEMATICS, TicketIngest
+from chat_history import compact_history, message_tokens
+from chat_pipeline import answer_question
+from kpi_state import KpiState
+from model_utils import AsyncChat, ModelHealth, chat_call, chat_stream
+from response_cache import ResponseCache, cached_call, prompt_key
+from rollup import RollupCube, aggregate, aggregate_chunks, kpis_window
+from schema import TICKET_PREFIX, compact, for_display, memory_report, widen
+from scorecard import DriverScorecard, driver_scorecard
+from sharded_kpis import RANKINGS, get_kpis_sharded
+from stub_llm import StubLLM
+import tools
+from topn import top_n
+from ticket_archive import TicketArchive
+from ticket_db import TicketDB, db_window
+from ticket_store import TicketStore
+from tool_registry import REGISTRY, chat_with_tools, run_tool, serialize
+
+
+# -------------------------
+# Fixtures
+# -------------------------
+def make_tickets(n_rows: int, *, days_back: int = 7, seed: int = 7) -> pd.DataFrame:
+    """`n_rows` tickets over `days_back` days, about 4 loads per truck per day."""
+    per_day = -(-n_rows // days_back)
+    df = generate_tickets(days_back=days_back, n_jobs_per_day=per_day, seed=seed, n_trucks=max(21, per_day // 4))
+    return df.iloc[:n_rows]
+
+
+def legacy_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """The pre-schema frame: string ids/dimensions, int64/float64 measures."""
+    out = {}
+    for c in df.columns:
+        s = df[c]
+        if c == "ticket_id":
+            out[c] = (TICKET_PREFIX + s.astype(str)).astype(object)
+        elif isinstance(s.dtype, pd.CategoricalDtype):
+            out[c] = s.astype(object)
+        elif pd.api.types.is_integer_dtype(s):
+            out[c] = s.astype("int64")
+        elif pd.api.types.is_float_dtype(s):
+            out[c] = widen(s).astype("float64")
+    return df.assign(**out)
+
+
+def _timeit(fn, repeat: int = 1, setup=None) -> float:
+    """Best of `repeat` runs of `fn`; `setup` runs untimed before each one."""
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+# -------------------------
+# Reference implementations (pre-optimization behaviour)
+# -------------------------
+def get_kpis_rowwise(df: pd.DataFrame, op_minutes: int = 600, now: datetime | None = None) -> dict:
+    """Original row-wise `get_kpis`, kept as the speed/correctness baseline."""
+    now = now or datetime.now()
+    today = now.date()
+    df = df.copy()
+    df["date"] = df["start_time"].dt.date
+    df["hour"] = df["start_time"].dt.hour
+
+    df_today = df[df["date"] == today].copy()
+    df_yesterday = df[df["date"] == today - timedelta(days=1)]
+    df_week = df[df["start_time"] >= now - timedelta(days=7)]
+
+    n_trucks_today = df_today["truck"].nunique()
+    denom_today = op_minutes * n_trucks_today if n_trucks_today else float("nan")
+    utilization_today = (df_today["cycle_time"].sum() / denom_today * 100) if denom_today else float("nan")
+
+    df_today["min_total"] = df_today.apply(lambda r: _mins(r.ignition_on, r.ignition_off), axis=1)
+    df_today["min_prod"] = df_today.apply(lambda r: _mins(r.first_ticket, r.last_return), axis=1)
+    df_today["prod_ratio"] = df_today["min_prod"] / df_today["min_total"] * 100
+    prod_prod_min = df_today["min_prod"].sum(skipna=True)
+    prod_idle_min = df_today["min_total"].sum(skipna=True) - prod_prod_min
+
+    util_week = float("nan")
+    if not df_week.empty:
+        daily_trucks = df_week.groupby(df_week["date"])["truck"].nunique()
+        total_op_min = (daily_trucks * op_minutes).sum()
+        util_week = (df_week["cycle_time"].sum() / total_op_min * 100) if total_op_min else float("nan")
+
+    return {
+        "loads_today": int(len(df_today)),
+        "loads_yesterday": int(len(df_yesterday)),
+        "utilization_pct": float(utilization_today),
+        "utilization_7d_pct": float(util_week),
+        "avg_wait_min": float(_safe_mean(df_today["dur_waiting"])),
+        "n_trucks": int(n_trucks_today),
+        "prod_ratio": float(_safe_mean(df_today["prod_ratio"])) if not df_today.empty else float("nan"),
+        "prod_prod_min": float(prod_prod_min),
+        "prod_idle_min": float(prod_idle_min),
+        "fuel_L_today": float(df_today["fuel_used_L"].sum()),
+        "distance_km_today": float(df_today["distance_km"].sum()),
+        "m3_today": float(df_today["load_volume_m3"].sum()),
+    }
+
+
+def _same_headline(a: dict, b: dict) -> bool:
+    for key, ref in b.items():
+        got = a[key]
+        if pd.isna(ref) and pd.isna(got):
+            continue
+        if not np.isclose(got, ref, rtol=1e-9, atol=1e-6):
+            return False
+    return True
+
+
+def _same_result(a, b) -> bool:
+    """Tool outputs equal up to float summation order."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same_result(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_same_result(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return bool(np.isclose(a, b, rtol=1e-9, atol=0.051) or (pd.isna(a) and pd.isna(b)))
+    return a == b
+
+
+# -------------------------
+# Benchmarks
+# -------------------------
+def bench_kpis(sizes: list[int], repeat: int = 1) -> None:
+    now = datetime.now()
+    print(f"{'rows':>10} {'rowwise s':>10} {'vector s':>10} {'speedup':>8}  match")
+    for n in sizes:
+        df = make_tickets(n)
+        legacy = legacy_dtypes(df)
+        t_old = _timeit(lambda: get_kpis_rowwise(legacy, now=now), repeat)
+        t_new = _timeit(lambda: get_kpis(df, now=now), repeat)
+        ok = _same_headline(get_kpis(df, now=now), get_kpis_rowwise(legacy, now=now))
+        print(f"{n:>10,} {t_old:>10.3f} {t_new:>10.3f} {t_old / t_new:>7.1f}x  {ok}")
+
+
+def bench_incremental(history_rows: int, n_new: int = 200) -> None:
+    """Per-ticket cost: KpiState.apply vs a full get_kpis recompute."""
+    now = datetime.now()
+    df = make_tickets(history_rows + n_new)
+    hist, new = df.iloc[:history_rows], df.iloc[history_rows:]
+    state = KpiState().apply(hist)
+
+    t_full = _timeit(lambda: get_kpis(df, now=now)) * 1000
+    t0 = time.perf_counter()
+    for i in range(len(new)):
+        state.apply(new.iloc[i:i + 1])
+        state.kpis(now)
+    t_inc = (time.perf_counter() - t0) / len(new) * 1000
+    ok = _same_headline(state.kpis(now), get_kpis_rowwise(legacy_dtypes(df), now=now))
+    print(f"history {history_rows:,}: full recompute {t_full:.1f} ms/ticket, incremental {t_inc:.2f} ms/ticket, match {ok}")
+
+
+def bench_slices(days: list[int], repeat: int = 200) -> None:
+    """Window slice latency as history grows (should stay flat)."""
+    now = datetime.now()
+    print(f"{'days':>6} {'rows':>10} {'mask ms':>9} {'store ms':>9}")
+    for d in days:
+        df = make_tickets(d * 200, days_back=d)
+        store = TicketStore(df)
+        frame = store.frame
+
+        def masks():
+            frame[frame["date"] == pd.Timestamp(now).normalize()]
+            frame[frame["start_time"] >= now - timedelta(days=7)]
+            frame[frame["start_time"] >= now - timedelta(hours=48)]
+
+        def lookups():
+            store.day(now)
+            store.since(now - timedelta(days=7))
+            store.since(now - timedelta(hours=48))
+
+        t_mask = _timeit(masks, repeat=5) * 1000
+        t_store = _timeit(lookups, repeat=repeat) * 1000
+        print(f"{d:>6} {len(df):>10,} {t_mask:>9.3f} {t_store:>9.3f}")
+
+
+def _clear_answers() -> None:
+    ANSWERS.clear()
+    INTERMEDIATES.clear()
+
+
+def bench_intents(days: list[int]) -> None:
+    """Per-prompt latency of handle_simple_prompt over SUGGESTED_PROMPTS as history grows."""
+    print(f"{'days':>6} {'rows':>10} {'cube build s':>12} {'mean ms':>8} {'max ms':>8}")
+    for d in days:
+        kpis = get_kpis(make_tickets(d * 200, days_back=d))
+        t_build = _timeit(lambda: RollupCube(kpis["store"]).build())
+        # cold answers: ANSWERS / INTERMEDIATES would serve every repeat after the first
+        lat = [_timeit(lambda: handle_simple_prompt(p, kpis), repeat=3, setup=_clear_answers) * 1000
+               for p in SUGGESTED_PROMPTS]
+        print(f"{d:>6} {len(kpis['df']):>10,} {t_build:>12.3f} {np.mean(lat):>8.2f} {np.max(lat):>8.2f}")
+
+
+# Baseline answers of the pre-router if/elif chain (`handle_simple_prompt` at the
+# baseline commit) on a fixed data set; `bench.py router --record DIR` regenerates
+# them from a checkout of that commit at DIR.
+ROUTER_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "router_baseline.json")
+ROUTER_NOW = datetime(2025, 6, 4, 15, 0)
+ROUTER_MISSES = [
+    "Why is the sky blue?",
+    "Draft a note to the crew about Monday's safety meeting.",
+    "What should I tell a customer who is upset about a late pour?",
+]
+ROUTER_EXTRA = [
+    "how many loads today", "avg wait?", "what's the fuel cost", "fuel cost at $1.85/L diesel",
+    "Show me drum outliers", "pressure this week", "utilization vs 85% target", "compare wait today vs last week",
+]
+
+# answers that changed on purpose since the baseline: only their heading line must match
+ROUTER_CHANGED = {
+    "Give me the 5 slowest washout times this week.":
+        "ties at the longest washout: the baseline's unstable sort picked arbitrary rows, top_n keeps the earliest",
+}
+
+_RECORD_BASELINE = """
+import json, pickle, sys
+from datetime import datetime
+import coach_core
+
+now = pickle.load(open(sys.argv[2], "rb"))
+
+
+class _Frozen(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return now
+
+
+coach_core.datetime = _Frozen
+df, prompts = pickle.load(open(sys.argv[1], "rb"))
+kpis = coach_core.get_kpis(df)
+json.dump({p: coach_core.handle_simple_prompt(p, kpis) for p in prompts}, open(sys.argv[3], "w"), indent=1, ensure_ascii=False)
+"""
+
+
+def _router_frame() -> pd.DataFrame:
+    # in start_time order, as a TicketStore holds it: list answers keep row order
+    df = generate_tickets(days_back=14, n_jobs_per_day=80, now=ROUTER_NOW)
+    return df.sort_values("start_time", kind="stable", ignore_index=True)
+
+
+def record_router_baseline(baseline_dir: str, path: str = ROUTER_FIXTURE) -> None:
+    """Run the baseline checkout's `handle_simple_prompt` (frozen clock, legacy dtypes) and save its answers."""
+    import pickle
+    import subprocess
+    import sys
+    import tempfile
+
+    prompts = [*SUGGESTED_PROMPTS, *ROUTER_MISSES, *ROUTER_EXTRA]
+    with tempfile.TemporaryDirectory() as tmp:
+        data, now = os.path.join(tmp, "data.pkl"), os.path.join(tmp, "now.pkl")
+        with open(data, "wb") as f:
+            pickle.dump((legacy_dtypes(_router_frame()), prompts), f)
+        with open(now, "wb") as f:
+            pickle.dump(ROUTER_NOW, f)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "unused"}
+        subprocess.run([sys.executable, "-c", _RECORD_BASELINE, data, now, os.path.abspath(path)],
+                       cwd=baseline_dir, env=env, check=True)
+    print(f"recorded {len(prompts)} baseline answers to {path}")
+
+
+def bench_router(repeat: int = 2000) -> None:
+    """
+    Routing latency: the full guard walk (every guard tried in registration
+    order, as the old if/elif chain did) vs `IntentRouter`, whose word index
+    leaves only the guards of intents with a keyword in the prompt.
+    Answers against the recorded baseline are checked in tests/test_router.py.
+    """
+    def first_route(prompts):
+        for q in prompts:
+            INTENTS._routed.cache_clear()
+            INTENTS.route(q)
+
+    def chain(prompts):  # the old cost model: every guard tried in registration order
+        for q in prompts:
+            p = q.lower()
+            next((it for it in INTENTS.intents if it.when(p)), None)
+
+    for label, prompts in (("suggested", SUGGESTED_PROMPTS), ("misses", ROUTER_MISSES)):
+        per = len(prompts) * repeat
+        t_chain = _timeit(lambda: chain(prompts * repeat)) / per * 1e6
+        t_first = _timeit(lambda: first_route(prompts * repeat)) / per * 1e6
+        t_memo = _timeit(lambda: [INTENTS.route(q) for q in prompts * repeat]) / per * 1e6
+        print(f"{label:>10}: guard walk {t_chain:.1f} µs/prompt, router first call {t_first:.1f} µs, "
+              f"router memoized {t_memo:.1f} µs")
+
+
+def bench_batch(days: int) -> None:
+    """
+    Cold cost of prewarming every suggested prompt (as app.py does):
+    one prompt at a time with each intent computing its own roll-ups vs
+    `handle_prompts_batch` with intermediates shared. The caches (and the
+    cube) are emptied before each run.
+    """
+    kpis = get_kpis(make_tickets(days * 200, days_back=days))
+    size = INTERMEDIATES.maxsize
+
+    def cold():
+        ANSWERS.clear()
+        INTERMEDIATES.clear()
+        kpis["cube"] = RollupCube(kpis["store"])
+
+    def one_by_one():
+        cold()
+        INTERMEDIATES.maxsize = 0
+        try:
+            return {q: handle_simple_prompt(q, kpis) for q in SUGGESTED_PROMPTS}
+        finally:
+            INTERMEDIATES.maxsize = size
+
+    def batch():
+        cold()
+        return handle_prompts_batch(SUGGESTED_PROMPTS, kpis)
+
+    t_own = _timeit(one_by_one, repeat=3) * 1000
+    t_batch = _timeit(batch, repeat=3) * 1000
+    same = one_by_one() == batch()
+    print(f"{days} days, {len(SUGGESTED_PROMPTS)} prompts: one by one, own roll-ups {t_own:.1f} ms; "
+          f"handle_prompts_batch {t_batch:.1f} ms; same answers {same}")
+    if not same:
+        raise SystemExit(1)
+
+
+def bench_scorecard(days: int, repeat: int = 20) -> None:
+    """Driver windows from the daily scorecard vs a raw groupby over the slice."""
+    kpis = get_kpis(make_tickets(days * 200, days_back=days))
+    store, now = kpis["store"], pd.Timestamp(kpis["now"])
+    t_build = _timeit(lambda: DriverScorecard(kpis["cube"])) * 1000
+    card = DriverScorecard.for_cube(kpis["cube"])
+    bad = 0
+    for label, span in [("today", 0), ("week", 7), ("month", 30), ("all", days)]:
+        start = now.normalize() if span == 0 else now - pd.Timedelta(days=span)
+        t_card = _timeit(lambda: card.window(start=start), repeat) * 1000
+        t_raw = _timeit(lambda: driver_scorecard(store.since(start)), repeat) * 1000
+        a, b = card.window(start=start).sort_index(), driver_scorecard(store.since(start)).sort_index()
+        same = a.index.equals(b.index) and np.allclose(a.to_numpy(float), b.to_numpy(float), equal_nan=True)
+        bad += not same
+        print(f"{label:>6}: scorecard {t_card:.2f} ms, raw groupby {t_raw:.2f} ms, same {same}")
+    print(f"build (once per data version): {t_build:.1f} ms")
+    if bad:
+        raise SystemExit(1)
+
+
+def bench_memory(days: int, per_day: int) -> None:
+    """Ticket frame footprint: legacy dtypes vs `schema.compact`, and the get_kpis dict on top."""
+    compact_df = make_tickets(days * per_day, days_back=days)
+    legacy = legacy_dtypes(compact_df)
+    t_convert = _timeit(lambda: compact(legacy)) * 1000
+    before, after = memory_report(legacy), memory_report(compact_df)
+    print(f"{len(compact_df):,} tickets ({days} days × {per_day}/day)")
+    print(f"  legacy : {before['total_mb']:8.1f} MB  ({before['bytes_per_row']:.0f} B/row)")
+    print(f"  compact: {after['total_mb']:8.1f} MB  ({after['bytes_per_row']:.0f} B/row), convert {t_convert:.0f} ms")
+    for c, info in after["columns"].items():
+        print(f"    {c:<22} {before['columns'][c]['dtype']:>15} {before['columns'][c]['kb']:>10.0f} KB"
+              f"  -> {info['dtype']:>15} {info['kb']:>9.0f} KB")
+
+    kpis = get_kpis(compact_df)
+    kpis["cube"].build()
+    slices = sum(memory_report(kpis[k])["total_mb"] for k in ("df_today", "df_yesterday", "df_week", "df_48h"))
+    cells = sum(memory_report(c.cells)["total_mb"] for c in kpis["cube"].cuboids.values())
+    print(f"  get_kpis slices (views, reported as if copied): {slices:.1f} MB, cube cells: {cells:.1f} MB")
+
+
+def bench_generate(python_rows: int, numpy_rows: list[int]) -> None:
+    """Row-by-row `load_data` vs vectorized `generate_tickets`."""
+    days = 30
+    t = _timeit(lambda: load_data.__wrapped__(days_back=days, n_jobs_per_day=python_rows // days))
+    print(f"python {python_rows:>12,} rows: {t:7.2f} s ({python_rows / t:,.0f} rows/s)")
+    for n in numpy_rows:
+        t = _timeit(lambda: generate_tickets(days_back=365, n_jobs_per_day=n // 365))
+        print(f"numpy  {n:>12,} rows: {t:7.2f} s ({n / t:,.0f} rows/s)")
+    a = generate_tickets(days_back=3, n_jobs_per_day=100, seed=1, now=datetime(2025, 1, 1))
+    b = generate_tickets(days_back=3, n_jobs_per_day=100, seed=1, now=datetime(2025, 1, 1))
+    print(f"deterministic per seed: {a.equals(b)}")
+
+
+def bench_stream(days: int, per_day: int, chunk_rows: int, directory: str | None, verify: bool) -> None:
+    """Fold a chunked history through KpiState + a streamed driver×day roll-up."""
+    now = datetime.now()
+    gen = dict(days_back=days, n_jobs_per_day=per_day, n_trucks=max(21, per_day // 4), now=now, chunk_rows=chunk_rows)
+    n = days * per_day
+    if directory:
+        t_write = _timeit(lambda: write_ticket_chunks(directory, **gen))
+        print(f"wrote {n:,} tickets to {directory} in {t_write:.1f} s")
+
+    def source():
+        return read_ticket_chunks(directory) if directory else iter_ticket_chunks(**gen)
+
+    state = KpiState()
+
+    def fold(chunks):
+        for chunk in chunks:
+            state.apply(chunk)
+            yield chunk
+
+    t0 = time.perf_counter()
+    daily = aggregate_chunks(fold(source()), ["date", "driver"])
+    elapsed = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"streamed {state.n_tickets:,} tickets in {elapsed:.1f} s ({state.n_tickets / elapsed:,.0f} rows/s), "
+          f"{len(daily):,} driver-days, peak RSS {peak_mb:,.0f} MB")
+
+    first = next(iter(source()))
+    before = state.kpis(now)
+    same = _same_headline(state.apply(first).kpis(now), before)
+    print(f"replayed first chunk, unchanged: {same}")
+    if verify:
+        full = pd.concat(list(source()), ignore_index=True)
+        ok_kpis = _same_headline(get_kpis(full, now=now), state.kpis(now))
+        ref = aggregate(full, ["date", "driver"]).sort_index()
+        ok_daily = ref.index.equals(daily.sort_index().index) and np.allclose(
+            ref.to_numpy(float), daily.sort_index().to_numpy(float), equal_nan=True)
+        print(f"matches in-memory get_kpis: {ok_kpis}, driver×day roll-up: {ok_daily}")
+
+
+def bench_archive(directory: str, days: int, per_day: int) -> None:
+    """TicketArchive: load the displayed window vs the whole history."""
+    now = datetime.now()
+    archive = TicketArchive(directory)
+    if archive.last_day() is None:
+        gen = dict(days_back=days, n_jobs_per_day=per_day, n_trucks=max(21, per_day // 4), now=now)
+        t = _timeit(lambda: archive.write_chunks(iter_ticket_chunks(**gen)))
+        print(f"wrote {days * per_day:,} tickets ({days} partitions) in {t:.1f} s")
+    for label, n_days in [("8 days", 8), ("90 days", 90), ("all", len(archive.dates()))]:
+        files = len(archive.files(now - timedelta(days=n_days - 1), now))
+        t_read = _timeit(lambda: archive.read_days(n_days, now=now), 3) * 1000
+        t_kpis = _timeit(lambda: get_kpis(archive.read_days(n_days, now=now), now=now)) * 1000
+        print(f"{label:>8}: {files:>5} files, read {t_read:8.1f} ms, read + get_kpis {t_kpis:8.1f} ms")
+    cols = ["start_time", "truck", "cycle_time"]
+    t_cols = _timeit(lambda: archive.read_days(len(archive.dates()), columns=cols, now=now), 3) * 1000
+    print(f"all, {len(cols)} columns: read {t_cols:.1f} ms")
+
+
+def bench_ingest(directory: str, n_rows: int, chunksize: int) -> None:
+    """CSV ingest throughput + validation: exports with bad and repeated rows."""
+    import shutil
+
+    now = datetime.now()
+    df = make_tickets(n_rows, days_back=30)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    disp = for_display(df)
+    keep = [c for c in disp.columns if c not in TELEMATICS or c in ("distance_km", "fuel_used_L", "water_added_L")]
+    tickets = disp[keep].drop(columns="date").astype(object)
+    rng = np.random.default_rng(0)
+    bad = rng.choice(len(tickets), size=max(3, n_rows // 1000), replace=False)
+    k = len(bad) // 3
+    tickets.iloc[bad[:k], tickets.columns.get_loc("start_time")] = "not a time"
+    tickets.iloc[bad[k:2 * k], tickets.columns.get_loc("cycle_time")] = "-1"
+    tickets.iloc[bad[2 * k:], tickets.columns.get_loc("ticket_id")] = ""
+    tickets = pd.concat([tickets, tickets.iloc[: n_rows // 100]])  # re-sent rows
+    t_csv = os.path.join(directory, "tickets.csv")
+    m_csv = os.path.join(directory, "telematics.csv")
+    tickets.to_csv(t_csv, index=False)
+    disp[["ticket_id", *TELEMATICS]].to_csv(m_csv, index=False)
+
+    state = KpiState()
+    ing = TicketIngest(TicketArchive(os.path.join(directory, "archive")), state)
+    report = ing.ingest_csv(t_csv, m_csv, chunksize=chunksize)
+    print({k: v for k, v in report.items() if k != "ok"})
+    clean = df.drop(index=bad)
+    same = _same_headline(get_kpis(clean, now=now), state.kpis(now))
+    print(f"archived {len(ing.archive.read(columns=['ticket_id'])):,} tickets; KpiState matches get_kpis on clean rows: {same}")
+
+
+SQL_QUERIES = [
+    ("top_wait_jobs_48h", "48h", {"n": 5}),
+    ("distance_over_km", "week", {"km": 40.0}),
+    ("jobs_cycle_time_over", "week", {"minutes": 150.0}),
+    ("rank_plants_by_cycle", "week", {}),
+    ("driver_efficiency_today", "today", {}),
+    ("top_water_added_week", "week", {}),
+    ("fuel_l_per_km_exceed_days", "week", {"threshold": 0.3}),
+]
+
+
+def bench_sql(path: str, days: int, per_day: int) -> None:
+    """Same tool queries on the pandas backend (in-memory store + cube) vs TicketDB pushdown."""
+
+    now = datetime.now()
+    db = TicketDB(path)
+    if db.last_day() is None:
+        gen = dict(days_back=days, n_jobs_per_day=per_day, n_trucks=max(21, per_day // 4), now=now)
+        t = _timeit(lambda: [db.write(chunk) for chunk in iter_ticket_chunks(**gen)])
+        print(f"wrote {days * per_day:,} tickets to {path} in {t:.1f} s ({os.path.getsize(path) / 2**20:,.0f} MB)")
+    now = db.last_day() + (now - pd.Timestamp(now).normalize())
+
+    t_load = _timeit(lambda: db.window().frame)
+    df = db.window().frame
+    t_kpis = _timeit(lambda: get_kpis(df, now=now))
+    kpis = get_kpis(df, now=now)
+    mb = memory_report(df)["total_mb"]
+    print(f"pandas backend: load {len(df):,} rows {t_load:.1f} s + get_kpis {t_kpis:.1f} s, {mb:,.0f} MB in memory")
+
+    print(f"{'query':<28} {'pandas ms':>10} {'sql ms':>10}  same")
+    for name, period, kw in SQL_QUERIES:
+        fn = getattr(tools, name).__wrapped__  # bypass the answer cache
+        t_pd = _timeit(lambda: fn(kpis_window(kpis, period), **kw), 3) * 1000
+        t_sql = _timeit(lambda: fn(db_window(db, period, now), **kw), 3) * 1000
+        same = _same_result(fn(kpis_window(kpis, period), **kw), fn(db_window(db, period, now), **kw))
+        print(f"{name:<28} {t_pd:>10.1f} {t_sql:>10.1f}  {same}")
+
+
+def bench_telemetry(days: int, per_day: int) -> None:
+    """SampleStore per-ticket / per-minute summaries vs the same in pandas."""
+    df = make_tickets(days * per_day, days_back=days)
+    t_gen = _timeit(lambda: generate_samples(df).trucks)
+    store = generate_samples(df)
+    store.trucks
+    print(f"{len(store):,} samples for {len(df):,} tickets: generate + sort {t_gen:.1f} s, "
+          f"{store.nbytes() / 2**20:,.0f} MB ({store.nbytes() / len(store):.0f} B/sample)")
+
+    raw = pd.concat([store.range(k).assign(truck=k) for k in store.trucks], ignore_index=True)
+    dt = store._dt  # same samples, same order
+
+    def pandas_per_ticket():
+        t = (df[["ticket_id", "truck", "start_time", "cycle_time"]].astype({"truck": "int32"})
+             .rename(columns={"start_time": "time"}).sort_values("time", kind="stable"))
+        s = raw.assign(dt=dt.astype("float64"), truck=raw["truck"].astype("int32")).sort_values("time", kind="stable")
+        m = pd.merge_asof(s, t.assign(start=t["time"]), on="time", by="truck", direction="backward")
+        m = m[m["time"] < m["start"] + pd.to_timedelta(m["cycle_time"], unit="min")]
+        low = (m["drum_rpm"] < 4.0) * m["dt"]
+        return m.assign(low_s=low).groupby("ticket_id").agg(
+            drum_rpm_min=("drum_rpm", "min"), drum_rpm_max=("drum_rpm", "max"),
+            drum_rpm_mean=("drum_rpm", "mean"), drum_rpm_low_s=("low_s", "sum"), n=("drum_rpm", "size"))
+
+    t_pd = _timeit(pandas_per_ticket)
+    t_np = _timeit(lambda: store.per_ticket(df), 3)
+    ref, got = pandas_per_ticket(), store.per_ticket(df)
+    got = got[got["n"] > 0]
+    same = ref.index.equals(got.index.sort_values()) and np.allclose(
+        ref.to_numpy(float), got.loc[ref.index, ref.columns].to_numpy(float), rtol=1e-6)
+    print(f"per-ticket summaries: pandas merge_asof+groupby {t_pd:.2f} s, SampleStore {t_np:.2f} s, same: {same}")
+
+    t_pm = _timeit(lambda: store.per_minute(), 3)
+    truck = int(store.trucks[0])
+    t_rng = _timeit(lambda: store.range(truck, df["start_time"].max() - pd.Timedelta(hours=1)), 100) * 1e6
+    print(f"per-minute downsample (all trucks) {t_pm:.2f} s; one truck, last hour: {t_rng:.0f} µs")
+
+
+def bench_models(turns: int, rtt_s: float) -> None:
+    """
+    Model chain against a local stub whose first model is missing: fresh
+    health per turn (the old walk from the top) vs the shared health cache.
+    Breaker behaviour is tested in tests/test_model_utils.py.
+    """
+    from openai import OpenAI
+
+    chain = ["gpt-5-chat", "gpt-4o", "gpt-4o-mini"]
+    msgs = [{"role": "user", "content": "avg wait?"}]
+    with StubLLM({"gpt-5-chat": {"status": 404, "latency_s": rtt_s},
+                  "gpt-4o": {"latency_s": rtt_s}, "gpt-4o-mini": {"latency_s": rtt_s}}) as stub:
+        client = OpenAI(api_key="stub", base_url=stub.url, max_retries=0)
+        call = lambda health: chat_call(msgs, client=client, chain=chain, health=health)
+
+        t_old = _timeit(lambda: [call(ModelHealth()) for _ in range(turns)]) / turns * 1000
+        old = dict(stub.requests)
+        stub.requests.clear()
+        health = ModelHealth()
+        t_new = _timeit(lambda: [call(health) for _ in range(turns)]) / turns * 1000
+        print(f"{turns} turns, {rtt_s * 1000:.0f} ms round trip: walk from the top {t_old:.0f} ms/turn "
+              f"(requests {old}), health cache {t_new:.0f} ms/turn (requests {dict(stub.requests)})")
+        print({m: {k: s[k] for k in ("calls", "errors", "open", "latency_ms")} for m, s in health.stats().items()})
+
+
+def bench_ttft(words: int, first_s: float, token_s: float) -> None:
+    """Time to first token: blocking chat_call vs chat_stream (incl. a model failing before its first token)."""
+    from openai import OpenAI
+
+    reply = " ".join(["load"] * words)
+    spec = {"latency_s": first_s, "token_s": token_s, "reply": reply}
+    msgs = [{"role": "user", "content": "coach me"}]
+    with StubLLM({"gpt-4o": spec, "flaky": {"status": 500, "latency_s": first_s}}) as stub:
+        client = OpenAI(api_key="stub", base_url=stub.url, max_retries=0)
+        for chain in (["gpt-4o"], ["flaky", "gpt-4o"]):
+            t0 = time.perf_counter()
+            model, text = chat_call(msgs, client=client, chain=chain, health=ModelHealth())
+            t_block = time.perf_counter() - t0
+            stream = chat_stream(msgs, client=client, chain=chain, health=ModelHealth())
+            streamed = "".join(stream)
+            print(f"chain {chain}: blocking reply after {t_block:.2f} s; streamed first token after "
+                  f"{stream.ttft_s:.2f} s, done {stream.total_s:.2f} s via {stream.model}; same text: {streamed == text}")
+
+
+def bench_coalesce(sessions: int, distinct: int, rtt_s: float, concurrency: int) -> None:
+    """
+    `sessions` threads asking `distinct` questions at once: serial chat_call
+    vs the async pool, and identical streams through the pool. Coalescing is
+    tested in tests/test_model_utils.py.
+    """
+    from openai import OpenAI
+    from concurrent.futures import ThreadPoolExecutor
+
+    chain = ["gpt-4o"]
+    questions = [[{"role": "user", "content": f"compare today's wait ({i})"}] for i in range(distinct)]
+    asks = [questions[i % distinct] for i in range(sessions)]
+    with StubLLM({"gpt-4o": {"latency_s": rtt_s}}) as stub:
+        client = OpenAI(api_key="stub", base_url=stub.url, max_retries=0)
+        t0 = time.perf_counter()
+        for q in asks:
+            chat_call(q, client=client, chain=chain, health=ModelHealth())
+        t_serial = time.perf_counter() - t0
+        n_serial = stub.requests["gpt-4o"]
+
+        stub.requests.clear()
+        pool = AsyncChat(chain=chain, health=ModelHealth(), max_concurrency=concurrency,
+                         max_connections=concurrency, api_key="stub", base_url=stub.url, max_retries=0)
+        with ThreadPoolExecutor(sessions) as ex:
+            t0 = time.perf_counter()
+            list(ex.map(pool, asks))
+            t_pool = time.perf_counter() - t0
+        print(f"{sessions} sessions, {distinct} distinct questions, {rtt_s * 1000:.0f} ms round trip: "
+              f"serial {t_serial:.2f} s / {n_serial} requests; pool (concurrency {concurrency}) "
+              f"{t_pool:.2f} s / {stub.requests['gpt-4o']} requests")
+
+        # streamed: identical streams in flight share one upstream stream
+        stub.set("gpt-4o", latency_s=rtt_s, token_s=0.01, reply=" ".join(["load"] * 20))
+        t0 = time.perf_counter()
+        "".join(chat_stream(questions[0], client=client, chain=chain, health=ModelHealth()))
+        t_one = time.perf_counter() - t0
+        stub.requests.clear()
+        with ThreadPoolExecutor(sessions) as ex:
+            t0 = time.perf_counter()
+            list(ex.map(lambda q: "".join(pool.stream(q)), [questions[0]] * sessions))
+            t_stream = time.perf_counter() - t0
+        print(f"{sessions} identical streams: {t_stream:.2f} s (one stream alone {t_one:.2f} s), "
+              f"{stub.requests['gpt-4o']} upstream stream(s)")
+        print(pool.stats())
+        pool.close()
+
+
+def bench_respcache(questions: int, repeats: int, rtt_s: float) -> None:
+    """
+    Repeated free-form questions: every one to the model vs the disk
+    response cache. Cache behaviour is tested in tests/test_response_cache.py.
+    """
+    import tempfile
+    from openai import OpenAI
+
+    chain = ["gpt-4o"]
+    system = [{"role": "system", "content": "coach"}, {"role": "system", "content": "DATA SNAPSHOT (today)\n- Loads today: 412"}]
+    asks = [system + [{"role": "user", "content": f"How do we cut washout time at plant {i % questions}?"}]
+            for i in range(questions * repeats)]
+    with StubLLM({"gpt-4o": {"latency_s": rtt_s}}) as stub, tempfile.TemporaryDirectory() as tmp:
+        client = OpenAI(api_key="stub", base_url=stub.url, max_retries=0)
+        call = lambda m, t: chat_call(m, t, client=client, chain=chain, health=ModelHealth())
+        t_plain = _timeit(lambda: [call(m, 0.3) for m in asks])
+        stub.requests.clear()
+        cache = ResponseCache(f"{tmp}/responses.sqlite")
+        t0 = time.perf_counter()
+        hits = sum(cached_call(call, m, 0.3, cache)[2] for m in asks)
+        t_cached = time.perf_counter() - t0
+        print(f"{len(asks)} asks ({questions} distinct), {rtt_s * 1000:.0f} ms round trip: uncached {t_plain:.2f} s, "
+              f"cached {t_cached:.2f} s; {hits} hits, {stub.requests['gpt-4o']} upstream requests")
+
+        # a hit from a reopened cache (new process / session)
+        again = ResponseCache(f"{tmp}/responses.sqlite")
+        key = prompt_key(asks[0], 0.3)
+        t_hit = _timeit(lambda: again.get(key), 200) * 1e3
+        print(f"reopened cache: hit in {t_hit:.2f} ms")
+        print(cache.stats())
+
+
+def bench_history(turns: int, days: int) -> None:
+    """A shift-long chat: tokens sent per turn with the raw history vs compact_history."""
+    kpis = get_kpis(make_tickets(days * 1_500, days_back=days))
+    coach = "_model: gpt-4o_\n\n" + " ".join(["Stage the next load before the truck is back at the plant."] * 12)
+    history, rows = [], []
+    for i in range(turns):
+        q = SUGGESTED_PROMPTS[i % len(SUGGESTED_PROMPTS)]
+        reply = handle_simple_prompt(q, kpis) if i % 3 else None
+        history += [{"role": "user", "content": q}, {"role": "assistant", "content": reply or coach}]
+        t0 = time.perf_counter()
+        compact, report = compact_history(history)
+        rows.append((i + 1, message_tokens(history), report["history_tokens"], (time.perf_counter() - t0) * 1e3))
+    for n, raw, kept, ms in rows:
+        if n in (1, 5, 10, 25, 50, 100, 200) or n == turns:
+            print(f"turn {n:4d}: raw history {raw:6d} tokens, compacted {kept:5d} ({ms:.2f} ms)")
+    print("last prompt history:", {k: v for k, v in report.items()})
+    print(compact[0]["content"][:400])
+
+
+FREE_FORM = [
+    "How should I brief the drivers before the morning pour?",
+    "What would you change about our plant staging?",
+    "Any advice for reducing overtime this week?",
+    "Why are we slower on Fridays?",
+    "Write a short shift-start message for the dispatch team.",
+    "Which metric should I focus on tomorrow?",
+    "How do we cut washout time without skipping steps?",
+    "Explain productivity ratio to a new dispatcher.",
+]
+
+
+def _pcts(values) -> str:
+    v = np.asarray(values, dtype=float) * 1e3
+    return f"p50 {np.percentile(v, 50):8.2f} ms  p95 {np.percentile(v, 95):8.2f} ms" if len(v) else "–"
+
+
+def bench_e2e(days: int, first_s: float, token_s: float, words: int, rounds: int, max_p95_ms: float | None) -> int:
+    """
+    Full chat turn without Streamlit or network: rules -> data context ->
+    response cache -> model pool against the stub, over SUGGESTED_PROMPTS +
+    FREE_FORM. Round 1 is cold; later rounds repeat the corpus (cache hits).
+    """
+    df = make_tickets(days * 1_500, days_back=days)
+    kpis = get_kpis(df, samples=generate_samples(df))
+    corpus = list(SUGGESTED_PROMPTS) + FREE_FORM
+    reply = " ".join(["Keep trucks staged and the next load batched before they return."] * max(1, words // 10))
+    spec = {"latency_s": first_s, "token_s": token_s, "reply": reply}
+    with StubLLM({"gpt-4o": spec}) as stub:
+        pool = AsyncChat(chain=["gpt-4o"], health=ModelHealth(), api_key="stub", base_url=stub.url, max_retries=0)
+        cache = ResponseCache(":memory:")
+        ANSWERS.clear()
+        failed = False
+        for r in range(rounds):
+            history, turns = [], []
+            for q in corpus:
+                timings = {}
+                history.append({"role": "user", "content": q})
+                history.append({"role": "assistant", "content": answer_question(
+                    q, kpis, history, call=pool, cache=cache, timings=timings)})
+                turns.append(timings)
+            paths = pd.Series([t["path"] for t in turns]).value_counts()
+            print(f"round {r + 1}: {len(turns)} questions; " + ", ".join(f"{k} {v}" for k, v in paths.items())
+                  + f"; rule hit ratio {paths.get('rule', 0) / len(turns):.0%}")
+            for stage in ("route_s", "context_s", "llm_s", "total_s"):
+                print(f"  {stage[:-2]:8s} {_pcts([t[stage] for t in turns if stage in t])}")
+            for path in ("rule", "llm", "cache"):
+                if path in paths:
+                    print(f"  total/{path:5s} {_pcts([t['total_s'] for t in turns if t['path'] == path])}")
+            tokens = [t["prompt"]["prompt_tokens"] for t in turns if "prompt" in t]
+            if tokens:
+                print(f"  prompt tokens: max {max(tokens)}, mean {np.mean(tokens):.0f}")
+            rule_p95 = np.percentile([t["total_s"] for t in turns if t["path"] == "rule"] or [0.0], 95) * 1e3
+            if max_p95_ms is not None and rule_p95 > max_p95_ms:
+                print(f"  REGRESSION: rule-path p95 {rule_p95:.1f} ms > {max_p95_ms} ms")
+                failed = True
+        print(f"upstream requests {dict(stub.requests)}; cache {cache.stats()}")
+        pool.close()
+    return 1 if failed else 0
+
+
+TOOL_TURN = [
+    {"name": "wait_compare_today_vs_7day"},
+    {"name": "cycle_by_plant", "arguments": {"period": "week"}},
+    {"name": "jobs_cycle_time_over", "arguments": {"minutes": 200}},
+    {"name": "driver_scorecard_period", "arguments": {"days": 30, "metric": "avg_wait_min"}},
+    {"name": "signal_out_of_band", "arguments": {"signal": "hydraulic_pressure"}},
+    {"name": "wait_by_hour"},
+]
+
+
+def bench_tools(days: int, rtt_s: float) -> None:
+    """One model turn asking for several tools: sequential vs thread-pool execution, prompt size vs a full dump."""
+    from openai import OpenAI
+
+    df = make_tickets(days * 1_500, days_back=days)
+    kpis = get_kpis(df, samples=generate_samples(df))
+    kpis["cube"].build(), kpis["samples"].trucks  # lazy builds out of the timings
+    msgs = [{"role": "user", "content": "Why were we slow this week and what should I fix first?"}]
+    with StubLLM({"gpt-4o": {"latency_s": rtt_s, "tool_calls": TOOL_TURN}}) as stub:
+        client = OpenAI(api_key="stub", base_url=stub.url, max_retries=0)
+        for parallel in (False, True):
+            ANSWERS.clear()
+            trace = []
+            t0 = time.perf_counter()
+            model, text = chat_with_tools(msgs, kpis, parallel=parallel, trace=trace,
+                                          client=client, chain=["gpt-4o"], health=ModelHealth())
+            wall = time.perf_counter() - t0
+            busy = sum(c["seconds"] for c in trace)
+            slowest = max(trace, key=lambda c: c["seconds"])
+            print(f"{'parallel' if parallel else 'sequential':10s}: turn {wall:.2f} s ({len(trace)} tools, "
+                  f"{busy:.2f} s of tool work, slowest {slowest['name']} {slowest['seconds']:.2f} s, "
+                  f"2 model round trips of {rtt_s:.2f} s) -> {text!r}")
+        results = [serialize(run_tool(c["name"], c.get("arguments", {}), kpis)) for c in TOOL_TURN]
+        dump = [serialize(run_tool(name, {}, kpis)) for name in REGISTRY]
+        print(f"prompt data: {len(TOOL_TURN)} targeted tool results {sum(map(len, results)):,} chars vs every tool "
+              f"dumped {sum(map(len, dump)):,} chars; requests {dict(stub.requests)}")
+
+
+def bench_memo(days: int) -> None:
+    """SUGGESTED_PROMPTS + every tool on one data version: no shared intermediates vs the per-version memo."""
+    df = make_tickets(days * 1_500, days_back=days)
+    kpis = get_kpis(df, samples=generate_samples(df))
+    kpis["cube"].build(), kpis["samples"].trucks
+
+    def run():
+        ANSWERS.clear()
+        answers = {q: handle_simple_prompt(q, kpis) for q in SUGGESTED_PROMPTS}
+        answers.update({name: serialize(run_tool(name, {}, kpis)) for name in REGISTRY})
+        return answers
+
+    size = INTERMEDIATES.maxsize
+    INTERMEDIATES.clear()
+    INTERMEDIATES.maxsize = 0  # every intermediate recomputed
+    t0 = time.perf_counter()
+    before = run()
+    t_off = time.perf_counter() - t0
+    INTERMEDIATES.maxsize = size
+    INTERMEDIATES.clear()
+    t0 = time.perf_counter()
+    after = run()
+    t_on = time.perf_counter() - t0
+    stats = INTERMEDIATES.stats()
+    print(f"{len(SUGGESTED_PROMPTS)} prompts + {len(REGISTRY)} tools, {days} days: recomputed {t_off:.2f} s, "
+          f"shared {t_on:.2f} s; same answers: {before == after}; {stats['reused_total']} reuses")
+    for name, c in stats["by_name"].items():
+        print(f"  {name:15s} computed {c['computed']:3d}  reused {c['reused']:3d}  uncacheable {c['uncacheable']:3d}")
+
+
+def bench_topn(rows: int, directory: str, days: int, per_day: int) -> None:
+    """Ranking tools: full sort + head vs partial selection; archive-wide top-N: load + sort vs TopN over partitions."""
+    import tracemalloc
+
+    df = make_tickets(rows, days_back=30)
+    cols = ["ticket_id", "driver", "job_site", "dur_waiting"]
+    for n in (3, 50):
+        t_sort = _timeit(lambda: df.sort_values("dur_waiting", ascending=False, kind="stable").head(n)[cols], 3) * 1000
+        t_top = _timeit(lambda: top_n(df, "dur_waiting", n, cols=cols), 3) * 1000
+        same = df.sort_values("dur_waiting", ascending=False, kind="stable").head(n)[cols].equals(top_n(df, "dur_waiting", n, cols=cols))
+        print(f"{rows:,} rows, top {n}: sort_values+head {t_sort:7.1f} ms, top_n {t_top:6.1f} ms; same rows: {same}")
+    del df
+
+    now = datetime.now()
+    archive = TicketArchive(directory)
+    if archive.last_day() is None:
+        gen = dict(days_back=days, n_jobs_per_day=per_day, n_trucks=max(21, per_day // 4), now=now)
+        archive.write_chunks(iter_ticket_chunks(**gen))
+    cols = ["ticket_id", "driver", "origin_plant", "job_site", "cycle_time"]
+
+    def full():
+        hist = archive.read(columns=[*cols, "start_time"])
+        return hist.sort_values("cycle_time", ascending=False, kind="stable").head(20)[cols].reset_index(drop=True)
+
+    for label, fn in (("read all + sort", full), ("TopN over partitions", lambda: archive.top("cycle_time", 20, cols))):
+        dt = _timeit(fn, 3)
+        tracemalloc.start()  # separate run: tracing slows allocations down
+        out = fn()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        print(f"{len(archive.dates())} days of history, top 20 by cycle_time, {label:22s}: {dt:6.2f} s, peak {peak:7.1f} MiB")
+        if label == "read all + sort":
+            ref = out
+    print("same rows:", ref.astype(str).equals(out.astype(str)))
+
+
+def bench_shard(rows: int, days: int, by: str, workers: list[int], repeat: int = 3) -> None:
+    """
+    Headline KPIs of a multi-depot history: get_kpis in one process (whole
+    history, then cut to the KPI windows) vs per-`by` partials on a process pool.
+    """
+    now = datetime.now()
+    df = make_tickets(rows, days_back=days)
+    ref = get_kpis(df, now=now)
+    t_full = _timeit(lambda: get_kpis(df, now=now), repeat)
+    t_one = _timeit(lambda: get_kpis(df, now=now, window_only=True), repeat)
+    headline = {key: v for key, v in ref.items() if isinstance(v, (int, float))}
+    same_cut = _same_headline(get_kpis(df, now=now, window_only=True), headline)
+    print(f"{rows:,} rows over {days} days, {df[by].nunique()} shards by {by}, {os.cpu_count()} CPUs")
+    print(f"single process get_kpis: whole history {t_full:.3f} s, window_only {t_one:.3f} s "
+          f"({t_full / t_one:.1f}x); same headline: {same_cut}")
+    for w in workers:
+        t = _timeit(lambda: get_kpis_sharded(df, by=by, now=now, workers=w), repeat)
+        out = get_kpis_sharded(df, by=by, now=now, workers=w)
+        same = _same_headline(out, {key: ref[key] for key in out if key in ref})
+        tops = all(
+            top_n(ref[f"df_{window}"], order, n, cols=cols).reset_index(drop=True).astype(str)
+            .equals(out["top"][name].astype(str))
+            for name, (window, order, n, cols) in RANKINGS.items() if name in out["top"])
+        w = out["workers"]
+        print(f"sharded, {w} worker(s): {t:.3f} s, speedup {t_one / t:.2f}x vs single-process window_only "
+              f"({t_one / t / w:.2f}x per core); same headline: {same}, same top lists: {tops}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(prog="bench.py")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("kpis", help="row-wise vs vectorized get_kpis")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000, 5_000_000])
+    p.add_argument("--repeat", type=int, default=1)
+
+    p = sub.add_parser("incremental", help="KpiState.apply per new ticket vs full recompute")
+    p.add_argument("--history", type=int, default=1_000_000)
+    p.add_argument("--new", type=int, default=200)
+
+    p = sub.add_parser("slices", help="TicketStore window lookups vs boolean masks")
+    p.add_argument("--days", type=int, nargs="+", default=[7, 90, 730])
+
+    p = sub.add_parser("intents", help="handle_simple_prompt latency on the rollup cube")
+    p.add_argument("--days", type=int, nargs="+", default=[7, 90, 730])
+
+    p = sub.add_parser("router", help="intent routing latency vs the full guard walk")
+    p.add_argument("--record", metavar="BASELINE_DIR", help="re-record the fixture from a baseline checkout")
+
+    p = sub.add_parser("batch", help="cold prewarm of SUGGESTED_PROMPTS: own roll-ups vs shared intermediates")
+    p.add_argument("--days", type=int, default=90)
+
+    p = sub.add_parser("scorecard", help="driver scorecard windows vs raw groupby")
+    p.add_argument("--days", type=int, default=365)
+
+    p = sub.add_parser("memory", help="ticket frame memory: legacy dtypes vs compact schema")
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--per-day", type=int, default=1_500)
+
+    p = sub.add_parser("generate", help="ticket generator throughput: python vs numpy engine")
+    p.add_argument("--python-rows", type=int, default=50_000)
+    p.add_argument("--numpy-rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+
+    p = sub.add_parser("stream", help="out-of-core: chunked history through KpiState + aggregate_chunks")
+    p.add_argument("--days", type=int, default=3 * 365)
+    p.add_argument("--per-day", type=int, default=10_000)
+    p.add_argument("--chunk-rows", type=int, default=250_000)
+    p.add_argument("--dir", default=None, help="write parquet chunks here and stream them back")
+    p.add_argument("--verify", action="store_true", help="also build the frame in memory and compare")
+
+    p = sub.add_parser("archive", help="TicketArchive: window vs full-history load time")
+    p.add_argument("--dir", default="/tmp/ticket_archive")
+    p.add_argument("--days", type=int, default=730)
+    p.add_argument("--per-day", type=int, default=2_000)
+
+    p = sub.add_parser("ingest", help="CSV + telematics ingest into a TicketArchive")
+    p.add_argument("--dir", default="/tmp/ticket_ingest")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--chunksize", type=int, default=200_000)
+
+    p = sub.add_parser("sql", help="tool queries: pandas backend vs TicketDB (SQLite) pushdown")
+    p.add_argument("--db", default="/tmp/tickets.sqlite")
+    p.add_argument("--days", type=int, default=730)
+    p.add_argument("--per-day", type=int, default=2_000)
+
+    p = sub.add_parser("telemetry", help="SampleStore summaries vs pandas")
+    p.add_argument("--days", type=int, default=14)
+    p.add_argument("--per-day", type=int, default=300)
+
+    p = sub.add_parser("models", help="model fallback chain + health cache against a local stub server")
+    p.add_argument("--turns", type=int, default=20)
+    p.add_argument("--rtt", type=float, default=0.05, help="stub round trip, seconds")
+
+    p = sub.add_parser("ttft", help="time to first token: chat_call vs chat_stream against a local stub")
+    p.add_argument("--words", type=int, default=150)
+    p.add_argument("--first", type=float, default=0.4, help="stub delay before the first token, seconds")
+    p.add_argument("--token", type=float, default=0.02, help="stub delay per word, seconds")
+
+    p = sub.add_parser("coalesce", help="concurrent sessions: serial chat_call vs the pooled, coalescing async client")
+    p.add_argument("--sessions", type=int, default=32)
+    p.add_argument("--distinct", type=int, default=4, help="distinct questions among the sessions")
+    p.add_argument("--rtt", type=float, default=0.2, help="stub round trip, seconds")
+    p.add_argument("--concurrency", type=int, default=4)
+
+    p = sub.add_parser("respcache", help="repeated free-form questions: model calls vs the disk response cache")
+    p.add_argument("--questions", type=int, default=10)
+    p.add_argument("--repeats", type=int, default=5)
+    p.add_argument("--rtt", type=float, default=0.2, help="stub round trip, seconds")
+
+    p = sub.add_parser("history", help="prompt tokens per turn: raw chat history vs compact_history")
+    p.add_argument("--turns", type=int, default=100)
+    p.add_argument("--days", type=int, default=7)
+
+    p = sub.add_parser("e2e", help="end-to-end chat turns (rules -> context -> LLM) against a local stub, per-stage p50/p95")
+    p.add_argument("--days", type=int, default=7)
+    p.add_argument("--first", type=float, default=0.3, help="stub delay before the first token, seconds")
+    p.add_argument("--token", type=float, default=0.002, help="stub delay per word, seconds")
+    p.add_argument("--words", type=int, default=120, help="words per stub reply")
+    p.add_argument("--rounds", type=int, default=2)
+    p.add_argument("--max-p95-ms", type=float, default=None, help="exit 1 if the rule-path p95 exceeds this")
+
+    p = sub.add_parser("tools", help="tool-calling turn against a local stub: sequential vs parallel tool execution")
+    p.add_argument("--days", type=int, default=14)
+    p.add_argument("--rtt", type=float, default=0.1, help="stub round trip, seconds")
+
+    p = sub.add_parser("memo", help="shared per-data-version intermediates across intents and tools")
+    p.add_argument("--days", type=int, default=14)
+
+    p = sub.add_parser("topn", help="ranking: sort+head vs partial selection; archive-wide top-N via a bounded heap")
+    p.add_argument("--rows", type=int, default=2_000_000)
+    p.add_argument("--dir", default="/tmp/ticket_archive_topn")
+    p.add_argument("--days", type=int, default=3 * 365)
+    p.add_argument("--per-day", type=int, default=2_000)
+
+    p = sub.add_parser("shard", help="sharded multi-depot KPIs on a process pool vs single-process get_kpis")
+    p.add_argument("--rows", type=int, default=3_000_000)
+    p.add_argument("--days", type=int, default=730)
+    p.add_argument("--by", default="origin_plant")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+
+    args = ap.parse_args()
+    if args.cmd == "kpis":
+        bench_kpis(args.sizes, args.repeat)
+    elif args.cmd == "incremental":
+        bench_incremental(args.history, args.new)
+    elif args.cmd == "slices":
+        bench_slices(args.days)
+    elif args.cmd == "intents":
+        bench_intents(args.days)
+    elif args.cmd == "router":
+        record_router_baseline(args.record) if args.record else bench_router()
+    elif args.cmd == "batch":
+        bench_batch(args.days)
+    elif args.cmd == "generate":
+        bench_generate(args.python_rows, args.numpy_rows)
+    elif args.cmd == "stream":
+        bench_stream(args.days, args.per_day, args.chunk_rows, args.dir, args.verify)
+    elif args.cmd == "archive":
+        bench_archive(args.dir, args.days, args.per_day)
+    elif args.cmd == "ingest":
+        bench_ingest(args.dir, args.rows, args.chunksize)
+    elif args.cmd == "sql":
+        bench_sql(args.db, args.days, args.per_day)
+    elif args.cmd == "telemetry":
+        bench_telemetry(args.days, args.per_day)
+    elif args.cmd == "models":
+        bench_models(args.turns, args.rtt)
+    elif args.cmd == "ttft":
+        bench_ttft(args.words, args.first, args.token)
+    elif args.cmd == "respcache":
+        bench_respcache(args.questions, args.repeats, args.rtt)
+    elif args.cmd == "history":
+        bench_history(args.turns, args.days)
+    elif args.cmd == "e2e":
+        raise SystemExit(bench_e2e(args.days, args.first, args.token, args.words, args.rounds, args.max_p95_ms))
+    elif args.cmd == "tools":
+        bench_tools(args.days, args.rtt)
+    elif args.cmd == "memo":
+        bench_memo(args.days)
+    elif args.cmd == "topn":
+        bench_topn(args.rows, args.dir, args.days, args.per_day)
+    elif args.cmd == "shard":
+        bench_shard(args.rows, args.days, args.by, args.workers)
+    elif args.cmd == "coalesce":
+        bench_coalesce(args.sessions, args.distinct, args.rtt, args.concurrency)
+    elif args.cmd == "memory":
+        bench_memory(args.days, args.per_day)
+    elif args.cmd == "scorecard":
+        bench_scorecard(args.days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# chat_history.py – bounded chat history for LLM prompts (recent turns verbatim, older ones summarized)
+import re
+
+try:
+    import tiktoken
+    _ENC = tiktoken.get_encoding("o200k_base")
+except Exception:  # optional: fall back to ~4 characters per token
+    _ENC = None
+
+KEEP_TURNS = 4
+TOKEN_BUDGET = 1_500       # history share of the prompt (summary + verbatim turns)
+SUMMARY_TOKENS = 300       # the rolling summary never grows past this
+KEEP_ROWS = 3              # rows of a list / table kept from earlier deterministic answers
+
+_ROW = re.compile(r"^\s*(?:[-*•]|\d+\)|\d+\.|\|)\s*")
+_MODEL_TAG = re.compile(r"^_model: [^\n]*_\s*")
+_SENTENCE = re.compile(r"(?<=[.!?])\s")
+
+
+def count_tokens(text: str) -> int:
+    if _ENC is not None:
+        return len(_ENC.encode(text))
+    return (len(text) + 3) // 4
+
+
+def message_tokens(messages: list[dict]) -> int:
+    """Prompt tokens of a chat request (content plus a few per message for role framing)."""
+    return sum(count_tokens(m.get("content") or "") + 4 for m in messages) + 2
+
+
+def _turns(history: list[dict]) -> list[list[dict]]:
+    """Split into turns: a user message and the replies that follow it."""
+    turns = []
+    for m in history:
+        if m["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append({"role": m["role"], "content": m.get("content") or ""})
+    return turns
+
+
+def trim_rows(text: str, keep: int = KEEP_ROWS) -> str:
+    """Cut each bulleted list / markdown table to its first `keep` rows."""
+    out, run, dropped = [], 0, 0
+    for line in text.splitlines():
+        if _ROW.match(line):
+            run += 1
+            if run > keep:
+                dropped += 1
+                continue
+        else:
+            if dropped:
+                out.append(f"(+{dropped} more rows omitted)")
+            run, dropped = 0, 0
+        out.append(line)
+    if dropped:
+        out.append(f"(+{dropped} more rows omitted)")
+    return "\n".join(out)
+
+
+def _gist(text: str, limit: int) -> str:
+    """First sentence / line of `text`, markdown stripped, at most `limit` characters."""
+    text = _MODEL_TAG.sub("", text).replace("**", "").replace("_", "").strip()
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()] or [""]
+    first = _SENTENCE.split(lines[0], 1)[0].strip()
+    if first.endswith(":") and len(lines) > 1:  # a list heading: keep its top row
+        first += " " + _ROW.sub("", lines[1])
+    return first if len(first) <= limit else first[: limit - 1].rstrip() + "…"
+
+
+def summarize(turns: list[list[dict]], max_tokens: int = SUMMARY_TOKENS) -> str:
+    """One line per turn (question → gist of the answer), newest kept when over `max_tokens`."""
+    lines = []
+    for turn in turns:
+        q = next((m["content"] for m in turn if m["role"] == "user"), "")
+        a = next((m["content"] for m in turn if m["role"] == "assistant"), "")
+        lines.append(f"- Q: {_gist(q, 120)}" + (f" → A: {_gist(a, 160)}" if a else ""))
+    head = "Earlier in this chat (summary):"
+    kept, used = [], count_tokens(head)
+    for line in reversed(lines):
+        used += count_tokens(line) + 1
+        if used > max_tokens:
+            break
+        kept.append(line)
+    return "\n".join([head, *reversed(kept)]) if kept else ""
+
+
+def compact_history(history: list[dict], *, keep_turns: int = KEEP_TURNS, budget: int = TOKEN_BUDGET,
+                    summary_tokens: int = SUMMARY_TOKENS) -> tuple[list[dict], dict]:
+    """
+    History to send with the next question, within `budget` tokens.
+
+    The last `keep_turns` turns go verbatim, except that deterministic
+    answers (no `_model:` tag) before the latest turn keep only their first
+    rows. Older turns fold into one summary system message; if the result
+    is still over budget, the oldest verbatim turns fold in too (the latest
+    one always stays). Returns (messages, report).
+    """
+    turns = _turns(history)
+    for turn in turns[:-1]:
+        for m in turn:
+            if m["role"] == "assistant" and not _MODEL_TAG.match(m["content"]):
+                m["content"] = trim_rows(m["content"])
+    split = max(0, len(turns) - keep_turns)
+    while True:
+        summary = summarize(turns[:split], summary_tokens) if split else ""
+        messages = ([{"role": "system", "content": summary}] if summary else []) + [m for t in turns[split:] for m in t]
+        tokens = message_tokens(messages)
+        if tokens <= budget or split >= len(turns) - 1:
+            break
+        split += 1
+    return messages, {
+        "turns": len(turns),
+        "verbatim_turns": len(turns) - split,
+        "summarized_turns": split,
+        "history_tokens": tokens,
+        "raw_history_tokens": message_tokens(history),
+    }
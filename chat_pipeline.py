@@ -0,0 +1,139 @@
+# chat_pipeline.py – one chat turn without Streamlit: rules -> data context -> model chain
+import os
+import time
+
+import pandas as pd
+
+from chat_history import compact_history, message_tokens
+from coach_core import handle_simple_prompt
+from instruction_set import GUIDELINES
+from model_utils import LLM_POOL
+from prompt_utils import build_system_prompt
+from response_cache import RESPONSES, cached_call, prompt_key
+from tool_registry import chat_with_tools
+from tone_style import COACH_STYLE
+
+TEMPERATURE = 0.3
+# offer tools.py to the model as function calls (small targeted results instead of a fixed snapshot)
+USE_TOOLS = os.getenv("COACH_LLM_TOOLS", "0") == "1"
+
+
+def build_data_context(k: dict) -> str:
+    """Compact snapshot the model can rely on."""
+    def fmt(x):
+        return "–" if x is None or pd.isna(x) else f"{x:.1f}" if isinstance(x, (float, int)) else str(x)
+
+    lines = [
+        "DATA SNAPSHOT (today)",
+        f"- Loads today: {k.get('loads_today', 0)}",
+        f"- Loads yesterday: {k.get('loads_yesterday', 0)}",
+        f"- Avg wait (min): {fmt(k.get('avg_wait_min'))}",
+        f"- Utilization (%): {fmt(k.get('utilization_pct'))}",
+        f"- Productivity ratio (%): {fmt(k.get('prod_ratio'))}",
+        f"- Productive minutes: {fmt(k.get('prod_prod_min'))}",
+        f"- Idle minutes: {fmt(k.get('prod_idle_min'))}",
+        f"- Active trucks: {k.get('n_trucks', 0)}",
+        f"- Fuel used today (L): {fmt(k.get('fuel_L_today'))}",
+        f"- Distance today (km): {fmt(k.get('distance_km_today'))}",
+        f"- Volume today (m³): {fmt(k.get('m3_today'))}",
+    ]
+    return "\n".join(lines)
+
+
+def llm_messages(user_input: str, kpis: dict, history: list[dict]) -> tuple[list[dict], dict]:
+    """System prompt, data snapshot, compacted history and the question; plus the prompt report."""
+    # the question being answered may already be the last history entry
+    if history and history[-1]["role"] == "user" and history[-1]["content"] == user_input:
+        history = history[:-1]
+    past, report = compact_history(history)  # recent turns verbatim, older ones summarized
+    messages = [
+        {"role": "system", "content": build_system_prompt(GUIDELINES, COACH_STYLE)},
+        {"role": "system", "content": build_data_context(kpis)},
+        *past,
+        {"role": "user", "content": user_input},
+    ]
+    return messages, {**report, "prompt_tokens": message_tokens(messages)}
+
+
+class ReplyStream:
+    """
+    LLM reply of `answer_question(..., stream=True)`: iterate for text deltas.
+    Once exhausted, the reply is in the response cache and `reply` holds it
+    tagged with the model, as `answer_question` returns it.
+    """
+
+    def __init__(self, stream, key: str, cache, timings: dict, t0: float):
+        self._stream = stream
+        self._key = key
+        self._cache = cache
+        self._timings = timings
+        self._t0 = t0
+        self.reply: str | None = None
+
+    @property
+    def model(self) -> str | None:
+        return self._stream.model
+
+    @property
+    def ttft_s(self) -> float | None:
+        return self._stream.ttft_s
+
+    def __iter__(self):
+        t0, parts = time.perf_counter(), []
+        for delta in self._stream:
+            parts.append(delta)
+            yield delta
+        text = "".join(parts)
+        if text:
+            self._cache.put(self._key, self.model, text, self._stream.total_s or 0.0)
+        t1 = time.perf_counter()
+        self._timings.update(llm_s=t1 - t0, total_s=t1 - self._t0, model=self.model)
+        self.reply = f"_model: {self.model}_\n\n{text}"
+
+
+def answer_question(user_input: str, kpis: dict, history: list[dict], *, call=None, cache=None,
+                    tools: bool = USE_TOOLS, stream: bool = False, timings: dict | None = None) -> "str | ReplyStream":
+    """
+    Route to rules first, then the LLM (response cache, then `call`,
+    default the shared `LLM_POOL`, or the tool-calling loop with `tools`)
+    with the data context.
+
+    With `stream`, an LLM call that can stream (`call.stream`, as on
+    `LLM_POOL`) comes back as a `ReplyStream`; rule answers, cache hits
+    and the tool-calling loop still return the whole reply.
+
+    `timings`, if given, receives seconds per stage (`route_s`,
+    `context_s`, `llm_s`, `total_s`), the `path` taken (rule / cache / llm)
+    and the prompt report.
+    """
+    timings = {} if timings is None else timings
+    t0 = time.perf_counter()
+    # Quick deterministic answers
+    simple = handle_simple_prompt(user_input, kpis)
+    t1 = time.perf_counter()
+    timings["route_s"] = t1 - t0
+    if simple:
+        timings.update(path="rule", total_s=t1 - t0)
+        return simple
+
+    messages, report = llm_messages(user_input, kpis, history)
+    t2 = time.perf_counter()
+    timings.update(context_s=t2 - t1, prompt=report)
+    # disk cache first (same prompt + same data snapshot), then the shared pool:
+    # identical questions from other sessions in flight share one API call
+    if call is None:
+        call = (lambda m, t: chat_with_tools(m, kpis, t)) if tools else LLM_POOL
+    cache = RESPONSES if cache is None else cache
+    if stream and hasattr(call, "stream"):
+        key = prompt_key(messages, TEMPERATURE)
+        found = cache.get(key)
+        if found is None:
+            timings["path"] = "llm"
+            return ReplyStream(call.stream(messages, temperature=TEMPERATURE), key, cache, timings, t0)
+        (model_used, text), hit = found, True
+    else:
+        model_used, text, hit = cached_call(call, messages, TEMPERATURE, cache)
+    t3 = time.perf_counter()
+    timings.update(path="cache" if hit else "llm", llm_s=t3 - t2, total_s=t3 - t0, model=model_used)
+    # Tag the model used (optional)
+    return f"_model: {model_used}{' (cached)' if hit else ''}_\n\n{text}"
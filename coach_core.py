@@ -6,6 +6,15 @@ import math
 import re
 import pandas as pd
 
+from answer_cache import ANSWERS
+from intent_router import IntentRouter
+from intermediates import period_rollup, scorecard, signal_summary
+from rollup import RollupCube, kpis_window, mean
+from schema import ticket_label, widen
+from telemetry import SampleStore, out_of_band
+from topn import top_n
+from ticket_store import TicketStore
+
 
 # -------------------------
 # Helpers
@@ -16,6 +25,12 @@ def _mins(a, b):
     return (b - a).total_seconds() / 60
 
 
+def _mins_col(a: pd.Series, b: pd.Series) -> pd.Series:
+    """Vectorized `_mins` over two datetime columns (NaT -> NaN)."""
+    a, b = (s if pd.api.types.is_datetime64_any_dtype(s) else pd.to_datetime(s) for s in (a, b))
+    return (b - a).dt.total_seconds() / 60
+
+
 def _safe_mean(series: pd.Series) -> float:
     if series is None or len(series) == 0:
         return float("nan")
@@ -32,26 +47,57 @@ def _price_from_text(text: str) -> float | None:
     return float(m.group(1).replace(",", "."))
 
 
+def _fuel_type(text: str) -> str:
+    if any(w in text for w in ["gasoline", "petrol"]):
+        return "gasoline"
+    return os.getenv("COACH_DEFAULT_FUEL", "diesel").lower()
+
+
 # -------------------------
 # KPI Extraction
 # -------------------------
-def get_kpis(df: pd.DataFrame, op_minutes: int = 600) -> dict:
+# every get_kpis window (today, yesterday, 48h, week) starts within this of `now`
+KPI_HORIZON = timedelta(days=7)
+
+
+def window_rows(df: pd.DataFrame, now: datetime) -> pd.DataFrame:
+    """Rows of `df` some `get_kpis` window can see: started in the last `KPI_HORIZON`."""
+    start = df["start_time"]
+    if not pd.api.types.is_datetime64_any_dtype(start):
+        start = pd.to_datetime(start)
+    return df[(start >= pd.Timestamp(now - KPI_HORIZON)).to_numpy()]
+
+
+def get_kpis(df: pd.DataFrame | TicketStore, op_minutes: int = 600, now: datetime | None = None,
+             samples: SampleStore | None = None, db=None, window_only: bool = False) -> dict:
     """
     Compute KPIs and return a dict with slices:
     - df_today / df_yesterday / df_week / df_48h
     - headline KPIs (loads, utilization, wait, etc.)
     - totals for fuel, distance, m3
-    """
-    now = datetime.now()
-    today = now.date()
-    df = df.copy()
-    df["date"] = df["start_time"].dt.date
-    df["hour"] = df["start_time"].dt.hour
 
-    df_today = df[df["date"] == today]
-    df_yesterday = df[df["date"] == today - timedelta(days=1)]
-    df_week = df[df["start_time"] >= now - timedelta(days=7)]
-    df_48h = df[df["start_time"] >= now - timedelta(hours=48)]
+    Slices are partition lookups / binary searches on a `TicketStore`
+    (returned as `kpis["store"]`); dwell minutes use datetime64 arithmetic.
+    `kpis["cube"]` is a lazily built `RollupCube` for grouped intents.
+    `samples` (drum RPM / hydraulic pressure telematics) is kept as
+    `kpis["samples"]`; without it those intents fall back to per-ticket scalars.
+    `db` (a `ticket_db.TicketDB` holding `df` and older history) is kept as
+    `kpis["db"]`: grouped intents and tools then query its windows in SQL.
+    `window_only` drops rows older than `KPI_HORIZON` before the store is
+    built: the headline KPIs are the same, but `store` / `cube` (driver
+    periods, last-day fallbacks) then only hold the last 7 days.
+    """
+    now = now or datetime.now()
+    today = pd.Timestamp(now).normalize()
+    if window_only:
+        df = df.since(now - KPI_HORIZON) if isinstance(df, TicketStore) else window_rows(df, now)
+    store = df if isinstance(df, TicketStore) else TicketStore(df)
+
+    df = store.frame
+    df_today = store.day(today)
+    df_yesterday = store.day(today - timedelta(days=1))
+    df_week = store.since(now - timedelta(days=7))
+    df_48h = store.since(now - timedelta(hours=48))
 
     # Utilization today
     n_trucks_today = df_today["truck"].nunique()
@@ -60,32 +106,39 @@ def get_kpis(df: pd.DataFrame, op_minutes: int = 600) -> dict:
     utilization_today = (cycle_minutes_today / denom_today * 100) if denom_today else float("nan")
 
     # Productivity today (plant/site dwell safety)
-    for c in ("ignition_on", "first_ticket", "last_return", "ignition_off"):
-        if c not in df_today.columns:
-            df_today[c] = pd.NaT
-    df_today["min_total"] = df_today.apply(lambda r: _mins(r.ignition_on, r.ignition_off), axis=1)
-    df_today["min_prod"] = df_today.apply(lambda r: _mins(r.first_ticket, r.last_return), axis=1)
-    df_today["prod_ratio"] = df_today["min_prod"] / df_today["min_total"] * 100
+    missing = {c: pd.NaT for c in ("ignition_on", "first_ticket", "last_return", "ignition_off") if c not in df_today}
+    df_today = df_today.assign(**missing)
+    min_total = _mins_col(df_today["ignition_on"], df_today["ignition_off"])
+    min_prod = _mins_col(df_today["first_ticket"], df_today["last_return"])
+    df_today = df_today.assign(min_total=min_total, min_prod=min_prod, prod_ratio=min_prod / min_total * 100)
     prod_prod_min = df_today["min_prod"].sum(skipna=True)
     prod_total_min = df_today["min_total"].sum(skipna=True)
     prod_idle_min = prod_total_min - prod_prod_min
 
     # Totals/today
-    fuel_L_today = df_today["fuel_used_L"].sum() if "fuel_used_L" in df_today else float("nan")
-    distance_km_today = df_today["distance_km"].sum() if "distance_km" in df_today else float("nan")
-    m3_today = df_today["load_volume_m3"].sum() if "load_volume_m3" in df_today else float("nan")
+    fuel_L_today = widen(df_today["fuel_used_L"]).sum() if "fuel_used_L" in df_today else float("nan")
+    distance_km_today = widen(df_today["distance_km"]).sum() if "distance_km" in df_today else float("nan")
+    m3_today = widen(df_today["load_volume_m3"]).sum() if "load_volume_m3" in df_today else float("nan")
     avg_wait_min_today = _safe_mean(df_today["dur_waiting"]) if "dur_waiting" in df_today else float("nan")
 
     # Rolling 7-day utilization (sum cycle minutes / sum op minutes per truck per day)
     util_week = float("nan")
     if not df_week.empty:
-        # trucks per day
-        daily_trucks = df_week.groupby(df_week["date"])["truck"].nunique()
-        total_op_min = (daily_trucks * op_minutes).sum()
+        # distinct (day, truck) pairs == sum of trucks per day
+        truck_days = df_week[["date", "truck"]].dropna().drop_duplicates().shape[0]
+        total_op_min = truck_days * op_minutes
         total_cycle = df_week["cycle_time"].sum()
         util_week = (total_cycle / total_op_min * 100) if total_op_min else float("nan")
 
     return {
+        "now": now,
+        "data_version": f"{store.version}@{pd.Timestamp(now).isoformat()}/{op_minutes}"
+                        + (f"+{samples.version}" if samples is not None else "")
+                        + (f"+db:{db.version}" if db is not None else ""),
+        "store": store,
+        "db": db,
+        "cube": RollupCube(store),
+        "samples": samples,
         "df": df,
         "df_today": df_today,
         "df_yesterday": df_yesterday,
@@ -112,280 +165,426 @@ def get_kpis(df: pd.DataFrame, op_minutes: int = 600) -> dict:
 # -------------------------
 # Intent Rules covering all suggestions
 # -------------------------
+INTENTS = IntentRouter()
+
+
 def handle_simple_prompt(prompt: str, kpis: dict) -> str | None:
+    """
+    Answer from the data if a deterministic intent matches, else None.
+    Answers are cached on (intent, prompt parameters, kpis["data_version"]).
+    """
     p = (prompt or "").lower()
-    df = kpis["df"]
-    df_today = kpis["df_today"]
-    df_yesterday = kpis["df_yesterday"]
-    df_week = kpis["df_week"]
-    df_48h = kpis["df_48h"]
+    intent = INTENTS.route(p)
+    if intent is None:
+        return None
+    version = kpis.get("data_version")
+    if version is None:
+        return intent.handler(p, kpis)
+    return ANSWERS.get_or_compute((intent.name, intent.params(p), version), lambda: intent.handler(p, kpis))
 
-    # 1) Volume today vs yesterday
-    if "volume" in p and "today" in p and "yesterday" in p:
-        v_t = df_today["load_volume_m3"].sum()
-        v_y = df_yesterday["load_volume_m3"].sum()
-        delta = v_t - v_y
-        sign = "▲" if delta >= 0 else "▼"
-        return f"Delivered volume — today: **{v_t:.1f} m³**, yesterday: **{v_y:.1f} m³** ({sign} **{delta:+.1f} m³**)."
-
-    # 2) Driver most water this week
-    if "driver" in p and "most water" in p:
-        top = df_week.groupby("driver")["water_added_L"].sum().sort_values(ascending=False)
-        if top.empty:
-            return "No water addition records this week."
-        return f"Top water addition this week: **{top.index[0]}** with **{top.iloc[0]:.1f} L**."
-
-    # 3) Top three jobs longest wait last 48h
-    if "longest wait" in p or ("top three" in p and "wait" in p):
-        if "dur_waiting" not in df_48h:
-            return "No waiting-time data available."
-        top3 = df_48h.sort_values("dur_waiting", ascending=False).head(3)[["job_site", "dur_waiting"]]
-        if top3.empty:
-            return "No loads in the last 48 hours."
-        lines = [f"- {r.job_site}: **{int(r.dur_waiting)} min**" for _, r in top3.iterrows()]
-        return "**Top 3 longest waits (last 48h):**\n" + "\n".join(lines)
-
-    # 4) Utilization vs 85% benchmark past 7 days
-    if "utilization" in p and ("7" in p or "past 7" in p or "week" in p or "benchmark" in p):
-        bench = 85.0
-        actual = kpis.get("utilization_7d_pct", float("nan"))
-        if pd.isna(actual):
-            return "Not enough data to compute 7-day utilization."
-        delta = actual - bench
-        status = "above" if delta >= 0 else "below"
-        return f"7-day utilization: **{actual:.1f}%**, which is **{abs(delta):.1f}% {status}** the **{bench}%** benchmark."
-
-    # 5) Stage causing biggest delay this week
-    if "stage" in p and ("biggest" in p or "causing" in p or "delay" in p) and "week" in p:
-        stage_cols = [c for c in df_week.columns if c.startswith("dur_")]
-        if not stage_cols:
-            return "No stage timing data available."
-        means = df_week[stage_cols].mean(numeric_only=True).sort_values(ascending=False)
-        best = means.index[0].replace("dur_", "").replace("_", " ")
-        return f"The stage with the highest average duration this week is **{best}** (≈ **{means.iloc[0]:.1f} min**)."
-
-    # 6) Fuel cost today at $X/L
-    if "fuel" in p and "cost" in p:
-        price = _price_from_text(p)
-        if price is None:
-            return "Include a price per litre (e.g., **$1.80/L**) to estimate today’s fuel cost."
-        L = kpis.get("fuel_L_today", float("nan"))
-        if pd.isna(L):
-            return "No fuel usage for today."
-        return f"Fuel used today: **{L:,.1f} L** × **${price:.2f}/L** ≈ **${L*price:,.2f}**."
-
-    # 7) Most efficient driver by m³/hr today
-    if "efficient driver" in p or ("m³" in p and "/ hr" in p and "today" in p):
-        grp = df_today.groupby("driver").apply(lambda g: g["load_volume_m3"].sum() / (g["cycle_time"].sum() / 60))
-        if grp.empty:
-            return "No driver data for today."
-        top = grp.sort_values(ascending=False).head(1)
-        return f"Most efficient driver today: **{top.index[0]}** at **{top.iloc[0]:.2f} m³/hr**."
-
-    # 8) Drum RPM outliers this week
-    if "rpm" in p or "drum" in p:
-        if "drum_rpm" not in df_week:
-            return "No drum RPM data available."
-        low = df_week[df_week["drum_rpm"] < 4.0]
-        high = df_week[df_week["drum_rpm"] > 6.5]
-        return (
-            f"Drum RPM outliers this week:\n"
-            f"- Low (< 4): **{len(low)}** loads\n"
-            f"- High (> 6.5): **{len(high)}** loads"
-        )
 
-    # 9) Breakdown of average cycle time per plant this week
-    if "cycle time" in p and "plant" in p:
-        tbl = df_week.groupby("origin_plant")["cycle_time"].mean().sort_values()
-        lines = [f"- {idx}: **{val:.1f} min**" for idx, val in tbl.items()]
-        return "**Avg cycle time by plant (week):**\n" + "\n".join(lines)
-
-    # 10) Projects exceeded target m³/load (target 9.5)
-    if "target" in p and "m³ / load" in p:
-        target = 9.5
-        tbl = df_week.groupby("project")["load_volume_m3"].mean()
-        winners = tbl[tbl > target]
-        if winners.empty:
-            return f"No projects exceeded **{target} m³/load** this week."
-        lines = [f"- {idx}: **{val:.2f} m³/load**" for idx, val in winners.sort_values(ascending=False).items()]
-        return f"Projects above **{target} m³/load** this week:\n" + "\n".join(lines)
-
-    # 11) Compare today wait to 7-day avg
-    if "compare" in p and "wait" in p:
-        today_w = _safe_mean(df_today["dur_waiting"]) if "dur_waiting" in df_today else float("nan")
-        week_w = _safe_mean(df_week["dur_waiting"])  if "dur_waiting" in df_week  else float("nan")
-        if pd.isna(today_w) or pd.isna(week_w):
-            return "Waiting-time data not available."
-        delta = today_w - week_w
-        word = "higher" if delta > 0 else "lower"
-        return f"Today’s avg wait: **{today_w:.1f} min**, 7-day avg: **{week_w:.1f} min** (**{abs(delta):.1f} min {word}**)."
-
-    # 12) Jobs distance > 40 km + tips
-    if "distance" in p and ("> 40" in p or "greater than 40" in p):
-        long = df_week[df_week["distance_km"] > 40][["job_site", "distance_km"]]
-        if long.empty:
-            return "No jobs over 40 km this week."
-        preview = long.sort_values("distance_km", ascending=False).head(10)
-        lines = [f"- {r.job_site}: **{r.distance_km:.1f} km**" for _, r in preview.iterrows()]
+def handle_prompts_batch(prompts: list[str], kpis: dict) -> dict[str, str | None]:
+    """
+    Answer many prompts at once (e.g. to prewarm SUGGESTED_PROMPTS).
+
+    All prompts are routed first; the roll-up cube is then built once and
+    every distinct (intent, parameters) pair answered once, intents that
+    need the same window roll-up, scorecard or telemetry summary sharing it
+    through `intermediates`. Unmatched prompts map to None.
+    """
+    routed = {}
+    for q in prompts:
+        p = (q or "").lower()
+        routed[q] = (INTENTS.route(p), p)
+    if any(intent is not None for intent, _ in routed.values()) and kpis.get("db") is None:
+        kpis["cube"].build()  # one build, shared by every roll-up below
+    version = kpis.get("data_version")
+    answers, done = {}, {}
+    for q, (intent, p) in routed.items():
+        if intent is None:
+            answers[q] = None
+            continue
+        key = (intent.name, intent.params(p), version)
+        if key not in done:
+            compute = lambda: intent.handler(p, kpis)
+            done[key] = compute() if version is None else ANSWERS.get_or_compute(key, compute)
+        answers[q] = done[key]
+    return answers
+
+
+# 1) Volume today vs yesterday
+@INTENTS.intent("volume_today_vs_yesterday", keywords=("volume", "today", "yesterday"),
+                when=lambda p: "volume" in p and "today" in p and "yesterday" in p)
+def _volume_today_vs_yesterday(p: str, kpis: dict) -> str:
+    v_t = period_rollup(kpis, "today", [])["load_volume_m3"].iloc[0]
+    v_y = period_rollup(kpis, "yesterday", [])["load_volume_m3"].iloc[0]
+    delta = v_t - v_y
+    sign = "▲" if delta >= 0 else "▼"
+    return f"Delivered volume — today: **{v_t:.1f} m³**, yesterday: **{v_y:.1f} m³** ({sign} **{delta:+.1f} m³**)."
+
+
+# 2) Driver most water this week
+@INTENTS.intent("driver_most_water", keywords=("driver", "most water"),
+                when=lambda p: "driver" in p and "most water" in p)
+def _driver_most_water(p: str, kpis: dict) -> str:
+    top = scorecard(kpis_window(kpis, "week"))["water_L"].sort_values(ascending=False)
+    if top.empty:
+        return "No water addition records this week."
+    return f"Top water addition this week: **{top.index[0]}** with **{top.iloc[0]:.1f} L**."
+
+
+# 3) Top three jobs longest wait last 48h
+@INTENTS.intent("top_wait_48h", keywords=("longest wait", "top three", "wait"),
+                when=lambda p: "longest wait" in p or ("top three" in p and "wait" in p))
+def _top_wait_48h(p: str, kpis: dict) -> str:
+    df_48h = kpis["df_48h"]
+    if "dur_waiting" not in df_48h:
+        return "No waiting-time data available."
+    top3 = top_n(df_48h, "dur_waiting", 3, cols=["job_site", "dur_waiting"])
+    if top3.empty:
+        return "No loads in the last 48 hours."
+    lines = [f"- {r.job_site}: **{int(r.dur_waiting)} min**" for _, r in top3.iterrows()]
+    return "**Top 3 longest waits (last 48h):**\n" + "\n".join(lines)
+
+
+# 4) Utilization vs 85% benchmark past 7 days
+@INTENTS.intent("utilization_vs_benchmark", keywords=("utilization", "7", "week", "benchmark"),
+                when=lambda p: "utilization" in p and ("7" in p or "past 7" in p or "week" in p or "benchmark" in p))
+def _utilization_vs_benchmark(p: str, kpis: dict) -> str:
+    bench = 85.0
+    actual = kpis.get("utilization_7d_pct", float("nan"))
+    if pd.isna(actual):
+        return "Not enough data to compute 7-day utilization."
+    delta = actual - bench
+    status = "above" if delta >= 0 else "below"
+    return f"7-day utilization: **{actual:.1f}%**, which is **{abs(delta):.1f}% {status}** the **{bench}%** benchmark."
+
+
+# 5) Stage causing biggest delay this week
+@INTENTS.intent("stage_biggest_delay", keywords=("stage", "biggest", "causing", "delay", "week"),
+                when=lambda p: "stage" in p and ("biggest" in p or "causing" in p or "delay" in p) and "week" in p)
+def _stage_biggest_delay(p: str, kpis: dict) -> str:
+    stage_cols = [c for c in kpis["df_week"].columns if c.startswith("dur_")]
+    if not stage_cols:
+        return "No stage timing data available."
+    tot = period_rollup(kpis, "week", [])
+    means = pd.Series({c: mean(tot, c).iloc[0] for c in stage_cols}).sort_values(ascending=False)
+    best = means.index[0].replace("dur_", "").replace("_", " ")
+    return f"The stage with the highest average duration this week is **{best}** (≈ **{means.iloc[0]:.1f} min**)."
+
+
+# 6) Fuel cost today at $X/L
+@INTENTS.intent("fuel_cost_today", keywords=("fuel", "cost"),
+                when=lambda p: "fuel" in p and "cost" in p,
+                params=lambda p: (_price_from_text(p),))
+def _fuel_cost_today(p: str, kpis: dict) -> str:
+    price = _price_from_text(p)
+    if price is None:
+        return "Include a price per litre (e.g., **$1.80/L**) to estimate today’s fuel cost."
+    L = kpis.get("fuel_L_today", float("nan"))
+    if pd.isna(L):
+        return "No fuel usage for today."
+    return f"Fuel used today: **{L:,.1f} L** × **${price:.2f}/L** ≈ **${L*price:,.2f}**."
+
+
+# 7) Most efficient driver by m³/hr today
+@INTENTS.intent("efficient_driver_today", keywords=("efficient driver", "m³", "/ hr", "today"),
+                when=lambda p: "efficient driver" in p or ("m³" in p and "/ hr" in p and "today" in p))
+def _efficient_driver_today(p: str, kpis: dict) -> str:
+    grp = scorecard(kpis_window(kpis, "today"))["m3_per_hr"]
+    if grp.empty:
+        return "No driver data for today."
+    top = grp.sort_values(ascending=False).head(1)
+    return f"Most efficient driver today: **{top.index[0]}** at **{top.iloc[0]:.2f} m³/hr**."
+
+
+# 8) Drum RPM outliers this week
+@INTENTS.intent("drum_rpm_outliers", keywords=("rpm", "drum"),
+                when=lambda p: "rpm" in p or "drum" in p)
+def _drum_rpm_outliers(p: str, kpis: dict) -> str:
+    summary = signal_summary(kpis, "week")
+    if summary is not None:
+        o = out_of_band(summary, "drum_rpm")
+        lo, hi = o["band"]
         return (
-            "**Jobs > 40 km (week):**\n" + "\n".join(lines) +
-            "\n\nRouting tip: cluster deliveries, check closest plant, and align departure windows to avoid peak traffic."
+            f"Drum RPM outside {lo:g}–{hi:g} this week ({o['sampled_loads']} loads sampled):\n"
+            f"- Low (< {lo:g}): **{o['low_loads']}** loads, **{o['low_min']:,.0f} min** in total\n"
+            f"- High (> {hi:g}): **{o['high_loads']}** loads, **{o['high_min']:,.0f} min** in total"
         )
+    df_week = kpis["df_week"]
+    if "drum_rpm" not in df_week:
+        return "No drum RPM data available."
+    low = df_week[df_week["drum_rpm"] < 4.0]
+    high = df_week[df_week["drum_rpm"] > 6.5]
+    return (
+        f"Drum RPM outliers this week:\n"
+        f"- Low (< 4): **{len(low)}** loads\n"
+        f"- High (> 6.5): **{len(high)}** loads"
+    )
+
+
+# 9) Breakdown of average cycle time per plant this week
+@INTENTS.intent("cycle_by_plant", keywords=("cycle time", "plant"),
+                when=lambda p: "cycle time" in p and "plant" in p)
+def _cycle_by_plant(p: str, kpis: dict) -> str:
+    tbl = mean(period_rollup(kpis, "week", "origin_plant"), "cycle_time").sort_values()
+    lines = [f"- {idx}: **{val:.1f} min**" for idx, val in tbl.items()]
+    return "**Avg cycle time by plant (week):**\n" + "\n".join(lines)
+
+
+# 10) Projects exceeded target m³/load (target 9.5)
+@INTENTS.intent("projects_over_target", keywords=("target", "m³ / load"),
+                when=lambda p: "target" in p and "m³ / load" in p)
+def _projects_over_target(p: str, kpis: dict) -> str:
+    target = 9.5
+    tbl = mean(period_rollup(kpis, "week", "project"), "load_volume_m3")
+    winners = tbl[tbl > target]
+    if winners.empty:
+        return f"No projects exceeded **{target} m³/load** this week."
+    lines = [f"- {idx}: **{val:.2f} m³/load**" for idx, val in winners.sort_values(ascending=False).items()]
+    return f"Projects above **{target} m³/load** this week:\n" + "\n".join(lines)
+
+
+# 11) Compare today wait to 7-day avg
+@INTENTS.intent("wait_today_vs_week", keywords=("compare", "wait"),
+                when=lambda p: "compare" in p and "wait" in p)
+def _wait_today_vs_week(p: str, kpis: dict) -> str:
+    today_w = mean(period_rollup(kpis, "today", []), "dur_waiting").iloc[0] if "dur_waiting" in kpis["df_today"] else float("nan")
+    week_w = mean(period_rollup(kpis, "week", []), "dur_waiting").iloc[0] if "dur_waiting" in kpis["df_week"] else float("nan")
+    if pd.isna(today_w) or pd.isna(week_w):
+        return "Waiting-time data not available."
+    delta = today_w - week_w
+    word = "higher" if delta > 0 else "lower"
+    return f"Today’s avg wait: **{today_w:.1f} min**, 7-day avg: **{week_w:.1f} min** (**{abs(delta):.1f} min {word}**)."
+
+
+# 12) Jobs distance > 40 km + tips
+@INTENTS.intent("distance_over_40", keywords=("distance", "> 40", "greater than 40"),
+                when=lambda p: "distance" in p and ("> 40" in p or "greater than 40" in p))
+def _distance_over_40(p: str, kpis: dict) -> str:
+    df_week = kpis["df_week"]
+    long = df_week[df_week["distance_km"] > 40]
+    if long.empty:
+        return "No jobs over 40 km this week."
+    preview = top_n(long, "distance_km", 10, cols=["job_site", "distance_km"])
+    lines = [f"- {r.job_site}: **{r.distance_km:.1f} km**" for _, r in preview.iterrows()]
+    return (
+        "**Jobs > 40 km (week):**\n" + "\n".join(lines) +
+        "\n\nRouting tip: cluster deliveries, check closest plant, and align departure windows to avoid peak traffic."
+    )
+
+
+# 13) Loads with water added > 120 L this week
+@INTENTS.intent("water_over_120", keywords=("water", "> 120", "greater than 120"),
+                when=lambda p: "water" in p and ("> 120" in p or "greater than 120" in p))
+def _water_over_120(p: str, kpis: dict) -> str:
+    df_week = kpis["df_week"]
+    hot = df_week[df_week["water_added_L"] > 120][["ticket_id", "driver", "water_added_L", "project"]]
+    if hot.empty:
+        return "No loads exceeded 120 L of added water this week."
+    lines = [f"- {ticket_label(r.ticket_id)} ({r.driver}) – **{r.water_added_L:.0f} L** on *{r.project}*" for _, r in hot.head(10).iterrows()]
+    return "**Loads with water added > 120 L (week):**\n" + "\n".join(lines)
+
+
+# 14) Predict tomorrow loads as 7-day average
+@INTENTS.intent("predict_tomorrow_loads", keywords=("predict", "tomorrow"),
+                when=lambda p: "predict" in p and "tomorrow" in p)
+def _predict_tomorrow_loads(p: str, kpis: dict) -> str:
+    daily = period_rollup(kpis, "week", "date")["loads"]
+    if daily.empty:
+        return "No data to forecast tomorrow’s loads."
+    pred = daily.mean()
+    return f"Based on the last 7 days, expected loads tomorrow ≈ **{pred:.0f}**."
+
+
+# 15) Hours today with worst wait times
+@INTENTS.intent("worst_wait_hours_today", keywords=("hour", "wait", "today"),
+                when=lambda p: ("hours" in p or "hour" in p) and "wait" in p and "today" in p)
+def _worst_wait_hours_today(p: str, kpis: dict) -> str:
+    if "dur_waiting" not in kpis["df_today"]:
+        return "No waiting-time data today."
+    by_hour = mean(period_rollup(kpis, "today", "hour"), "dur_waiting").sort_values(ascending=False).head(3)
+    lines = [f"- {int(h):02d}:00 → **{v:.1f} min**" for h, v in by_hour.items()]
+    return "**Worst wait hours (today):**\n" + "\n".join(lines)
+
+
+# 16) Site with most total waiting time this week
+@INTENTS.intent("site_most_waiting", keywords=("site", "waiting", "week"),
+                when=lambda p: "site" in p and "waiting" in p and "week" in p)
+def _site_most_waiting(p: str, kpis: dict) -> str:
+    if "dur_waiting" not in kpis["df_week"]:
+        return "No waiting-time data for the week."
+    agg = period_rollup(kpis, "week", "job_site")["dur_waiting"].sort_values(ascending=False)
+    if agg.empty:
+        return "No site data available."
+    return f"Site with most total waiting this week: **{agg.index[0]}** (≈ **{agg.iloc[0]:.0f} min**)."
+
+
+# 17) CO2 emissions today (diesel default; gasoline if mentioned)
+@INTENTS.intent("co2_today", keywords=("co2", "emission", "today"),
+                when=lambda p: ("co2" in p or "emission" in p) and "today" in p,
+                params=lambda p: (_fuel_type(p),))
+def _co2_today(p: str, kpis: dict) -> str:
+    L = kpis.get("fuel_L_today", float("nan"))
+    if pd.isna(L) or L <= 0:
+        return "No fuel usage for today, so CO₂ can’t be computed."
+    fuel_type = _fuel_type(p)
+    factor = 2.31 if fuel_type == "gasoline" else 2.68
+    kg = L * factor
+    t = kg / 1000.0
+    return f"CO₂ today using **{fuel_type}**: **{kg:,.0f} kg** (≈ **{t:.3f} t**) from **{L:,.1f} L**."
+
+
+# 18) Empirical best-practice cycle for ~30 km (use data window 27–33 km)
+@INTENTS.intent("best_cycle_30km", keywords=("best", "30 km", "cycle"),
+                when=lambda p: "best" in p and "30 km" in p and "cycle" in p)
+def _best_cycle_30km(p: str, kpis: dict) -> str:
+    df_week = kpis["df_week"]
+    window = df_week[(df_week["distance_km"] >= 27) & (df_week["distance_km"] <= 33)]
+    if window.empty:
+        avg = df_week["cycle_time"].mean()
+        return f"No 30 km window loads this week; overall avg cycle = **{avg:.1f} min**."
+    return f"Empirical cycle time for ~30 km (27–33 km) = **{window['cycle_time'].mean():.1f} min**."
+
+
+# 19) Hydraulic pressure extremes this week
+@INTENTS.intent("hydraulic_extremes", keywords=("hydraulic", "pressure", "week"),
+                when=lambda p: "hydraulic" in p or ("pressure" in p and "week" in p))
+def _hydraulic_extremes(p: str, kpis: dict) -> str:
+    summary = signal_summary(kpis, "week")
+    if summary is not None:
+        o = out_of_band(summary, "hydraulic_pressure")
+        lo, hi = o["band"]
+        return (f"Pressure outside {lo:g}–{hi:g} psi this week: low: **{o['low_loads']}** loads "
+                f"(**{o['low_min']:,.0f} min**); high: **{o['high_loads']}** loads (**{o['high_min']:,.0f} min**).")
+    df_week = kpis["df_week"]
+    if "hydraulic_pressure" not in df_week:
+        return "No hydraulic pressure data available."
+    low = df_week[df_week["hydraulic_pressure"] < 1850]
+    high = df_week[df_week["hydraulic_pressure"] > 2150]
+    return f"Pressure extremes this week: low (<1850): **{len(low)}** loads; high (>2150): **{len(high)}** loads."
+
 
-    # 13) Loads with water added > 120 L this week
-    if "water" in p and ("> 120" in p or "greater than 120" in p):
-        hot = df_week[df_week["water_added_L"] > 120][["ticket_id", "driver", "water_added_L", "project"]]
-        if hot.empty:
-            return "No loads exceeded 120 L of added water this week."
-        lines = [f"- {r.ticket_id} ({r.driver}) – **{r.water_added_L:.0f} L** on *{r.project}*" for _, r in hot.head(10).iterrows()]
-        return "**Loads with water added > 120 L (week):**\n" + "\n".join(lines)
-
-    # 14) Predict tomorrow loads as 7-day average
-    if "predict" in p and "tomorrow" in p:
-        daily = df_week.groupby("date")["ticket_id"].count()
-        if daily.empty:
-            return "No data to forecast tomorrow’s loads."
-        pred = daily.mean()
-        return f"Based on the last 7 days, expected loads tomorrow ≈ **{pred:.0f}**."
-
-    # 15) Hours today with worst wait times
-    if ("hours" in p or "hour" in p) and "wait" in p and "today" in p:
-        if "dur_waiting" not in df_today:
-            return "No waiting-time data today."
-        by_hour = df_today.groupby("hour")["dur_waiting"].mean().sort_values(ascending=False).head(3)
-        lines = [f"- {int(h):02d}:00 → **{v:.1f} min**" for h, v in by_hour.items()]
-        return "**Worst wait hours (today):**\n" + "\n".join(lines)
-
-    # 16) Site with most total waiting time this week
-    if "site" in p and "waiting" in p and "week" in p:
-        if "dur_waiting" not in df_week:
-            return "No waiting-time data for the week."
-        agg = df_week.groupby("job_site")["dur_waiting"].sum().sort_values(ascending=False)
-        if agg.empty:
-            return "No site data available."
-        return f"Site with most total waiting this week: **{agg.index[0]}** (≈ **{agg.iloc[0]:.0f} min**)."
-
-    # 17) CO2 emissions today (diesel default; gasoline if mentioned)
-    if ("co2" in p or "emission" in p) and "today" in p:
-        L = kpis.get("fuel_L_today", float("nan"))
-        if pd.isna(L) or L <= 0:
-            return "No fuel usage for today, so CO₂ can’t be computed."
-        fuel_type = "gasoline" if any(w in p for w in ["gasoline", "petrol"]) else os.getenv("COACH_DEFAULT_FUEL", "diesel").lower()
-        factor = 2.31 if fuel_type == "gasoline" else 2.68
-        kg = L * factor
-        t = kg / 1000.0
-        return f"CO₂ today using **{fuel_type}**: **{kg:,.0f} kg** (≈ **{t:.3f} t**) from **{L:,.1f} L**."
-
-    # 18) Empirical best-practice cycle for ~30 km (use data window 27–33 km)
-    if "best" in p and "30 km" in p and "cycle" in p:
-        window = df_week[(df_week["distance_km"] >= 27) & (df_week["distance_km"] <= 33)]
-        if window.empty:
-            avg = df_week["cycle_time"].mean()
-            return f"No 30 km window loads this week; overall avg cycle = **{avg:.1f} min**."
-        return f"Empirical cycle time for ~30 km (27–33 km) = **{window['cycle_time'].mean():.1f} min**."
-
-    # 19) Hydraulic pressure extremes this week
-    if "hydraulic" in p or ("pressure" in p and "week" in p):
-        if "hydraulic_pressure" not in df_week:
-            return "No hydraulic pressure data available."
-        low = df_week[df_week["hydraulic_pressure"] < 1850]
-        high = df_week[df_week["hydraulic_pressure"] > 2150]
-        return f"Pressure extremes this week: low (<1850): **{len(low)}** loads; high (>2150): **{len(high)}** loads."
-
-    # 20) 5 slowest washout times this week
-    if "washout" in p or ("wash" in p and "slow" in p):
-        col = "washout_duration_min" if "washout_duration_min" in df_week else "dur_washing"
-        if col not in df_week:
-            return "No washout duration data available."
-        slow = df_week.sort_values(col, ascending=False).head(5)[["ticket_id", "driver", col]]
-        lines = [f"- {r.ticket_id} ({r.driver}) – **{getattr(r, col):.1f} min**" for _, r in slow.iterrows()]
-        return "**5 slowest washouts (week):**\n" + "\n".join(lines)
-
-    # 21) Top 3 cost-saving opportunities this week (data-driven heuristics)
-    if "cost" in p and "opportunit" in p:
-        # Heuristic estimates
-        loads = len(df_week)
-        avg_wait = _safe_mean(df_week["dur_waiting"]) if "dur_waiting" in df_week else 0
-        avg_dist = _safe_mean(df_week["distance_km"]) if "distance_km" in df_week else 0
-        fuel_L = df_week["fuel_used_L"].sum() if "fuel_used_L" in df_week else 0
-
-        # Assumptions
-        hourly_rate = float(os.getenv("COACH_RATE_PER_HOUR", "45"))  # $/hr
-        fuel_price = float(os.getenv("COACH_FUEL_PRICE", "1.80"))    # $/L
-
-        save_wait_min = 3.0  # target cut
-        save_wait_cost = (save_wait_min / 60) * hourly_rate * loads
-
-        # 2% routing improvement on distance & fuel
-        route_gain_km = 0.02 * df_week["distance_km"].sum() if "distance_km" in df_week else 0
-        route_gain_fuel_cost = 0.02 * fuel_L * fuel_price
-
-        # RPM normalization – assume 1% fuel reduction if >6.5 or <4 exist
-        rpm_outliers = 0
-        if "drum_rpm" in df_week:
-            rpm_outliers = len(df_week[(df_week["drum_rpm"] < 4.0) | (df_week["drum_rpm"] > 6.5)])
-        rpm_gain_cost = 0.01 * fuel_L * fuel_price if rpm_outliers > 0 else 0
-
-        lines = [
-            f"1) Cut wait by 3 min/load → ≈ **${save_wait_cost:,.0f}** /week saved.",
-            f"2) Improve routing by 2% → ≈ **{route_gain_km:,.0f} km** & **${route_gain_fuel_cost:,.0f}** fuel saved.",
-            f"3) Normalize RPM (fix {rpm_outliers} outliers) → ≈ **${rpm_gain_cost:,.0f}** fuel saved.",
-        ]
-        return "**Top 3 cost-saving opportunities (week):**\n" + "\n".join(lines)
-
-    # 22) Driver consistently beats m³/hr benchmark ≥ 3.5 this week
-    if "consistently" in p and "m³ / hr" in p:
-        bench = 3.5
-        perf = df_week.groupby("driver").apply(lambda g: g["load_volume_m3"].sum() / (g["cycle_time"].sum() / 60))
-        winners = perf[perf >= bench].sort_values(ascending=False)
-        if winners.empty:
-            return f"No drivers met the **{bench} m³/hr** benchmark this week."
-        lines = [f"- {idx}: **{val:.2f} m³/hr**" for idx, val in winners.items()]
-        return f"Drivers ≥ **{bench} m³/hr** (week):\n" + "\n".join(lines)
-
-    # 23) Rank plants by average cycle time this week
-    if "rank" in p and "plant" in p and "cycle" in p:
-        tbl = df_week.groupby("origin_plant")["cycle_time"].mean().sort_values()
-        lines = [f"{i+1}. {idx}: **{val:.1f} min**" for i, (idx, val) in enumerate(tbl.items())]
-        return "**Plants by avg cycle (best → worst):**\n" + "\n".join(lines)
-
-    # 24) Days when fuel L/km > 0.55 this week
-    if "fuel" in p and "/ km" in p:
-        if not {"fuel_used_L", "distance_km"}.issubset(df_week.columns):
-            return "Missing fuel/distance data."
-        daily = df_week.assign(l_per_km=df_week["fuel_used_L"] / df_week["distance_km"])
-        flag = daily.groupby("date")["l_per_km"].mean()
-        hot = flag[flag > 0.55]
-        if hot.empty:
-            return "No days exceeded **0.55 L/km** this week."
-        lines = [f"- {str(d)}: **{v:.2f} L/km**" for d, v in hot.items()]
-        return "**Days > 0.55 L/km (week):**\n" + "\n".join(lines)
-
-    # 25) Quick wins to boost utilization above 88 %
-    if "quick wins" in p or ("boost" in p and "utilization" in p):
-        util_today = kpis.get("utilization_pct", float("nan"))
-        loads_today = kpis.get("loads_today", 0)
-        tips = [
-            "Shorten loading to <7 min (prep tickets, pre-stage aggregates).",
-            "Pre-call sites 20 min before arrival to minimize gate delays.",
-            "Schedule washout windows to avoid peak return congestion.",
-        ]
-        lead = f"Utilization today: **{util_today:.1f}%**. To move toward **88%+**:"
-        lines = [f"- {t}" for t in tips]
-        return lead + "\n" + "\n".join(lines)
-
-    # --- Common extras for completeness ---
-
-    # Simple: loads today
-    if "loads" in p and "today" in p:
-        return f"Loads delivered today: **{kpis.get('loads_today', 0)}**."
-
-    # Simple: avg wait today
-    if "average wait" in p or "avg wait" in p:
-        w = kpis.get("avg_wait_min", float("nan"))
-        if pd.isna(w):
-            return "No waiting-time data."
-        return f"Average wait today is **{w:.1f} min**."
-
-    # Fallback
-    return None
+# 20) 5 slowest washout times this week
+@INTENTS.intent("slowest_washouts", keywords=("washout", "wash", "slow"),
+                when=lambda p: "washout" in p or ("wash" in p and "slow" in p))
+def _slowest_washouts(p: str, kpis: dict) -> str:
+    df_week = kpis["df_week"]
+    col = "washout_duration_min" if "washout_duration_min" in df_week else "dur_washing"
+    if col not in df_week:
+        return "No washout duration data available."
+    slow = top_n(df_week, col, 5, cols=["ticket_id", "driver", col])
+    lines = [f"- {ticket_label(r.ticket_id)} ({r.driver}) – **{getattr(r, col):.1f} min**" for _, r in slow.iterrows()]
+    return "**5 slowest washouts (week):**\n" + "\n".join(lines)
+
+
+# 21) Top 3 cost-saving opportunities this week (data-driven heuristics)
+@INTENTS.intent("cost_saving_opportunities", keywords=("cost", "opportunit"),
+                when=lambda p: "cost" in p and "opportunit" in p,
+                params=lambda p: (os.getenv("COACH_RATE_PER_HOUR", "45"), os.getenv("COACH_FUEL_PRICE", "1.80")))
+def _cost_saving_opportunities(p: str, kpis: dict) -> str:
+    df_week = kpis["df_week"]
+    # Heuristic estimates
+    tot = period_rollup(kpis, "week", [])
+    loads = int(tot["loads"].iloc[0])
+    avg_wait = mean(tot, "dur_waiting").iloc[0] if "dur_waiting" in df_week else 0
+    avg_dist = mean(tot, "distance_km").iloc[0] if "distance_km" in df_week else 0
+    fuel_L = tot["fuel_used_L"].iloc[0] if "fuel_used_L" in df_week else 0
+
+    # Assumptions
+    hourly_rate = float(os.getenv("COACH_RATE_PER_HOUR", "45"))  # $/hr
+    fuel_price = float(os.getenv("COACH_FUEL_PRICE", "1.80"))    # $/L
+
+    save_wait_min = 3.0  # target cut
+    save_wait_cost = (save_wait_min / 60) * hourly_rate * loads
+
+    # 2% routing improvement on distance & fuel
+    route_gain_km = 0.02 * tot["distance_km"].iloc[0] if "distance_km" in df_week else 0
+    route_gain_fuel_cost = 0.02 * fuel_L * fuel_price
+
+    # RPM normalization – assume 1% fuel reduction if >6.5 or <4 exist
+    rpm_outliers = 0
+    summary = signal_summary(kpis, "week")
+    if summary is not None:
+        o = out_of_band(summary, "drum_rpm")
+        rpm_outliers = o["low_loads"] + o["high_loads"]
+    elif "drum_rpm" in df_week:
+        rpm_outliers = len(df_week[(df_week["drum_rpm"] < 4.0) | (df_week["drum_rpm"] > 6.5)])
+    rpm_gain_cost = 0.01 * fuel_L * fuel_price if rpm_outliers > 0 else 0
+
+    lines = [
+        f"1) Cut wait by 3 min/load → ≈ **${save_wait_cost:,.0f}** /week saved.",
+        f"2) Improve routing by 2% → ≈ **{route_gain_km:,.0f} km** & **${route_gain_fuel_cost:,.0f}** fuel saved.",
+        f"3) Normalize RPM (fix {rpm_outliers} outliers) → ≈ **${rpm_gain_cost:,.0f}** fuel saved.",
+    ]
+    return "**Top 3 cost-saving opportunities (week):**\n" + "\n".join(lines)
+
+
+# 22) Driver consistently beats m³/hr benchmark ≥ 3.5 this week
+@INTENTS.intent("drivers_beat_m3_per_hr", keywords=("consistently", "m³ / hr"),
+                when=lambda p: "consistently" in p and "m³ / hr" in p)
+def _drivers_beat_m3_per_hr(p: str, kpis: dict) -> str:
+    bench = 3.5
+    perf = scorecard(kpis_window(kpis, "week"))["m3_per_hr"]
+    winners = perf[perf >= bench].sort_values(ascending=False)
+    if winners.empty:
+        return f"No drivers met the **{bench} m³/hr** benchmark this week."
+    lines = [f"- {idx}: **{val:.2f} m³/hr**" for idx, val in winners.items()]
+    return f"Drivers ≥ **{bench} m³/hr** (week):\n" + "\n".join(lines)
+
+
+# 23) Rank plants by average cycle time this week
+@INTENTS.intent("rank_plants_by_cycle", keywords=("rank", "plant", "cycle"),
+                when=lambda p: "rank" in p and "plant" in p and "cycle" in p)
+def _rank_plants_by_cycle(p: str, kpis: dict) -> str:
+    tbl = mean(period_rollup(kpis, "week", "origin_plant"), "cycle_time").sort_values()
+    lines = [f"{i+1}. {idx}: **{val:.1f} min**" for i, (idx, val) in enumerate(tbl.items())]
+    return "**Plants by avg cycle (best → worst):**\n" + "\n".join(lines)
+
+
+# 24) Days when fuel L/km > 0.55 this week
+@INTENTS.intent("fuel_l_per_km_days", keywords=("fuel", "/ km"),
+                when=lambda p: "fuel" in p and "/ km" in p)
+def _fuel_l_per_km_days(p: str, kpis: dict) -> str:
+    if not {"fuel_used_L", "distance_km"}.issubset(kpis["df_week"].columns):
+        return "Missing fuel/distance data."
+    flag = mean(period_rollup(kpis, "week", "date"), "l_per_km")
+    hot = flag[flag > 0.55]
+    if hot.empty:
+        return "No days exceeded **0.55 L/km** this week."
+    lines = [f"- {d:%Y-%m-%d}: **{v:.2f} L/km**" for d, v in hot.items()]
+    return "**Days > 0.55 L/km (week):**\n" + "\n".join(lines)
+
+
+# 25) Quick wins to boost utilization above 88 %
+@INTENTS.intent("utilization_quick_wins", keywords=("quick wins", "boost", "utilization"),
+                when=lambda p: "quick wins" in p or ("boost" in p and "utilization" in p))
+def _utilization_quick_wins(p: str, kpis: dict) -> str:
+    util_today = kpis.get("utilization_pct", float("nan"))
+    tips = [
+        "Shorten loading to <7 min (prep tickets, pre-stage aggregates).",
+        "Pre-call sites 20 min before arrival to minimize gate delays.",
+        "Schedule washout windows to avoid peak return congestion.",
+    ]
+    lead = f"Utilization today: **{util_today:.1f}%**. To move toward **88%+**:"
+    lines = [f"- {t}" for t in tips]
+    return lead + "\n" + "\n".join(lines)
+
+
+# --- Common extras for completeness ---
+
+# Simple: loads today
+@INTENTS.intent("loads_today", keywords=("loads", "today"),
+                when=lambda p: "loads" in p and "today" in p)
+def _loads_today(p: str, kpis: dict) -> str:
+    return f"Loads delivered today: **{kpis.get('loads_today', 0)}**."
+
+
+# Simple: avg wait today
+@INTENTS.intent("avg_wait_today", keywords=("average wait", "avg wait"),
+                when=lambda p: "average wait" in p or "avg wait" in p)
+def _avg_wait_today(p: str, kpis: dict) -> str:
+    w = kpis.get("avg_wait_min", float("nan"))
+    if pd.isna(w):
+        return "No waiting-time data."
+    return f"Average wait today is **{w:.1f} min**."
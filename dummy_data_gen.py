@@ -1,10 +1,15 @@
 # dummy_data_gen.py – deterministic dummy data with seed
 import streamlit as st
+import numpy as np
 import pandas as pd
+import os
 import random
 from datetime import datetime, timedelta
 from math import sin, cos, sqrt, atan2, radians
 
+from schema import compact
+from telemetry import SampleStore
+
 _PLANTS = {
     "Montreal":       (45.550, -73.700),
     "Laval":          (45.610, -73.720),
@@ -32,8 +37,189 @@ def _haversine(p, s):
     c = 2 * atan2(sqrt(a), sqrt(1-a))
     return R * c
 
+_STAGES = ["dispatch", "loaded", "en_route", "waiting", "discharging", "washing", "back"]
+
+# plant × site great-circle distance (km, 1 dp), rows/cols in dict order
+_DIST_KM = np.array([[round(_haversine(p, s), 1) for s in _SITES.values()] for p in _PLANTS.values()])
+
+
+def _categorical(codes: np.ndarray, labels: list[str]) -> pd.Categorical:
+    order = np.argsort(labels)  # categories sorted, as `astype("category")` would
+    remap = np.empty(len(labels), dtype=np.int8)
+    remap[order] = np.arange(len(labels))
+    return pd.Categorical.from_codes(remap[codes], categories=[labels[i] for i in order])
+
+
+def _base(now: datetime | None) -> datetime:
+    return (now or datetime.now()).replace(hour=6, minute=0, second=0, microsecond=0)
+
+
+def generate_tickets(*, days_back: int = 7, n_jobs_per_day: int = 60, seed: int = 7,
+                     n_trucks: int = 21, now: datetime | None = None) -> pd.DataFrame:
+    """
+    Vectorized generator (numpy `Generator`): same columns, distributions and
+    compact dtypes as the row-by-row `load_data`, at millions of rows per second.
+    Deterministic for a given seed and `now`; not row-identical to the Python engine.
+    Trucks are numbered from 100 (`n_trucks=21` matches the Python engine).
+    """
+    day = np.repeat(np.arange(days_back, dtype=np.int64), n_jobs_per_day)
+    return _generate(np.random.default_rng(seed), day, n_trucks, _base(now), first_id=10000)
+
+
+def iter_ticket_chunks(*, days_back: int = 365, n_jobs_per_day: int = 60, seed: int = 7,
+                       n_trucks: int = 21, now: datetime | None = None, chunk_rows: int = 250_000):
+    """
+    Yield the same history as `generate_tickets` would hold in memory, as
+    frames of `chunk_rows` tickets, oldest first (ticket ids keep counting up).
+    Only one chunk is alive at a time. Deterministic per seed, but chunk
+    contents depend on `chunk_rows` and differ from `generate_tickets`.
+    """
+    base = _base(now)
+    n = days_back * n_jobs_per_day
+    for i, lo in enumerate(range(0, n, chunk_rows)):
+        rows = np.arange(lo, min(lo + chunk_rows, n), dtype=np.int64)
+        day = days_back - 1 - rows // n_jobs_per_day
+        yield _generate(np.random.default_rng([seed, i]), day, n_trucks, base, first_id=10000 + lo)
+
+
+def write_ticket_chunks(directory: str, **kwargs) -> list[str]:
+    """Write `iter_ticket_chunks(**kwargs)` as `tickets-<n>.parquet` files (needs pyarrow)."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, chunk in enumerate(iter_ticket_chunks(**kwargs)):
+        path = os.path.join(directory, f"tickets-{i:05d}.parquet")
+        chunk.to_parquet(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def read_ticket_chunks(directory: str):
+    """Yield the chunks written by `write_ticket_chunks`, in order, in schema dtypes."""
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("tickets-") and name.endswith(".parquet"):
+            yield compact(pd.read_parquet(os.path.join(directory, name)))
+
+
+def generate_samples(tickets: pd.DataFrame, *, period_s: int = 5, seed: int = 7) -> SampleStore:
+    """
+    Drum RPM / hydraulic pressure every `period_s` seconds over each ticket's
+    cycle, scattered around the ticket's scalar value (so per-ticket means
+    stay close to `drum_rpm` / `hydraulic_pressure`).
+    """
+    rng = np.random.default_rng(seed)
+    n = (tickets["cycle_time"].to_numpy(dtype=np.int64) * 60) // period_s
+    row = np.repeat(np.arange(len(tickets)), n)
+    k = np.arange(len(row)) - np.repeat(np.cumsum(n) - n, n)  # sample number within its ticket
+    start = tickets["start_time"].to_numpy(dtype="datetime64[us]")
+    store = SampleStore()
+    store.append(
+        tickets["truck"].to_numpy()[row],
+        start[row] + (k * period_s).astype("timedelta64[s]"),
+        drum_rpm=tickets["drum_rpm"].to_numpy(dtype=np.float32)[row] + rng.normal(0, 0.35, len(row)),
+        hydraulic_pressure=tickets["hydraulic_pressure"].to_numpy(dtype=np.float32)[row] + rng.normal(0, 30, len(row)),
+    )
+    return store
+
+
+def _generate(rng: np.random.Generator, day: np.ndarray, n_trucks: int, base: datetime, first_id: int) -> pd.DataFrame:
+    """One ticket per entry of `day` (days before `base`), ids from `first_id`."""
+    n = len(day)
+
+    def ints(lo, hi):  # inclusive, like random.randint
+        return rng.integers(lo, hi + 1, size=n, dtype=np.int16)
+
+    # start, in minutes from the base day's 06:00
+    start_min = -day * 1440 + rng.integers(0, 12 * 60 + 1, size=n)
+    plant = rng.integers(0, len(_PLANTS), size=n, dtype=np.int8)
+    site = rng.integers(0, len(_SITES), size=n, dtype=np.int8)
+    dist_km = _DIST_KM[plant, site]
+
+    en_route = np.maximum(5, (dist_km / 1.8).astype(np.int16))
+    durs = {
+        "dispatch": ints(8, 20),
+        "loaded": ints(4, 9),
+        "en_route": en_route,
+        "waiting": ints(3, 15),
+        "discharging": ints(8, 18),
+        "washing": ints(4, 9),
+        "back": en_route,
+    }
+    to_return = sum(durs[s].astype(np.int64) for s in _STAGES[:-1])
+    arrival = start_min + durs["dispatch"] + durs["loaded"] + en_route
+
+    fuel = np.round(dist_km * rng.uniform(0.35, 0.55, size=n), 1)
+    water = np.round(rng.uniform(50, 160, size=n), 1)
+    rpm = rng.uniform(3.0, 6.5, size=n)
+    slump = _BENCH_SLUMP + ints(-10, 15)
+    return_m3 = np.round(rng.random(size=n) * 0.5, 2)
+    pressure = np.round(rng.uniform(1800, 2200, size=n), 1)
+    washout = ints(5, 20)
+    driver = rng.integers(0, len(_DRIVERS), size=n, dtype=np.int8)
+    project = rng.integers(0, len(_PROJECTS), size=n, dtype=np.int8)
+    eta_offset = ints(-20, 20)
+    ign_on = start_min - ints(20, 40)
+    last_return = start_min + to_return
+    ign_off = last_return + ints(10, 30)
+    truck = rng.integers(100, 100 + n_trucks, size=n).astype(np.int16 if n_trucks < 32_000 else np.int32)
+
+    base_us = np.datetime64(base, "us")
+
+    def ts(minutes):
+        return base_us + minutes.astype("timedelta64[m]")
+
+    df = pd.DataFrame({
+        "ticket_id": np.arange(first_id, first_id + n, dtype=np.int32),
+        "truck": truck,
+        "driver": _categorical(driver, _DRIVERS),
+        "project": _categorical(project, _PROJECTS),
+        "origin_plant": _categorical(plant, list(_PLANTS)),
+        "job_site": _categorical(site, list(_SITES)),
+        "start_time": ts(start_min),
+        "cycle_time": (to_return + en_route).astype(np.int16),
+        "distance_km": dist_km.astype(np.float32),
+        "fuel_used_L": fuel.astype(np.float32),
+        "water_added_L": water.astype(np.float32),
+        "drum_rpm": rpm.astype(np.float32),
+        "slump_adjustment": slump,
+        "return_volume_m3": return_m3.astype(np.float32),
+        "hydraulic_pressure": pressure.astype(np.float32),
+        "washout_duration_min": washout,
+        "ETA": ts(arrival - eta_offset),
+        "actual_arrival": ts(arrival),
+        "load_volume_m3": np.full(n, 10, dtype=np.float32),
+        "ignition_on": ts(ign_on),
+        "first_ticket": ts(start_min),
+        "last_return": ts(last_return),
+        "ignition_off": ts(ign_off),
+        **{f"dur_{s}": durs[s] for s in _STAGES},
+    })
+    df["date"] = ts(-day * 1440 - 360)  # service date: midnight before the 06:00 base
+    return df
+
+
 @st.cache_data
-def load_data(*, days_back: int = 7, n_jobs_per_day: int = 60, seed: int = 7) -> pd.DataFrame:
+def load_data(*, days_back: int = 7, n_jobs_per_day: int = 60, seed: int = 7, engine: str = "python",
+              backend: str = "generate", path: str | None = None) -> pd.DataFrame:
+    """
+    Tickets in the `schema.SCHEMA` dtypes.
+    backend="generate": dummy data; engine="numpy" uses the vectorized `generate_tickets`.
+    backend="arrow": the last `days_back` days of the `TicketArchive` at `path`
+    (default env TICKET_ARCHIVE); only those partitions are opened.
+    backend="sqlite": the last `days_back` days of the `TicketDB` at `path`
+    (default env TICKET_DB), range-scanned on its start_time index.
+    """
+    if backend == "arrow":
+        from ticket_archive import TicketArchive
+        return TicketArchive(path or os.environ["TICKET_ARCHIVE"]).read_days(days_back)
+    if backend == "sqlite":
+        from ticket_db import TicketDB
+        return TicketDB(path or os.environ["TICKET_DB"]).read_days(days_back)
+    if backend != "generate":
+        raise ValueError(f"unknown backend: {backend}")
+    if engine == "numpy":
+        return generate_tickets(days_back=days_back, n_jobs_per_day=n_jobs_per_day, seed=seed)
+    if engine != "python":
+        raise ValueError(f"unknown engine: {engine}")
     random.seed(seed)  # <— deterministic
     rows = []
     ticket_id = 10000
@@ -101,13 +287,12 @@ def load_data(*, days_back: int = 7, n_jobs_per_day: int = 60, seed: int = 7) ->
                 "ignition_off": ignition_off,
             }
 
-            stages = ["dispatch", "loaded", "en_route", "waiting", "discharging", "washing", "back"]
-            for s, v in zip(stages, durs):
+            for s, v in zip(_STAGES, durs):
                 row[f"dur_{s}"] = v
 
             rows.append(row)
             ticket_id += 1
 
     df = pd.DataFrame(rows)
-    df["date"] = pd.to_datetime(df["start_time"]).dt.date  # handy for filtering & tools
-    return df
+    df["date"] = pd.to_datetime(df["start_time"]).dt.normalize()  # handy for filtering & tools
+    return compact(df)  # see schema.SCHEMA
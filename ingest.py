@@ -0,0 +1,264 @@
+# ingest.py – chunked CSV ingest of dispatch tickets + telematics into the ticket archive
+import json
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from kpi_state import KpiState, SeenIds
+from schema import SCHEMA, TICKET_PREFIX, compact, ticket_ids
+from ticket_archive import TicketArchive
+
+REQUIRED = ["ticket_id", "start_time", "cycle_time"]
+TIMESTAMPS = [c for c, (dtype, _) in SCHEMA.items() if dtype.startswith("datetime64") and c != "date"]
+DIMENSIONS = [c for c, (dtype, _) in SCHEMA.items() if dtype == "category"]
+# telematics export: one row per ticket, joined onto the dispatch rows by ticket_id
+TELEMATICS = ["ignition_on", "first_ticket", "last_return", "ignition_off",
+              "drum_rpm", "hydraulic_pressure", "fuel_used_L", "distance_km", "water_added_L"]
+
+_MAX_MINUTES = 24 * 60
+
+
+def _numeric_columns(df: pd.DataFrame) -> list[str]:
+    return [c for c in df.columns
+            if c not in TIMESTAMPS and c not in DIMENSIONS and c not in ("ticket_id", "date")
+            and ((SCHEMA.get(c, ("",))[0][:3] in ("int", "flo")) or c.startswith("dur_"))]
+
+
+def read_csv_chunks(path: str, chunksize: int = 200_000):
+    """
+    CSV chunks as `coerce` expects them: empty fields are NaN, columns the C
+    parser could type (clean numerics) arrive typed, anything else as text.
+    """
+    text = {c: str for c in ("ticket_id", *DIMENSIONS)}  # `007` is a driver, not 7
+    return pd.read_csv(path, dtype=text, keep_default_na=False, na_values=[""],
+                       skipinitialspace=True, chunksize=chunksize)
+
+
+def coerce(raw: pd.DataFrame, required: list[str] = REQUIRED) -> tuple[pd.DataFrame, dict]:
+    """
+    Validate one raw chunk (text columns, or already-typed ones as from
+    `read_csv_chunks`) and coerce it to the schema.
+
+    Rows without a usable value in a `required` column (ticket_id,
+    start_time, cycle_time in 1..1440 min) are rejected; unparseable
+    optional values become NaN/NaT and are counted as coerced.
+    Returns (clean frame, counters).
+    """
+    n = len(raw)
+    cols = {}
+    rejected = {}
+
+    ids = ticket_ids(raw["ticket_id"])
+    bad = ids.isna().to_numpy()
+    rejected["bad_ticket_id"] = int(bad.sum())
+    cols["ticket_id"] = ids
+
+    coerced = 0
+    for c in TIMESTAMPS:
+        if c in raw:
+            given = raw[c].replace("", np.nan) if raw[c].dtype == object else raw[c]
+            ts = given if given.dtype.kind == "M" else pd.to_datetime(given, format="ISO8601", errors="coerce")
+            lost = (ts.isna() & given.notna()).to_numpy()
+            if c in required:
+                miss = ts.isna().to_numpy() & ~bad
+                rejected[f"bad_{c}"] = int(miss.sum())
+                bad = bad | miss
+            else:
+                coerced += int(lost.sum())
+            cols[c] = ts.astype("datetime64[us]")
+
+    for c in _numeric_columns(raw):
+        given = raw[c].replace("", np.nan) if raw[c].dtype == object else raw[c]
+        num = given if pd.api.types.is_numeric_dtype(given) else pd.to_numeric(given, errors="coerce")
+        lost = (num.isna() & given.notna()).to_numpy()
+        if c.startswith("dur_") or c == "cycle_time":
+            lost = lost | (num < 0).fillna(False).to_numpy()
+            num = num.mask(num < 0)
+        if c == "cycle_time" and c in required:
+            miss = ~((num > 0) & (num <= _MAX_MINUTES)).fillna(False).to_numpy() & ~bad
+            rejected["bad_cycle_time"] = int(miss.sum())
+            bad = bad | miss
+        else:
+            coerced += int(lost.sum())
+        cols[c] = num
+
+    for c in DIMENSIONS:
+        if c in raw:
+            cols[c] = raw[c].astype("string").str.strip().replace("", pd.NA)
+
+    for c in raw.columns:
+        cols.setdefault(c, raw[c])
+
+    df = pd.DataFrame(cols, index=raw.index)[~bad]
+    if "start_time" in df:
+        df = df.assign(date=df["start_time"].dt.normalize())
+    return compact(df.reset_index(drop=True)), {"rows": n, "rejected": rejected, "coerced": coerced}
+
+
+class TelematicsIndex:
+    """
+    Telematics export (`ticket_id` + `TELEMATICS` columns) spilled to a
+    temporary on-disk SQLite table keyed by ticket id, so a ticket chunk
+    looks up only its own rows and memory stays bounded by the chunk size
+    however large the export is. A ticket id exported twice keeps its last row.
+    """
+
+    def __init__(self):
+        self.conn = sqlite3.connect("")  # private temporary file, removed on close
+        self.columns: list[str] = []
+        self.numeric = True
+        self.rows = 0
+
+    def add(self, df: pd.DataFrame) -> None:
+        """Store one coerced chunk (ticket_id + telematics columns)."""
+        cols = [c for c in TELEMATICS if c in df]
+        if not self.columns:
+            self.columns = cols
+            defs = ", ".join(f'"{c}"' for c in cols)
+            self.numeric = pd.api.types.is_numeric_dtype(df["ticket_id"])
+            key = "INTEGER" if self.numeric else "TEXT"
+            self.conn.execute(f"CREATE TABLE tele (ticket_id {key} PRIMARY KEY, {defs})")
+        elif self.numeric and not pd.api.types.is_numeric_dtype(df["ticket_id"]):
+            self._rekey()
+        rows = {"ticket_id": self.keys(df["ticket_id"])}
+        for c in self.columns:
+            s = df[c] if c in df else pd.Series(np.nan, index=df.index)
+            if s.dtype.kind == "M":  # integer microseconds, as in ticket_db
+                s = pd.Series(s.to_numpy(dtype="datetime64[us]").view("int64"), index=df.index).where(s.notna())
+            rows[c] = s.astype("float64") if s.dtype.kind in "iuf" else s
+        values = pd.DataFrame(rows).astype(object).where(lambda f: f.notna(), None).itertuples(index=False, name=None)
+        marks = ", ".join("?" * (1 + len(self.columns)))
+        with self.conn:
+            self.conn.executemany(f"INSERT OR REPLACE INTO tele VALUES ({marks})", values)
+        self.rows = self.conn.execute("SELECT COUNT(*) FROM tele").fetchone()[0]
+
+    def lookup(self, ids) -> pd.DataFrame:
+        """Telematics rows for `ids` (primary-key lookups), indexed by ticket id."""
+        if not self.columns:
+            return pd.DataFrame()
+        cols = ", ".join(f't."{c}"' for c in self.columns)
+        want = json.dumps(pd.unique(self.keys(ids).to_numpy()).tolist())
+        out = pd.read_sql_query(f"SELECT t.ticket_id, {cols} FROM json_each(?) j JOIN tele t ON t.ticket_id = j.value",
+                                self.conn, params=(want,))
+        times = {c: pd.to_datetime(out[c], unit="us") for c in self.columns if c in TIMESTAMPS}
+        return out.assign(**times).set_index("ticket_id")
+
+    def keys(self, ids) -> pd.Series:
+        """Ticket ids in the key type of the table: int, or `T<id>` text once any id is free-form."""
+        ids = pd.Series(ids)
+        if not pd.api.types.is_numeric_dtype(ids):
+            return ids.astype(str)
+        ids = ids.astype("int64")
+        return ids if self.numeric else TICKET_PREFIX + ids.astype(str)
+
+    def _rekey(self) -> None:
+        """Switch an integer-keyed table to text keys (a later chunk had free-form ids)."""
+        defs = ", ".join(f'"{c}"' for c in self.columns)
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE tele_text (ticket_id TEXT PRIMARY KEY, {defs})")
+            self.conn.execute(f"INSERT INTO tele_text SELECT '{TICKET_PREFIX}' || ticket_id, {defs} FROM tele")
+            self.conn.execute("DROP TABLE tele")
+            self.conn.execute("ALTER TABLE tele_text RENAME TO tele")
+        self.numeric = False
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def read_telematics(path: str, chunksize: int = 200_000) -> TelematicsIndex:
+    """Stream a telematics export into a `TelematicsIndex`, one coerced chunk at a time."""
+    index = TelematicsIndex()
+    for raw in read_csv_chunks(path, chunksize):
+        cols = [c for c in TELEMATICS if c in raw]
+        df, _ = coerce(raw[["ticket_id", *cols]], required=["ticket_id"])
+        index.add(df)
+    return index
+
+
+class TicketIngest:
+    """
+    Appends validated, de-duplicated tickets to a `TicketArchive` (and an
+    optional live `KpiState`), one bounded chunk at a time.
+
+    Ticket ids already in the archive are skipped, so re-running an export
+    or overlapping exports are safe.
+    """
+
+    def __init__(self, archive: TicketArchive | None = None, state: KpiState | None = None):
+        self.archive = archive
+        self.state = state
+        self.seen = SeenIds()
+        if archive is not None and archive.last_day() is not None:
+            known = archive.read(columns=["ticket_id"])["ticket_id"]
+            self.seen.add(known[self.seen.fresh(known)])
+        self.rows_read = 0
+        self.rows_ingested = 0
+        self.duplicates = 0
+        self.coerced = 0
+        self.rejected: dict[str, int] = {}
+        self.seconds = 0.0
+
+    def feed(self, raw: pd.DataFrame, telematics: "TelematicsIndex | pd.DataFrame | None" = None) -> pd.DataFrame:
+        """
+        Validate + append one raw chunk (see `coerce`); returns the rows kept.
+        `telematics` is a `TelematicsIndex` or a frame indexed by ticket id.
+        """
+        t0 = time.perf_counter()
+        missing = [c for c in REQUIRED if c not in raw]
+        if missing:
+            raise ValueError(f"ticket export is missing columns: {missing}")
+        df, report = coerce(raw)
+        keys = df["ticket_id"].to_numpy()
+        if isinstance(telematics, TelematicsIndex):
+            keys = telematics.keys(keys).to_numpy()
+            telematics = telematics.lookup(keys)
+        if telematics is not None and not telematics.empty:
+            # telematics fills what the dispatch export left empty
+            tele = telematics.reindex(keys).set_axis(df.index)
+            df = compact(df.assign(**{c: df[c].fillna(tele[c]) if c in df else tele[c] for c in tele.columns}))
+        fresh = self.seen.fresh(df["ticket_id"])
+        self.duplicates += int((~fresh).sum())
+        df = df[fresh]
+        self.seen.add(df["ticket_id"])
+
+        if not df.empty:
+            if self.archive is not None:
+                self.archive.write(df)
+            if self.state is not None:
+                self.state.apply(df)
+
+        self.rows_read += report["rows"]
+        self.rows_ingested += len(df)
+        self.coerced += report["coerced"]
+        for reason, k in report["rejected"].items():
+            self.rejected[reason] = self.rejected.get(reason, 0) + k
+        self.seconds += time.perf_counter() - t0
+        return df
+
+    def ingest_csv(self, path: str, telematics_path: str | None = None, chunksize: int = 200_000) -> dict:
+        """Stream a dispatch ticket CSV (optionally joined with a telematics CSV)."""
+        t0, before = time.perf_counter(), self.seconds
+        tele = read_telematics(telematics_path, chunksize) if telematics_path else None
+        try:
+            for raw in read_csv_chunks(path, chunksize):
+                self.feed(raw, tele)
+        finally:
+            if tele is not None:
+                tele.close()
+        self.seconds = before + time.perf_counter() - t0  # includes CSV parsing
+        return self.report()
+
+    def report(self) -> dict:
+        return {
+            "ok": True,
+            "rows_read": self.rows_read,
+            "rows_ingested": self.rows_ingested,
+            "duplicates": self.duplicates,
+            "rejected": dict(self.rejected),
+            "rejected_total": int(sum(self.rejected.values())),
+            "coerced_values": self.coerced,
+            "seconds": round(self.seconds, 3),
+            "rows_per_s": round(self.rows_read / self.seconds) if self.seconds else 0,
+        }
@@ -0,0 +1,107 @@
+# intent_router.py – keyword-indexed intent dispatch for deterministic answers
+from functools import lru_cache, reduce
+from operator import or_
+from typing import Callable, NamedTuple
+
+# stripped from the front of a prompt word before it is matched against keywords
+_OPENERS = "([{\"'¿¡"
+# distinct prompt words whose keyword lookups are kept (the index is rebuilt past this)
+_WORDS = 50_000
+
+
+class Intent(NamedTuple):
+    name: str
+    keywords: tuple
+    when: Callable[[str], bool]
+    handler: Callable
+    order: int
+    params: Callable[[str], tuple]
+
+
+class IntentRouter:
+    """
+    Registry of intents, each with index keywords, a guard and a handler.
+
+    The index maps a prompt word to the intents with a keyword whose first
+    word starts it ("wait" -> "waiting"), filled in the first time the word
+    is seen. Only those candidate intents have their guards tried, in
+    registration order, and the first that accepts the lowercased prompt
+    answers: the same intent the full guard walk would pick, without
+    running the guards that cannot match. Routes are memoized per prompt.
+
+    Keywords must therefore start a word of every prompt their intent
+    answers: at least one of an intent's keywords must be required by its
+    guard, or the intent can never fire.
+    """
+
+    def __init__(self):
+        self._intents: list[Intent] = []
+        self._firsts: list[tuple[str, int]] | None = None
+        self._words: dict[str, int] = {}
+        self._routed = lru_cache(maxsize=1024)(self._route)
+
+    def intent(self, name: str, *, keywords: tuple, when: Callable[[str], bool],
+               params: Callable[[str], tuple] = lambda p: ()):
+        """
+        Decorator: register `handler(p, kpis)` under `name`.
+        `params(p)` returns every prompt-derived input the answer depends on
+        (price, fuel type, ...); it is part of the answer-cache key.
+        """
+        def register(handler):
+            self._intents.append(Intent(name, tuple(keywords), when, handler, len(self._intents), params))
+            self._firsts = None
+            self._routed.cache_clear()
+            return handler
+        return register
+
+    @property
+    def intents(self) -> list[Intent]:
+        return list(self._intents)
+
+    def _compile(self) -> None:
+        # (first word of a keyword, intent order), one per distinct pair
+        self._firsts = list(dict.fromkeys((k.split()[0], it.order) for it in self._intents for k in it.keywords))
+        self._words = {}
+
+    def _learn(self, word: str) -> None:
+        """Index `word`: a bit per intent (by `order`) with a keyword whose first word starts it."""
+        if len(self._words) >= _WORDS:
+            self._words.clear()
+        bare = word.lstrip(_OPENERS)
+        self._words[word] = reduce(or_, (1 << i for first, i in self._firsts if bare.startswith(first)), 0)
+
+    def candidates(self, p: str) -> tuple:
+        """Intents with a keyword starting a word of `p`, in registration order (guards not applied)."""
+        return tuple(self._each(self._mask(p)))
+
+    def _mask(self, p: str) -> int:
+        """Bit `order` set for every intent with a keyword starting a word of `p`."""
+        if self._firsts is None:
+            self._compile()
+        words = p.split()
+        try:
+            return reduce(or_, map(self._words.__getitem__, words), 0)
+        except KeyError:  # a word not seen before
+            for w in set(words).difference(self._words):
+                self._learn(w)
+            return reduce(or_, map(self._words.__getitem__, words), 0)
+
+    def _each(self, mask: int):
+        while mask:  # lowest set bit first: registration order
+            low = mask & -mask
+            yield self._intents[low.bit_length() - 1]
+            mask ^= low
+
+    def route(self, prompt: str) -> Intent | None:
+        """The first candidate intent whose guard accepts the prompt (memoized per prompt)."""
+        return self._routed((prompt or "").lower())
+
+    def _route(self, p: str) -> Intent | None:
+        mask = self._mask(p)
+        while mask:  # as `_each`, inlined: this loop is most of an unmemoized route
+            low = mask & -mask
+            it = self._intents[low.bit_length() - 1]
+            if it.when(p):
+                return it
+            mask ^= low
+        return None
@@ -0,0 +1,55 @@
+# intermediates.py – per-data-version roll-ups / scorecards / summaries shared by tools and intents
+import pandas as pd
+
+from answer_cache import shared
+from rollup import kpis_window, mean, rollup
+from scorecard import driver_scorecard
+
+
+@shared("rollup")
+def _rollup(src, by: tuple[str, ...]) -> pd.DataFrame:
+    return rollup(src, list(by))
+
+
+def window_rollup(src, by: list[str] | str) -> pd.DataFrame:
+    """`rollup.rollup`, computed once per window and grouping (read-only result)."""
+    return _rollup(src, (by,) if isinstance(by, str) else tuple(by))
+
+
+def period_rollup(kpis: dict, period: str, by: list[str] | str) -> pd.DataFrame:
+    """`window_rollup` of a `get_kpis` period."""
+    return window_rollup(kpis_window(kpis, period), by)
+
+
+@shared()
+def plant_cycle(src) -> pd.Series:
+    """Mean cycle minutes per origin plant (unsorted, unrounded)."""
+    return mean(window_rollup(src, "origin_plant"), "cycle_time")
+
+
+@shared()
+def hourly_wait(src) -> pd.Series:
+    """Mean wait minutes per hour of day."""
+    return mean(window_rollup(src, "hour"), "dur_waiting")
+
+
+@shared()
+def scorecard(src) -> pd.DataFrame:
+    """`scorecard.driver_scorecard` of a window."""
+    return driver_scorecard(src)
+
+
+@shared()
+def signal_summary(kpis: dict, period: str) -> pd.DataFrame | None:
+    """Per-ticket telematics summaries (`SampleStore.per_ticket`) of a period; None without samples."""
+    samples = kpis.get("samples")
+    if samples is None:
+        return None
+    return samples.per_ticket(kpis[f"df_{period}"])
+
+
+def dated(df: pd.DataFrame) -> pd.DataFrame:
+    """`df` with a `date` column (service day of `start_time`); no copy when it already has one."""
+    if "date" in df.columns:
+        return df
+    return df.assign(date=pd.to_datetime(df["start_time"]).dt.normalize())
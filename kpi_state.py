@@ -0,0 +1,277 @@
+# kpi_state.py – incremental KPI maintenance for newly arriving tickets
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from schema import widen
+
+DIMENSIONS = ("truck", "driver", "origin_plant", "job_site")
+
+# Additive per-ticket measures; each is kept as a NaN-skipping sum plus a non-null count.
+MEASURES = (
+    "cycle_time", "dur_waiting", "fuel_used_L", "distance_km",
+    "load_volume_m3", "water_added_L", "min_prod", "min_total", "prod_ratio",
+)
+_LOADS = 0
+_SUM = {m: 1 + i for i, m in enumerate(MEASURES)}
+_CNT = {m: 1 + len(MEASURES) + i for i, m in enumerate(MEASURES)}
+_WIDTH = 1 + 2 * len(MEASURES)
+
+
+class _Day:
+    """Running totals for one service date, overall and per dimension value."""
+
+    __slots__ = ("totals", "by", "raw")
+
+    def __init__(self):
+        self.totals = np.zeros(_WIDTH)
+        self.by = {dim: {} for dim in DIMENSIONS}
+        # (start_ns, truck, cycle_time) chunks; only kept for the 7-day boundary day
+        self.raw = []
+
+
+class SeenIds:
+    """
+    Ticket ids already folded in. Recent ids live in a set; numeric ids are
+    periodically moved into one sorted int64 array (8 B/id instead of ~70),
+    so multi-year streams stay small. Non-numeric ids stay in the set.
+    """
+
+    def __init__(self, spill: int = 100_000):
+        self.spill = spill
+        self._recent: set = set()
+        self._sorted = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._recent) + len(self._sorted)
+
+    def fresh(self, ids: pd.Series) -> np.ndarray:
+        """Mask of ids not seen before (and first occurrence within `ids`)."""
+        mask = ~ids.duplicated().to_numpy()
+        if pd.api.types.is_integer_dtype(ids) and len(self._sorted):
+            vals = ids.to_numpy(dtype=np.int64)
+            pos = np.searchsorted(self._sorted, vals).clip(max=len(self._sorted) - 1)
+            mask &= self._sorted[pos] != vals
+        if self._recent:
+            mask &= np.fromiter((t not in self._recent for t in ids.tolist()), dtype=bool, count=len(ids))
+        return mask
+
+    def add(self, ids: pd.Series) -> None:
+        """Record ids that passed `fresh` (no duplicates)."""
+        if pd.api.types.is_integer_dtype(ids) and len(ids) >= self.spill:
+            self._merge(ids.to_numpy(dtype=np.int64))
+            return
+        self._recent.update(ids.tolist())
+        if len(self._recent) >= self.spill:
+            ints = [t for t in self._recent if isinstance(t, int)]
+            if ints:
+                self._merge(np.array(ints, dtype=np.int64))
+                self._recent.difference_update(ints)
+
+    def _merge(self, vals: np.ndarray) -> None:
+        vals = np.sort(vals)
+        merged = np.concatenate([self._sorted, vals])
+        if len(self._sorted) and vals[0] < self._sorted[-1]:
+            merged.sort(kind="stable")  # two sorted runs: a linear merge
+        self._sorted = merged
+
+
+class KpiState:
+    """
+    Running sums/counts per day × {truck, driver, plant, site}.
+
+    `apply(new_tickets)` folds a batch in, costing O(len(new_tickets)).
+    `kpis(now)` returns the headline keys of `coach_core.get_kpis` (no slices)
+    reading only the day buckets it needs.
+    """
+
+    def __init__(self, op_minutes: int = 600, retain_days: int = 8):
+        self.op_minutes = op_minutes
+        self.retain_days = retain_days
+        self.n_tickets = 0
+        self._days: dict[pd.Timestamp, _Day] = {}
+        self._seen = SeenIds()
+        self._latest_day = None
+
+    # -------------------------
+    # Ingest
+    # -------------------------
+    def apply(self, new: pd.DataFrame) -> "KpiState":
+        """Fold a batch of tickets in; ticket_ids already seen are skipped."""
+        if new is None or new.empty:
+            return self
+        if "ticket_id" in new:
+            new = new[self._seen.fresh(new["ticket_id"])]
+            self._seen.add(new["ticket_id"])
+            if new.empty:
+                return self
+
+        start, block, dims = self._measures(new)
+        day_code, days = pd.factorize(start.astype("datetime64[D]"))
+        dated = day_code >= 0  # a NaT start_time has no service day to be filed under
+        if not dated.all():
+            start, block, day_code = start[dated], block[dated], day_code[dated]
+            dims = {dim: values[dated] for dim, values in dims.items()}
+        if not len(start):
+            return self
+        days = list(pd.to_datetime(days))
+
+        # per-day totals, then per (day, dimension value) cells: one sort + reduceat each
+        codes, sums = _sums(day_code, block)
+        for code, vec in zip(codes, sums):
+            self._days.setdefault(days[code], _Day()).totals += vec
+        for dim, values in dims.items():
+            value_code, uniques = pd.factorize(values)
+            known = value_code >= 0
+            codes, sums = _sums(day_code[known] * len(uniques) + value_code[known], block[known])
+            for code, vec in zip(codes, sums):
+                cell = self._days[days[code // len(uniques)]].by[dim]
+                value = uniques[code % len(uniques)]
+                if value in cell:
+                    cell[value] += vec
+                else:
+                    cell[value] = vec.copy()
+
+        start_ns = start.astype("datetime64[ns]").view("int64")
+        truck = dims["truck"] if "truck" in dims else np.full(len(start), np.nan)
+        cycle = block[:, _SUM["cycle_time"]].copy()
+        cycle[block[:, _CNT["cycle_time"]] == 0] = np.nan
+        order = np.argsort(day_code, kind="stable")
+        bounds = np.flatnonzero(np.r_[True, day_code[order][1:] != day_code[order][:-1], True])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            idx = order[lo:hi]
+            self._days[days[day_code[idx[0]]]].raw.append((start_ns[idx], truck[idx], cycle[idx]))
+
+        latest = max(days)
+        if self._latest_day is None or latest > self._latest_day:
+            self._latest_day = latest
+            horizon = latest - pd.Timedelta(days=self.retain_days)
+            for day, bucket in self._days.items():
+                if day < horizon:
+                    bucket.raw.clear()
+
+        self.n_tickets += len(start)
+        return self
+
+    @staticmethod
+    def _measures(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, dict]:
+        """
+        (start_time as datetime64[us], one `_WIDTH` row per ticket: 1, measure
+        sums with NaN as 0, non-null counts; dimension values by column).
+        """
+        def times(col: str) -> np.ndarray:
+            if col not in df:
+                return np.full(len(df), np.datetime64("NaT"), dtype="datetime64[us]")
+            s = df[col] if pd.api.types.is_datetime64_any_dtype(df[col]) else pd.to_datetime(df[col])
+            return s.to_numpy(dtype="datetime64[us]")
+
+        minute = np.timedelta64(1, "m")
+        min_total = (times("ignition_off") - times("ignition_on")) / minute
+        min_prod = (times("last_return") - times("first_ticket")) / minute
+        with np.errstate(divide="ignore", invalid="ignore"):
+            derived = {"min_prod": min_prod, "min_total": min_total, "prod_ratio": min_prod / min_total * 100}
+        vals = np.full((len(df), len(MEASURES)), np.nan)
+        for i, m in enumerate(MEASURES):
+            if m in derived:
+                vals[:, i] = derived[m]
+            elif m in df:
+                s = df[m] if pd.api.types.is_numeric_dtype(df[m]) else pd.to_numeric(df[m], errors="coerce")
+                vals[:, i] = widen(s).to_numpy(dtype=np.float64, na_value=np.nan)
+        known = ~np.isnan(vals)
+        block = np.column_stack([np.ones(len(df)), np.where(known, vals, 0.0), known])
+        dims = {dim: df[dim].to_numpy() for dim in DIMENSIONS if dim in df}
+        return times("start_time"), block, dims
+
+    # -------------------------
+    # Queries
+    # -------------------------
+    def kpis(self, now: datetime | None = None) -> dict:
+        """Headline KPIs with the same keys/semantics as `get_kpis`."""
+        now = now or datetime.now()
+        today = pd.Timestamp(now).normalize()
+        empty = _Day()
+        t = self._days.get(today, empty)
+        y = self._days.get(today - pd.Timedelta(days=1), empty)
+        tot = t.totals
+
+        n_trucks = len(t.by["truck"])
+        util_today = tot[_SUM["cycle_time"]] / (self.op_minutes * n_trucks) * 100 if n_trucks else float("nan")
+        prod_min = tot[_SUM["min_prod"]]
+
+        return {
+            "loads_today": int(tot[_LOADS]),
+            "loads_yesterday": int(y.totals[_LOADS]),
+            "utilization_pct": float(util_today),
+            "utilization_7d_pct": self._utilization_since(pd.Timestamp(now - timedelta(days=7))),
+            "avg_wait_min": _ratio(tot[_SUM["dur_waiting"]], tot[_CNT["dur_waiting"]]),
+            "n_trucks": int(n_trucks),
+            "prod_ratio": _ratio(tot[_SUM["prod_ratio"]], tot[_CNT["prod_ratio"]]),
+            "prod_prod_min": float(prod_min),
+            "prod_idle_min": float(tot[_SUM["min_total"]] - prod_min),
+            "fuel_L_today": float(tot[_SUM["fuel_used_L"]]),
+            "distance_km_today": float(tot[_SUM["distance_km"]]),
+            "m3_today": float(tot[_SUM["load_volume_m3"]]),
+        }
+
+    def _utilization_since(self, cutoff: pd.Timestamp) -> float:
+        cutoff_day = cutoff.normalize()
+        cycle, truck_days = 0.0, 0
+        for day, bucket in self._days.items():
+            if day > cutoff_day:
+                cycle += bucket.totals[_SUM["cycle_time"]]
+                truck_days += len(bucket.by["truck"])
+            elif day == cutoff_day and bucket.raw:
+                start_ns, trucks, cyc = (np.concatenate(a) for a in zip(*bucket.raw))
+                keep = start_ns >= cutoff.value
+                cycle += np.nansum(cyc[keep])
+                truck_days += pd.unique(trucks[keep][~pd.isna(trucks[keep])]).size
+            elif day == cutoff_day:
+                # raw rows aged out of `retain_days`: count the whole boundary day
+                cycle += bucket.totals[_SUM["cycle_time"]]
+                truck_days += len(bucket.by["truck"])
+        total_op_min = truck_days * self.op_minutes
+        return float(cycle / total_op_min * 100) if total_op_min else float("nan")
+
+    def by(self, dim: str, days: list | None = None) -> pd.DataFrame:
+        """Per-`dim` rollup (loads, m³, fuel, distance, wait, utilization) over `days` (default: all)."""
+        acc: dict = {}
+        buckets = [self._days[d] for d in map(pd.Timestamp, days if days is not None else self._days) if d in self._days]
+        for bucket in buckets:
+            for value, vec in bucket.by[dim].items():
+                if value in acc:
+                    acc[value] = acc[value] + vec
+                else:
+                    acc[value] = vec.copy()
+        if not acc:
+            return pd.DataFrame()
+        m = np.vstack(list(acc.values()))
+        out = pd.DataFrame({
+            "loads": m[:, _LOADS].astype(int),
+            "m3": m[:, _SUM["load_volume_m3"]],
+            "fuel_L": m[:, _SUM["fuel_used_L"]],
+            "distance_km": m[:, _SUM["distance_km"]],
+            "water_L": m[:, _SUM["water_added_L"]],
+            "cycle_min": m[:, _SUM["cycle_time"]],
+            "avg_wait_min": m[:, _SUM["dur_waiting"]] / np.where(m[:, _CNT["dur_waiting"]] > 0, m[:, _CNT["dur_waiting"]], np.nan),
+        }, index=pd.Index(list(acc.keys()), name=dim))
+        if dim == "truck":
+            active = pd.Series(0, index=out.index)
+            for bucket in buckets:
+                active.loc[list(bucket.by["truck"])] += 1
+            out["utilization_pct"] = out["cycle_min"] / (active * self.op_minutes) * 100
+        return out.sort_index()
+
+
+def _sums(codes: np.ndarray, block: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Distinct `codes` (ascending) and the column sums of the `block` rows carrying each."""
+    if not len(codes):
+        return codes, block[:0]
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    return codes[starts], np.add.reduceat(block[order], starts, axis=0)
+
+
+def _ratio(num: float, den: float) -> float:
+    return float(num / den) if den else float("nan")
@@ -1,9 +1,32 @@
 # model_utils.py – resilient model selection (tries GPT-5, falls back cleanly)
+import asyncio
+import hashlib
+import json
 import os
-from openai import OpenAI
-from openai import APIError
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
 
-_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
+from openai import APIConnectionError, APIError, APITimeoutError, InternalServerError, NotFoundError, RateLimitError
+
+try:
+    import httpx
+except ImportError:  # newer openai releases ship the httpx2 fork
+    import httpx2 as httpx
+
+_client: OpenAI | None = None
+_client_lock = threading.Lock()
+
+
+def default_client() -> OpenAI:
+    """The shared sync client, created on first use (importing needs no API key)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return _client
 
 # Put your preferred model first; env var can override.
 MODEL_CHAIN = [
@@ -12,32 +35,492 @@ MODEL_CHAIN = [
     "gpt-4o-mini",
 ]
 
-def chat_call(messages, temperature=0.2):
+# errors worth trying the next model for; anything else (auth, bad request) is raised
+_TRANSIENT = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+
+def _not_found(e: Exception) -> bool:
+    msg = str(e).lower()
+    return isinstance(e, NotFoundError) or ("model" in msg and ("not found" in msg or "does not exist" in msg))
+
+
+class ModelHealth:
     """
-    Try models in MODEL_CHAIN until one works.
-    Returns (model_used, text).
+    Per-model circuit breaker with latency / error counters.
+
+    A not-found or `max_errors` consecutive failures open the breaker: the
+    model is skipped. Any failure also moves the model behind the healthy
+    ones. Either way it is probed in the background once `cooldown_s` has
+    passed since its last failure, and is back in its place after a success.
+    """
+
+    def __init__(self, cooldown_s: float = float(os.getenv("COACH_MODEL_COOLDOWN_S", "300")),
+                 max_errors: int = 3, clock=time.monotonic):
+        self.cooldown_s = cooldown_s
+        self.max_errors = max_errors
+        self.clock = clock
+        self._stats: dict[str, dict] = {}
+        self._probing: set[str] = set()
+        self._lock = threading.Lock()
+
+    def _get(self, model: str) -> dict:
+        return self._stats.setdefault(model, {
+            "calls": 0, "errors": 0, "consecutive_errors": 0, "latency_ms": None, "ttft_ms": None,
+            "open": False, "retry_at": 0.0, "last_error": None,
+        })
+
+    def record_ok(self, model: str, seconds: float, ttft_s: float | None = None) -> None:
+        """A successful call: total seconds, and time to first token for streamed ones."""
+        with self._lock:
+            s = self._get(model)
+            s["calls"] += 1
+            s["consecutive_errors"] = 0
+            s["open"] = False
+            for key, value in (("latency_ms", seconds), ("ttft_ms", ttft_s)):
+                if value is not None:
+                    ms = value * 1000
+                    s[key] = ms if s[key] is None else 0.8 * s[key] + 0.2 * ms
+
+    def record_error(self, model: str, error: Exception) -> None:
+        with self._lock:
+            s = self._get(model)
+            s["calls"] += 1
+            s["errors"] += 1
+            s["consecutive_errors"] += 1
+            s["last_error"] = f"{type(error).__name__}: {error}"[:200]
+            s["retry_at"] = self.clock() + self.cooldown_s
+            if _not_found(error) or s["consecutive_errors"] >= self.max_errors:
+                s["open"] = True
+
+    def is_open(self, model: str) -> bool:
+        """True while `model` is being skipped."""
+        with self._lock:
+            return self._get(model)["open"]
+
+    def order(self, chain: list[str]) -> list[str]:
+        """Usable models of `chain`: fewest consecutive errors first, chain order otherwise."""
+        with self._lock:
+            usable = [m for m in chain if m and not self._get(m)["open"]]
+            return sorted(usable, key=lambda m: self._get(m)["consecutive_errors"])  # stable: keeps preference
+
+    def due(self, chain: list[str]) -> list[str]:
+        """Failing models whose cooldown has passed and that no probe is running for."""
+        now = self.clock()
+        with self._lock:
+            return [m for m in chain if m and m not in self._probing
+                    and self._get(m)["consecutive_errors"] and self._get(m)["retry_at"] <= now]
+
+    def probe(self, model: str, call) -> threading.Thread | None:
+        """Run `call()` in a daemon thread and record the outcome (one probe per model at a time)."""
+        with self._lock:
+            if model in self._probing:
+                return None
+            self._probing.add(model)
+
+        def run():
+            t0 = time.perf_counter()
+            try:
+                call()
+            except Exception as e:
+                self.record_error(model, e)
+            else:
+                self.record_ok(model, time.perf_counter() - t0)
+            finally:
+                with self._lock:
+                    self._probing.discard(model)
+
+        thread = threading.Thread(target=run, name=f"probe-{model}", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        now = self.clock()
+        with self._lock:
+            return {
+                m: {k: v for k, v in s.items() if k != "retry_at"}
+                | {k: None if s[k] is None else round(s[k], 1) for k in ("latency_ms", "ttft_ms")}
+                | {"retry_in_s": round(max(0.0, s["retry_at"] - now), 1) if s["consecutive_errors"] else 0.0}
+                for m, s in self._stats.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+HEALTH = ModelHealth()
+
+
+_PING = [{"role": "user", "content": "ping"}]
+
+
+def _candidates(client: OpenAI, chain: list[str], health: ModelHealth, ping=None) -> list[str]:
+    """Start background probes (`ping(model)`) for models due one, then the usable chain in health order."""
+    ping = ping or (lambda m: client.chat.completions.create(model=m, messages=_PING, max_tokens=1))
+    for model_name in health.due(chain):
+        health.probe(model_name, lambda m=model_name: ping(m))
+    return health.order(chain) or [m for m in chain if m]  # everything tripped: try anyway
+
+
+def _next_model(e: Exception) -> bool:
+    """Missing model / transient failure -> try the next model; auth, bad request -> bubble up."""
+    return _not_found(e) or isinstance(e, _TRANSIENT) or not isinstance(e, APIError)
+
+
+def chat_completion(messages, temperature=0.2, *, tools: list[dict] | None = None, client: OpenAI | None = None,
+                    chain: list[str] | None = None, health: ModelHealth = HEALTH):
+    """
+    Try usable models of MODEL_CHAIN (ordered by `health`) until one works.
+    Returns (model_used, assistant message), which may carry `tool_calls`
+    when `tools` are offered.
     """
+    client = client or default_client()
+    chain = chain or MODEL_CHAIN
+    extra = {"tools": tools} if tools else {}
     last_err = None
-    for model_name in MODEL_CHAIN:
-        if not model_name:
-            continue
+    for model_name in _candidates(client, chain, health):
+        t0 = time.perf_counter()
         try:
-            resp = _client.chat.completions.create(
+            resp = client.chat.completions.create(
                 model=model_name,
                 messages=messages,
                 temperature=temperature,
+                **extra,
             )
-            text = (resp.choices[0].message.content or "").strip()
-            return model_name, text
         except Exception as e:
-            # swallow 404/missing model and try next
-            msg = str(e).lower()
-            if "model" in msg and ("not found" in msg or "does not exist" in msg):
-                last_err = e
+            health.record_error(model_name, e)
+            last_err = e
+            if _next_model(e):
                 continue
-            # other API errors (rate limit, auth) -> bubble up
-            if isinstance(e, APIError):
+            raise
+        health.record_ok(model_name, time.perf_counter() - t0)
+        return model_name, resp.choices[0].message
+    raise RuntimeError(f"No usable model from chain {chain}. Last error: {last_err}")
+
+
+def chat_call(messages, temperature=0.2, *, client: OpenAI | None = None, chain: list[str] | None = None,
+              health: ModelHealth = HEALTH):
+    """
+    Try usable models of MODEL_CHAIN (ordered by `health`) until one works.
+    Returns (model_used, text).
+    """
+    model_name, message = chat_completion(messages, temperature, client=client, chain=chain, health=health)
+    return model_name, (message.content or "").strip()
+
+
+class ChatStream:
+    """
+    Text deltas of a streamed reply, from the first model of the chain that
+    starts answering (a model failing before its first token falls through
+    to the next one, like `chat_call`).
+
+    `model`, `ttft_s` (time to first token, failed attempts included) and
+    `total_s` are filled in while iterating.
+    """
+
+    def __init__(self, messages, temperature=0.2, *, client: OpenAI | None = None,
+                 chain: list[str] | None = None, health: ModelHealth = HEALTH):
+        self.messages = messages
+        self.temperature = temperature
+        self.client = client or default_client()
+        self.chain = chain or MODEL_CHAIN
+        self.health = health
+        self.model: str | None = None
+        self.ttft_s: float | None = None
+        self.total_s: float | None = None
+
+    @staticmethod
+    def _deltas(chunks):
+        for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def __iter__(self):
+        start = time.perf_counter()
+        last_err = None
+        for model_name in _candidates(self.client, self.chain, self.health):
+            t0 = time.perf_counter()
+            try:
+                deltas = self._deltas(self.client.chat.completions.create(
+                    model=model_name,
+                    messages=self.messages,
+                    temperature=self.temperature,
+                    stream=True,
+                ))
+                first = next(deltas, "")
+            except Exception as e:
+                self.health.record_error(model_name, e)
+                last_err = e
+                if _next_model(e):
+                    continue
                 raise
-            last_err = e
-            continue
-    raise RuntimeError(f"No usable model from chain {MODEL_CHAIN}. Last error: {last_err}")
+            self.model = model_name
+            self.ttft_s = time.perf_counter() - start
+            ttft = time.perf_counter() - t0
+            try:
+                if first:
+                    yield first
+                yield from deltas
+            except Exception as e:  # failed mid-answer: too late to switch models
+                self.health.record_error(model_name, e)
+                raise
+            self.total_s = time.perf_counter() - start
+            self.health.record_ok(model_name, time.perf_counter() - t0, ttft_s=ttft)
+            return
+        raise RuntimeError(f"No usable model from chain {self.chain}. Last error: {last_err}")
+
+
+def chat_stream(messages, temperature=0.2, **kwargs) -> ChatStream:
+    """Streaming `chat_call`: iterate for text deltas; `.model` / `.ttft_s` once started."""
+    return ChatStream(messages, temperature, **kwargs)
+
+
+class AsyncChat:
+    """
+    `chat_call` on a shared `AsyncOpenAI` client, for many sessions at once.
+
+    Requests run on one background event loop with a bounded connection
+    pool (`max_connections`) and at most `max_concurrency` upstream calls in
+    flight; identical requests (chain, messages, temperature) made while
+    one is in flight wait for it instead of calling the API again.
+    `call` is awaitable from any loop, `submit` / `__call__` from any thread;
+    `stream` is the streaming version, and identical streams in flight
+    share one upstream stream too.
+    """
+
+    def __init__(self, *, client: AsyncOpenAI | None = None, chain: list[str] | None = None,
+                 health: ModelHealth = HEALTH,
+                 max_connections: int = int(os.getenv("COACH_LLM_MAX_CONNECTIONS", "8")),
+                 max_concurrency: int = int(os.getenv("COACH_LLM_MAX_CONCURRENCY", "4")),
+                 **client_kwargs):
+        self.chain = chain or MODEL_CHAIN
+        self.health = health
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.counts: Counter = Counter()  # requests / upstream / coalesced
+        self._client = client
+        self._client_kwargs = client_kwargs
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._streams: dict[str, _SharedStream] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._limit: asyncio.Semaphore | None = None
+        self._lock = threading.Lock()
+
+    # -------------------------
+    # Event loop + client (created on first use)
+    # -------------------------
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-pool", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self._client = AsyncOpenAI(**{"api_key": os.getenv("OPENAI_API_KEY"), **self._client_kwargs},
+                                       http_client=DefaultAsyncHttpxClient(limits=limits))
+        return self._client
+
+    def close(self) -> None:
+        """Close the connection pool and stop the loop."""
+        if self._loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop, self._client, self._limit = None, None, None
+
+    # -------------------------
+    # Calls
+    # -------------------------
+    def _key(self, messages, temperature) -> str:
+        body = json.dumps([self.chain, messages, temperature], sort_keys=True, default=str)
+        return hashlib.sha1(body.encode()).hexdigest()
+
+    async def call(self, messages, temperature=0.2) -> tuple[str, str]:
+        """(model_used, text), coalesced with an identical request already in flight."""
+        if asyncio.get_running_loop() is not self.loop:
+            return await asyncio.wrap_future(self.submit(messages, temperature))
+        self.counts["requests"] += 1
+        key = self._key(messages, temperature)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._walk(messages, temperature))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(key, None) if self._inflight.get(key) is t else None)
+        else:
+            self.counts["coalesced"] += 1
+        return await asyncio.shield(task)  # one caller giving up does not cancel the others
+
+    def submit(self, messages, temperature=0.2) -> Future:
+        """Schedule `call` on the pool's loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(self.call(messages, temperature), self.loop)
+
+    def __call__(self, messages, temperature=0.2) -> tuple[str, str]:
+        """Blocking `call`: drop-in for `chat_call`."""
+        return self.submit(messages, temperature).result()
+
+    async def _create(self, **kwargs):
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_concurrency)
+        async with self._limit:
+            self.counts["upstream"] += 1
+            return await self.client.chat.completions.create(**kwargs)
+
+    async def _walk(self, messages, temperature) -> tuple[str, str]:
+        loop = asyncio.get_running_loop()
+        ping = lambda m: asyncio.run_coroutine_threadsafe(
+            self._create(model=m, messages=_PING, max_tokens=1), loop).result()
+        last_err = None
+        for model_name in _candidates(None, self.chain, self.health, ping):
+            t0 = time.perf_counter()
+            try:
+                resp = await self._create(model=model_name, messages=messages, temperature=temperature)
+            except Exception as e:
+                self.health.record_error(model_name, e)
+                last_err = e
+                if _next_model(e):
+                    continue
+                raise
+            self.health.record_ok(model_name, time.perf_counter() - t0)
+            return model_name, (resp.choices[0].message.content or "").strip()
+        raise RuntimeError(f"No usable model from chain {self.chain}. Last error: {last_err}")
+
+    def stream(self, messages, temperature=0.2) -> "PooledStream":
+        """Streaming `__call__`: iterate for text deltas; joins an identical stream already in flight."""
+        key = self._key(messages, temperature)
+        with self._lock:
+            self.counts["streams"] += 1
+            shared = self._streams.get(key)
+            if shared is None:
+                shared = self._streams[key] = _SharedStream()
+                start = True
+            else:
+                self.counts["coalesced"] += 1
+                start = False
+        if start:
+            asyncio.run_coroutine_threadsafe(self._pump(key, shared, messages, temperature), self.loop)
+        return PooledStream(shared)
+
+    async def _pump(self, key: str, shared: "_SharedStream", messages, temperature) -> None:
+        """Run one upstream stream (with `ChatStream`'s fallback) into `shared`."""
+        loop = asyncio.get_running_loop()
+        ping = lambda m: asyncio.run_coroutine_threadsafe(
+            self._create(model=m, messages=_PING, max_tokens=1), loop).result()
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_concurrency)
+        last_err = None
+        try:
+            for model_name in _candidates(None, self.chain, self.health, ping):
+                t0 = time.perf_counter()
+                async with self._limit:  # held for the whole stream
+                    self.counts["upstream"] += 1
+                    try:
+                        chunks = await self.client.chat.completions.create(
+                            model=model_name, messages=messages, temperature=temperature, stream=True)
+                        deltas = (c.choices[0].delta.content async for c in chunks
+                                  if c.choices and c.choices[0].delta.content)
+                        first = await anext(deltas, "")
+                    except Exception as e:
+                        self.health.record_error(model_name, e)
+                        last_err = e
+                        if _next_model(e):
+                            continue
+                        raise
+                    ttft = time.perf_counter() - t0
+                    shared.put(first, model_name)
+                    try:
+                        async for delta in deltas:
+                            shared.put(delta)
+                    except Exception as e:  # failed mid-answer: too late to switch models
+                        self.health.record_error(model_name, e)
+                        raise
+                self.health.record_ok(model_name, time.perf_counter() - t0, ttft_s=ttft)
+                shared.finish()
+                return
+            raise RuntimeError(f"No usable model from chain {self.chain}. Last error: {last_err}")
+        except Exception as e:
+            shared.finish(e)
+        finally:
+            with self._lock:
+                if self._streams.get(key) is shared:
+                    del self._streams[key]
+
+    def stats(self) -> dict:
+        return {**self.counts, "in_flight": len(self._inflight) + len(self._streams),
+                "max_connections": self.max_connections, "max_concurrency": self.max_concurrency}
+
+
+class _SharedStream:
+    """Deltas of one upstream stream, written by the pool's loop and read by any number of threads."""
+
+    def __init__(self):
+        self.deltas: list[str] = []
+        self.model: str | None = None
+        self.done = False
+        self.error: Exception | None = None
+        self._cond = threading.Condition()
+
+    def put(self, delta: str, model: str | None = None) -> None:
+        with self._cond:
+            self.model = model or self.model
+            if delta:
+                self.deltas.append(delta)
+            self._cond.notify_all()
+
+    def finish(self, error: Exception | None = None) -> None:
+        with self._cond:
+            self.done, self.error = True, error
+            self._cond.notify_all()
+
+    def wait(self, i: int) -> bool:
+        """Block until delta `i` exists (True) or the stream has ended without it (False)."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.deltas) > i or self.done)
+            if len(self.deltas) > i:
+                return True
+            if self.error is not None:
+                raise self.error
+            return False
+
+
+class PooledStream:
+    """
+    A reader of a pooled stream, with the attributes of `ChatStream`
+    (`model`, `ttft_s`, `total_s`). A reader that joins late replays the
+    deltas already received, then follows the upstream stream.
+    """
+
+    def __init__(self, shared: _SharedStream):
+        self._shared = shared
+        self.model: str | None = None
+        self.ttft_s: float | None = None
+        self.total_s: float | None = None
+
+    def __iter__(self):
+        start = time.perf_counter()
+        i = 0
+        while self._shared.wait(i):
+            if i == 0:
+                self.model = self._shared.model
+                self.ttft_s = time.perf_counter() - start
+            yield self._shared.deltas[i]
+            i += 1
+        self.model = self._shared.model
+        self.total_s = time.perf_counter() - start
+        if self.ttft_s is None:  # empty reply
+            self.ttft_s = self.total_s
+
+
+LLM_POOL = AsyncChat()
+
+
+async def chat_call_async(messages, temperature=0.2) -> tuple[str, str]:
+    """`chat_call` through the shared pool (`LLM_POOL`): pooled, rate-limited, coalesced."""
+    return await LLM_POOL.call(messages, temperature)
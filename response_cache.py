@@ -0,0 +1,158 @@
+# response_cache.py – disk-backed LLM reply cache keyed on prompt + data snapshot
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# assistant turns carry a `_model: ..._` tag that differs between cached and live replies
+_MODEL_TAG = re.compile(r"^_model: [^\n]*_\s*", re.MULTILINE)
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(messages: list[dict]) -> list[list[str]]:
+    """
+    Messages as the cache sees them: whitespace collapsed, model tags dropped,
+    the user's question case-folded. System prompt and data snapshot are part
+    of the list, so a new snapshot never matches an old reply.
+    """
+    out = []
+    for i, m in enumerate(messages):
+        text = _SPACE.sub(" ", _MODEL_TAG.sub("", m.get("content") or "")).strip()
+        if m["role"] == "user" and i == len(messages) - 1:
+            text = text.casefold()
+        out.append([m["role"], text])
+    return out
+
+
+def prompt_key(messages: list[dict], temperature: float = 0.2) -> str:
+    body = json.dumps([normalize(messages), round(float(temperature), 3)], ensure_ascii=False)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Replies of the model chain in one SQLite table, keyed on `prompt_key`.
+
+    Entries expire `ttl_s` after they were stored; past `max_bytes` of reply
+    text the least recently used ones are evicted. `saved_s` adds up the
+    original call time of every hit. The database is opened on first use;
+    settings not given here are read from the environment at that point
+    (`COACH_LLM_CACHE`, `COACH_LLM_CACHE_TTL_S`, `COACH_LLM_CACHE_MAX_BYTES`).
+    """
+
+    def __init__(self, path: str | None = None, ttl_s: float | None = None, max_bytes: int | None = None,
+                 clock=time.time):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_s = 0.0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The database, opened (and created) on first access; callers hold `_lock`."""
+        if self._conn is None:
+            if self.path is None:
+                self.path = os.getenv("COACH_LLM_CACHE", ".coach_cache/responses.sqlite")
+            if self.ttl_s is None:
+                self.ttl_s = float(os.getenv("COACH_LLM_CACHE_TTL_S", str(12 * 3600)))
+            if self.max_bytes is None:
+                self.max_bytes = int(os.getenv("COACH_LLM_CACHE_MAX_BYTES", str(32 * 2**20)))
+            if self.path != ":memory:" and os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, model TEXT, text TEXT, bytes INTEGER,
+                seconds REAL, created REAL, used REAL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_used ON responses (used)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> tuple[str, str] | None:
+        """(model, text) of a live entry, or None."""
+        now = self.clock()
+        with self._lock:
+            row = self.conn.execute("SELECT model, text, seconds, created FROM responses WHERE key = ?",
+                                    (key,)).fetchone()
+            if row is None or row[3] + self.ttl_s <= now:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self.saved_s += row[2] or 0.0
+            return row[0], row[1]
+
+    def put(self, key: str, model: str, text: str, seconds: float = 0.0) -> None:
+        now = self.clock()
+        size = len(text.encode())
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (key, model, text, size, seconds, now, now))
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        gone = self.conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl_s,)).rowcount
+        (total,) = self.conn.execute("SELECT TOTAL(bytes) FROM responses").fetchone()
+        if total > self.max_bytes:
+            # oldest-used first until back under the budget
+            rows = self.conn.execute("SELECT key, bytes FROM responses ORDER BY used").fetchall()
+            drop = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                drop.append((key,))
+                total -= size
+            self.conn.executemany("DELETE FROM responses WHERE key = ?", drop)
+            gone += len(drop)
+        self.evictions += gone
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        with self._lock:
+            # never used: nothing stored, and no file to create
+            n, size = (0, 0) if self._conn is None else \
+                self.conn.execute("SELECT COUNT(*), TOTAL(bytes) FROM responses").fetchone()
+        total = self.hits + self.misses
+        return {
+            "entries": n,
+            "bytes": int(size),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate_pct": round(self.hits / total * 100, 1) if total else 0.0,
+            "saved_s": round(self.saved_s, 2),
+        }
+
+
+def cached_call(call, messages: list[dict], temperature: float = 0.2,
+                cache: ResponseCache | None = None) -> tuple[str, str, bool]:
+    """
+    `call(messages, temperature) -> (model, text)` behind `cache`.
+    Returns (model, text, hit).
+    """
+    cache = RESPONSES if cache is None else cache
+    key = prompt_key(messages, temperature)
+    found = cache.get(key)
+    if found is not None:
+        return (*found, True)
+    t0 = time.perf_counter()
+    model, text = call(messages, temperature)
+    if text:
+        cache.put(key, model, text, time.perf_counter() - t0)
+    return model, text, False
+
+
+RESPONSES = ResponseCache()
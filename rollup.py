@@ -0,0 +1,308 @@
+# rollup.py – materialized date × dimension cuboids of additive ticket measures
+import numpy as np
+import pandas as pd
+
+from schema import widen, widen_values
+from ticket_store import TicketStore
+
+# cuboids materialized by `RollupCube`, coarsest first: a roll-up reads the first one covering its grouping
+CUBOIDS = [
+    ("date", "hour"),
+    ("date", "origin_plant"),
+    ("date", "project"),
+    ("date", "job_site"),
+    ("date", "driver"),
+]
+
+# Summed with a non-null count so means stay exact after any roll-up.
+# `l_per_km` / `m3_per_hr` are per-ticket ratios (their mean is not sum/sum).
+CUBE_MEASURES = [
+    "cycle_time", "load_volume_m3", "fuel_used_L", "distance_km", "water_added_L",
+    "l_per_km", "m3_per_hr",
+]
+
+_HOUR = pd.Timedelta(hours=1)
+_DAY = pd.Timedelta(days=1)
+
+
+def _measures(df: pd.DataFrame) -> list[str]:
+    stages = [c for c in df.columns if c.startswith("dur_")]
+    return [m for m in CUBE_MEASURES if m in df] + stages
+
+
+def _values(df: pd.DataFrame) -> dict[str, np.ndarray]:
+    """The measures of `df` as 64-bit arrays, plus the per-ticket ratios (CUBE_MEASURES order, then stages)."""
+    # compact (float32 / int16) measures are summed in 64-bit
+    values = {m: widen(df[m]).to_numpy() for m in _measures(df)}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if {"fuel_used_L", "distance_km"}.issubset(values):
+            values["l_per_km"] = values["fuel_used_L"] / values["distance_km"]
+        if {"load_volume_m3", "cycle_time"}.issubset(values):
+            values["m3_per_hr"] = values["load_volume_m3"] / (values["cycle_time"] / 60.0)
+    order = [m for m in CUBE_MEASURES if m in values] + [m for m in values if m not in CUBE_MEASURES]
+    return {m: values[m] for m in order}
+
+
+def _prepare(df: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+    """A narrow frame of the `by` keys and the `_values` of `df`."""
+    keys = {}
+    if any(b in ("date", "hour") and b not in df for b in by):
+        start = pd.to_datetime(df["start_time"])
+        keys.update(date=start.dt.normalize().array, hour=start.dt.hour.array)
+    keys.update({b: df[b].array for b in by if b in df})
+    return pd.DataFrame({**{b: keys[b] for b in by if b in keys}, **_values(df)})
+
+
+def aggregate(df: pd.DataFrame, by: list[str], dropna: bool = True) -> pd.DataFrame:
+    """
+    Sum additive measures of raw tickets by `by`.
+    Columns: `loads`, `<measure>` (NaN-skipping sum), `<measure>_n` (non-null count).
+    `by=[]` returns a single totals row.
+    """
+    return _sum(_prepare(df, by), by, dropna, by)
+
+
+def _sum(df: pd.DataFrame, by: list[str], dropna: bool, keys: list[str]) -> pd.DataFrame:
+    """`aggregate` of a frame `_prepare`d for `keys` (a superset of `by`)."""
+    by = [b for b in by if b in df]
+    measures = [c for c in df.columns if c not in keys]
+    keys = by or np.zeros(len(df), dtype=np.int8)
+    g = df.groupby(keys, observed=True, dropna=dropna)
+    sums = g[measures].sum()
+    counts = g[measures].count().astype(np.int32).add_suffix("_n")
+    out = pd.concat([g.size().astype(np.int32).rename("loads"), sums, counts], axis=1)
+    if not by:
+        if out.empty:
+            out = pd.DataFrame([{"loads": 0, **{m: 0.0 for m in measures}, **{f"{m}_n": 0 for m in measures}}])
+        out.index = pd.RangeIndex(len(out))
+    return out
+
+
+def aggregate_chunks(chunks, by: list[str], dropna: bool = True, merge_rows: int = 1_000_000) -> pd.DataFrame:
+    """
+    `aggregate(pd.concat(chunks), by)` for an iterable of ticket frames that
+    need not fit in memory together. Partial aggregates are merged whenever
+    they exceed `merge_rows` cells, so memory is bounded by the output size.
+    """
+    parts, n = [], 0
+    for chunk in chunks:
+        part = aggregate(chunk, by, dropna=dropna)
+        parts.append(part)
+        n += len(part)
+        if n > merge_rows and len(parts) > 1:
+            parts = [_merge(parts, by, dropna)]
+            n = len(parts[0])
+    if not parts:
+        return aggregate(pd.DataFrame(columns=["start_time", *by]), by, dropna=dropna)
+    return parts[0] if len(parts) == 1 else _merge(parts, by, dropna)
+
+
+def _merge(parts: list[pd.DataFrame], by: list[str], dropna: bool) -> pd.DataFrame:
+    cat = pd.concat(parts)
+    if not by:
+        return cat.sum().to_frame().T.astype(parts[0].dtypes.to_dict())
+    return cat.groupby(level=list(range(cat.index.nlevels)), observed=True, dropna=dropna).sum()
+
+
+def mean(agg: pd.DataFrame, measure: str) -> pd.Series:
+    """Exact mean of `measure` from summed cells (NaN where no observations)."""
+    return agg[measure] / agg[f"{measure}_n"].where(agg[f"{measure}_n"] > 0)
+
+
+class Cuboid:
+    """Cells of `aggregate(tickets, dims)` sorted by time bucket (service day, or hour with `hour`)."""
+
+    def __init__(self, frame: pd.DataFrame, dims: tuple[str, ...], keys: list[str] | None = None):
+        self.dims = dims
+        self.step = _HOUR if "hour" in dims else _DAY
+        # `keys`: `frame` is already `_prepare`d for them
+        cells = (aggregate(frame, list(dims), dropna=False) if keys is None
+                 else _sum(frame, list(dims), False, keys)).reset_index()
+        bucket = cells["date"] + pd.to_timedelta(cells["hour"], unit="h") if "hour" in dims else cells["date"]
+        ns = bucket.to_numpy(dtype="datetime64[ns]").view("int64")
+        order = np.argsort(ns, kind="stable")
+        self.cells = cells.iloc[order].reset_index(drop=True)
+        self._bucket_ns = ns[order]
+
+    def between(self, start: pd.Timestamp | None, end: pd.Timestamp | None) -> pd.DataFrame:
+        """Cells of the buckets in `start <= bucket < end` (either bound optional)."""
+        lo = 0 if start is None else np.searchsorted(self._bucket_ns, start.value, side="left")
+        hi = len(self.cells) if end is None else np.searchsorted(self._bucket_ns, end.value, side="left")
+        return self.cells.iloc[lo:max(lo, hi)]
+
+
+class RollupCube:
+    """
+    The `CUBOIDS` of a ticket store, each built lazily on first use.
+
+    Windows select whole time buckets by binary search; a window edge that
+    falls inside a bucket is topped up from the raw rows of that bucket
+    only. Groupings no cuboid covers are aggregated from the window's rows.
+    """
+
+    def __init__(self, store: TicketStore):
+        self.store = store
+        self._cuboids: dict[tuple[str, ...], Cuboid] = {}
+        self._arrays: dict[str, np.ndarray] = {}
+
+    def cuboid(self, dims: tuple[str, ...]) -> Cuboid:
+        found = self._cuboids.get(dims)
+        if found is None:
+            found = self._cuboids[dims] = Cuboid(self.store.frame, dims)
+        return found
+
+    def covering(self, by: list[str]) -> tuple[str, ...] | None:
+        """The coarsest cuboid whose dimensions include `by`, or None."""
+        return next((dims for dims in CUBOIDS if set(by) <= set(dims)), None)
+
+    def _array(self, col: str) -> np.ndarray:
+        """Column `col` of the store as a numpy array (category codes for categoricals), kept for edge top-ups."""
+        found = self._arrays.get(col)
+        if found is None:
+            s = self.store.frame[col]
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                found = s.cat.codes.to_numpy()
+            elif isinstance(s.dtype, np.dtype):
+                found = s.to_numpy()
+            else:  # extension dtypes: widened once
+                found = widen(s).to_numpy(dtype="float64", na_value=np.nan)
+            found = self._arrays[col] = found
+        return found
+
+    def edge_cells(self, dims: tuple[str, ...], lo: int, hi: int, bucket: pd.Timestamp) -> pd.DataFrame:
+        """
+        `aggregate(store rows lo:hi, dims)` for rows inside the one bucket
+        starting at `bucket` (a window edge), summed with `np.bincount` on
+        the store's column arrays instead of a groupby over a frame slice.
+        """
+        cells = self.cuboid(dims).cells
+        frame = self.store.frame
+        key = next((d for d in dims if d not in ("date", "hour")), None)
+        if key is not None and not isinstance(frame[key].dtype, pd.CategoricalDtype):
+            return aggregate(frame.iloc[lo:hi], list(dims), dropna=False).reset_index()
+        if key is None:
+            codes, n = np.zeros(hi - lo, dtype=np.intp), 1
+        else:  # missing keys (-1) get their own slot at the end
+            n = len(frame[key].cat.categories) + 1
+            codes = self._array(key)[lo:hi].astype(np.intp)
+            codes[codes < 0] = n - 1
+        loads = np.bincount(codes, minlength=n)
+        keep = np.flatnonzero(loads)
+        out = {"date": np.full(len(keep), bucket.normalize().to_datetime64())}
+        if "hour" in dims:
+            out["hour"] = np.full(len(keep), bucket.hour)
+        if key is not None:
+            out[key] = pd.Categorical.from_codes(np.where(keep == n - 1, -1, keep), dtype=frame[key].dtype)
+        out["loads"] = loads[keep]
+        values = {m: widen_values(self._array(m)[lo:hi], m) for m in _measures(frame)}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if {"fuel_used_L", "distance_km"}.issubset(values):
+                values["l_per_km"] = values["fuel_used_L"] / values["distance_km"]
+            if {"load_volume_m3", "cycle_time"}.issubset(values):
+                values["m3_per_hr"] = values["load_volume_m3"] / (values["cycle_time"] / 60.0)
+        for m, v in values.items():
+            ok = ~np.isnan(v) if v.dtype.kind == "f" else np.ones(len(v), dtype=bool)
+            out[m] = np.bincount(codes, weights=np.where(ok, v, 0), minlength=n)[keep]
+            out[f"{m}_n"] = np.bincount(codes, weights=ok, minlength=n)[keep]
+        dtypes = cells.dtypes
+        return pd.DataFrame({c: out[c] if isinstance(out[c], pd.Categorical) else out[c].astype(dtypes[c], copy=False)
+                             for c in cells.columns})
+
+    def build(self) -> "RollupCube":
+        """Materialize every cuboid now (e.g. before threads share the cube)."""
+        missing = [dims for dims in CUBOIDS if dims not in self._cuboids]
+        if missing:
+            # keys and 64-bit measures prepared once for every cuboid
+            keys = list(dict.fromkeys(d for dims in missing for d in dims))
+            prepared = _prepare(self.store.frame, keys)
+            for dims in missing:
+                self._cuboids[dims] = Cuboid(prepared, dims, keys)
+        return self
+
+    @property
+    def cuboids(self) -> dict[tuple[str, ...], Cuboid]:
+        return dict(self.build()._cuboids)
+
+    def window(self, *, day=None, since=None) -> "CubeWindow":
+        """A service `day`, or everything with `start_time >= since`."""
+        if day is not None:
+            d = pd.Timestamp(day).normalize()
+            return CubeWindow(self, self.store.day(d), ("day", d))
+        if since is None:
+            return CubeWindow(self, self.store.frame, ("all",))
+        since = pd.Timestamp(since)
+        return CubeWindow(self, self.store.since(since), ("since", since))
+
+
+class CubeWindow:
+    """One time window of a cube: roll-ups read cuboid cells, `frame` is the matching raw ticket slice."""
+
+    def __init__(self, cube: RollupCube, frame: pd.DataFrame, span: tuple):
+        self.cube = cube
+        self.frame = frame
+        self.key = (cube.store.version, *span)
+
+    @property
+    def empty(self) -> bool:
+        return self.frame.empty
+
+    def _cells(self, dims: tuple[str, ...]) -> pd.DataFrame:
+        cuboid = self.cube.cuboid(dims)
+        kind, *rest = self.key[1:]
+        if kind == "all":
+            return cuboid.cells
+        if kind == "day":
+            return cuboid.between(rest[0], rest[0] + _DAY)
+        since = rest[0]
+        edge = since.floor(cuboid.step)
+        if edge == since:
+            return cuboid.between(since, None)
+        lo, hi = self.cube.store.bounds(since, edge + cuboid.step)
+        cells = cuboid.between(edge + cuboid.step, None)
+        if lo == hi:
+            return cells
+        return pd.concat([cells, self.cube.edge_cells(dims, lo, hi, edge)], ignore_index=True)
+
+    def rollup(self, by: list[str] | str) -> pd.DataFrame:
+        """Sum cells by `by` (same columns as `aggregate`)."""
+        by = [by] if isinstance(by, str) else list(by)
+        dims = self.cube.covering(by)
+        if dims is None:
+            return aggregate(self.frame, by)
+        cells = self._cells(dims)
+        value_cols = [c for c in cells.columns if c not in dims]
+        if not by:
+            out = cells[value_cols].sum().to_frame().T
+            out["loads"] = out["loads"].astype(int)
+            return out
+        return cells.groupby(by, observed=True)[value_cols].sum()
+
+
+def rollup(src: pd.DataFrame | CubeWindow, by: list[str] | str) -> pd.DataFrame:
+    """Roll up a window (`CubeWindow`, `ticket_db.DbWindow`), or aggregate a raw ticket frame directly."""
+    if not isinstance(src, pd.DataFrame):
+        return src.rollup(by)
+    return aggregate(src, [by] if isinstance(by, str) else list(by))
+
+
+def kpis_window(kpis: dict, period: str) -> CubeWindow:
+    """
+    Window matching a `get_kpis` slice: today / yesterday / week / 48h.
+    A cube window, or a `ticket_db.DbWindow` when the kpis carry a `db`.
+    """
+    src = kpis["db"] if kpis.get("db") is not None else kpis["cube"]
+    now = kpis["now"]
+    if period == "today":
+        return src.window(day=now)
+    if period == "yesterday":
+        return src.window(day=pd.Timestamp(now).normalize() - _DAY)
+    if period == "week":
+        return src.window(since=pd.Timestamp(now) - pd.Timedelta(days=7))
+    if period == "48h":
+        return src.window(since=pd.Timestamp(now) - pd.Timedelta(hours=48))
+    raise ValueError(f"unknown period: {period}")
+
+
+def total(src: pd.DataFrame | CubeWindow, measure: str) -> float:
+    """Window-wide sum of `measure`."""
+    return float(rollup(src, [])[measure].iloc[0])
@@ -0,0 +1,161 @@
+# schema.py – compact in-memory dtypes for the ticket frame (applied at ingest)
+import numpy as np
+import pandas as pd
+
+TICKET_PREFIX = "T"
+
+# column -> (dtype, meaning). Columns not listed are left as they are.
+SCHEMA = {
+    "ticket_id":            ("int32",          "numeric ticket id; shown as T<id> (see `ticket_label`)"),
+    "truck":                ("int16",          "truck number"),
+    "driver":               ("category",       "driver name"),
+    "project":              ("category",       "customer project"),
+    "origin_plant":         ("category",       "batching plant"),
+    "job_site":             ("category",       "delivery site"),
+    "start_time":           ("datetime64[us]", "ticket start"),
+    "date":                 ("datetime64[us]", "service date (start_time at midnight)"),
+    "cycle_time":           ("int16",          "full cycle, minutes"),
+    "distance_km":          ("float32",        "plant → site, km (1 dp)"),
+    "fuel_used_L":          ("float32",        "litres (1 dp)"),
+    "water_added_L":        ("float32",        "litres (1 dp)"),
+    "drum_rpm":             ("float32",        "average drum speed"),
+    "slump_adjustment":     ("int16",          "slump vs benchmark"),
+    "return_volume_m3":     ("float32",        "returned concrete, m³ (2 dp)"),
+    "hydraulic_pressure":   ("float32",        "psi (1 dp)"),
+    "washout_duration_min": ("int16",          "minutes"),
+    "load_volume_m3":       ("float32",        "delivered m³ (2 dp)"),
+    "ETA":                  ("datetime64[us]", "promised arrival"),
+    "actual_arrival":       ("datetime64[us]", "arrival on site"),
+    "ignition_on":          ("datetime64[us]", "telematics shift start"),
+    "first_ticket":         ("datetime64[us]", "first ticket of the shift"),
+    "last_return":          ("datetime64[us]", "back at plant"),
+    "ignition_off":         ("datetime64[us]", "telematics shift end"),
+    # dur_<stage> columns: int16 minutes (see `_dtype`)
+    # int16 / int32 columns holding fractional values stay float64 (see `_convert`)
+    # TicketStore adds `hour` (int8) when missing
+}
+
+# float32 measures recorded at fixed precision; `widen` rounds back to it so
+# float64 sums match the values as recorded (float32 alone drifts ~1e-7 per row).
+DECIMALS = {
+    "distance_km": 1,
+    "fuel_used_L": 1,
+    "water_added_L": 1,
+    "hydraulic_pressure": 1,
+    "return_volume_m3": 2,
+    "load_volume_m3": 2,
+}
+
+
+def _dtype(col: str) -> str | None:
+    if col in SCHEMA:
+        return SCHEMA[col][0]
+    if col.startswith("dur_"):
+        return "int16"
+    return None
+
+
+def ticket_ids(s: pd.Series) -> pd.Series:
+    """
+    `T10042` / `10042` -> 10042 when every id in `s` has that form; otherwise
+    the ids stay strings as exported, so `TK-9` is kept and `T0042` is not
+    folded into `T42`. Blank ids become NA.
+    """
+    if pd.api.types.is_numeric_dtype(s):
+        return s
+    text = s.astype("string").str.strip().replace("", pd.NA)
+    digits = text.str.removeprefix(TICKET_PREFIX)
+    if digits.str.fullmatch(r"0|[1-9][0-9]{0,17}").fillna(True).all():
+        return digits.astype("Int64")
+    return text
+
+
+def _convert(s: pd.Series, dtype: str) -> pd.Series | None:
+    """`s` as `dtype`, or None to keep it as is."""
+    if dtype.startswith("datetime64"):
+        return pd.to_datetime(s).astype(dtype)
+    if s.name == "ticket_id" and not pd.api.types.is_numeric_dtype(s):
+        s = ticket_ids(s)
+        if not pd.api.types.is_numeric_dtype(s):
+            return None  # free-form ids stay strings
+    if dtype.startswith("int"):
+        if pd.api.types.is_float_dtype(s):
+            v = s.to_numpy(dtype=np.float64, na_value=np.nan)
+            if (np.isfinite(v) & (v != np.floor(v))).any():  # 9.5 m³ / 95.5 min: never truncate
+                return None if s.dtype == np.float64 else s.astype("float64")
+        lo, hi = s.min(), s.max()
+        if pd.notna(lo) and (lo < np.iinfo(dtype).min or hi > np.iinfo(dtype).max):
+            dtype = "int32" if np.iinfo("int32").min <= lo and hi <= np.iinfo("int32").max else "int64"
+            if s.dtype == dtype:
+                return None
+        if s.isna().any():
+            return s.astype(dtype.capitalize())  # nullable Int16/Int32 keeps NaN as <NA>
+    return s.astype(dtype)
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return `df` with `SCHEMA` dtypes (idempotent; unknown columns untouched).
+    Integer columns whose values do not fit the schema width are widened, never wrapped.
+    """
+    out = {}
+    for col in df.columns:
+        dtype = _dtype(col)
+        if dtype is not None and str(df[col].dtype).lower() != dtype:
+            s = _convert(df[col], dtype)
+            if s is not None:
+                out[col] = s
+        elif dtype == "category" and not df[col].cat.categories.is_monotonic_increasing:
+            # categories sorted, so grouped output order does not depend on the source
+            out[col] = df[col].cat.reorder_categories(df[col].cat.categories.sort_values())
+    return df.assign(**out) if out else df
+
+
+def widen_values(values: np.ndarray, name: str | None = None) -> np.ndarray:
+    """`widen` for the numpy values of column `name`."""
+    if values.dtype == np.float32:
+        places = DECIMALS.get(name)
+        wide = values.astype(np.float64)
+        return wide.round(places) if places is not None else wide
+    if values.dtype.kind in "iu" and values.dtype.itemsize < 8:
+        return values.astype(np.int64)
+    return values
+
+
+def widen(s: pd.Series) -> pd.Series:
+    """
+    `s` in a dtype safe to sum: float32 -> float64 rounded to its recorded
+    precision, narrow ints -> int64 (grouped sums may keep the input width).
+    """
+    if s.dtype == np.float32 or (isinstance(s.dtype, np.dtype) and s.dtype.kind in "iu" and s.dtype.itemsize < 8):
+        return pd.Series(widen_values(s.to_numpy(), s.name), index=s.index, name=s.name)
+    if pd.api.types.is_extension_array_dtype(s.dtype) and pd.api.types.is_integer_dtype(s.dtype):
+        return s.astype("float64")
+    return s
+
+
+def ticket_label(ticket_id) -> str:
+    """Display form of a ticket id (`10042` -> `T10042`); string ids pass through."""
+    if isinstance(ticket_id, str):
+        return ticket_id
+    return f"{TICKET_PREFIX}{int(ticket_id)}"
+
+
+def for_display(df: pd.DataFrame) -> pd.DataFrame:
+    """`df` with `T<id>` ticket labels and widened float32 measures (for tool output)."""
+    out = {c: widen(df[c]) for c in df.columns if df[c].dtype == np.float32}
+    if "ticket_id" in df and pd.api.types.is_numeric_dtype(df["ticket_id"]):
+        out["ticket_id"] = TICKET_PREFIX + df["ticket_id"].astype(str)
+    return df.assign(**out) if out else df
+
+
+def memory_report(df: pd.DataFrame) -> dict:
+    """Deep memory use of `df`, per column and per row."""
+    per_col = df.memory_usage(deep=True, index=False)
+    total = int(per_col.sum() + df.index.memory_usage(deep=True))
+    return {
+        "rows": len(df),
+        "total_mb": round(total / 2**20, 2),
+        "bytes_per_row": round(total / len(df), 1) if len(df) else 0.0,
+        "columns": {c: {"dtype": str(df[c].dtype), "kb": round(int(b) / 1024, 1)} for c, b in per_col.items()},
+    }
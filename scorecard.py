@@ -0,0 +1,153 @@
+# scorecard.py – per-driver, per-day scorecard shared by all driver-ranking answers
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from rollup import CubeWindow, RollupCube
+from schema import widen
+
+_DAY = pd.Timedelta(days=1)
+
+# cube measure -> scorecard column (all additive)
+_SUMS = {
+    "loads": "loads",
+    "load_volume_m3": "m3",
+    "cycle_time": "cycle_min",
+    "dur_waiting": "wait_min",
+    "dur_waiting_n": "wait_n",
+    "water_added_L": "water_L",
+    "fuel_used_L": "fuel_L",
+    "distance_km": "distance_km",
+}
+
+_BY_CUBE: "weakref.WeakKeyDictionary[RollupCube, DriverScorecard]" = weakref.WeakKeyDictionary()
+
+
+def _derive(sums: pd.DataFrame) -> pd.DataFrame:
+    """Add ratio columns (one definition of m³/hr for the whole app)."""
+    out = sums.reindex(columns=list(_SUMS.values()))
+    cols = {c: out[c].to_numpy() for c in out.columns}
+    m3, cycle_min, fuel_l = (cols[c].astype("float64") for c in ("m3", "cycle_min", "fuel_L"))
+    wait_n, distance = (cols[c].astype("float64") for c in ("wait_n", "distance_km"))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # built in one constructor: inserting columns one by one dominates small windows
+        return pd.DataFrame({
+            **cols,
+            "cycle_hr": cycle_min / 60.0,
+            "m3_per_hr": m3 / (cycle_min / 60.0),
+            "avg_wait_min": cols["wait_min"] / np.where(wait_n > 0, wait_n, np.nan),
+            "l_per_km": fuel_l / np.where(distance == 0, np.nan, distance),
+        }, index=out.index)
+
+
+def _by_driver(agg: pd.DataFrame) -> pd.DataFrame:
+    cols = [c for c in _SUMS if c in agg]
+    return agg[cols].rename(columns=_SUMS)
+
+
+def _raw_by_driver(rows: pd.DataFrame) -> pd.DataFrame:
+    """`_by_driver(aggregate(rows, ["driver"]))`, summing only the scorecard columns."""
+    measures = [c for c in _SUMS if c in rows and c != "loads"]
+    g = rows[["driver"]].assign(**{m: widen(rows[m]) for m in measures}).groupby("driver", observed=True)
+    out = g[measures].sum().assign(loads=g.size())
+    if "dur_waiting" in rows:
+        out["dur_waiting_n"] = g["dur_waiting"].count()
+    return _by_driver(out)
+
+
+class DriverScorecard:
+    """
+    Per-driver running totals (m³, cycle hours, wait, water, fuel, distance,
+    loads) over the service days of the cube's date × driver cuboid: the
+    whole days of a window are one subtraction of two cumulative rows, plus
+    the raw tickets of at most two partial edge days.
+    """
+
+    def __init__(self, cube: RollupCube):
+        self.cube = cube
+        cells = cube.cuboid(("date", "driver")).cells
+        self._measures = sums = [c for c in _SUMS if c in cells]
+        codes, drivers = pd.factorize(cells["driver"], sort=True)
+        named = codes >= 0
+        day_ns = cells["date"].to_numpy(dtype="datetime64[ns]").view("int64")[named]
+        self._day_ns, day = np.unique(day_ns, return_inverse=True)
+        daily = np.zeros((len(self._day_ns), len(drivers), len(sums)))
+        np.add.at(daily, (day, codes[named]), cells.loc[named, sums].to_numpy(dtype="float64", na_value=0.0))
+        # _cum[i]: per-driver totals of the days before _day_ns[i]
+        self._cum = np.concatenate([np.zeros((1, len(drivers), len(sums))), daily.cumsum(axis=0)])
+        self.drivers = pd.Index(drivers, name="driver")
+        self.columns = [_SUMS[c] for c in sums]
+
+    @classmethod
+    def for_cube(cls, cube: RollupCube) -> "DriverScorecard":
+        """The scorecard of `cube`, built on first use (once per data version)."""
+        card = _BY_CUBE.get(cube)
+        if card is None:
+            card = _BY_CUBE[cube] = cls(cube)
+        return card
+
+    def _days(self, first: pd.Timestamp, stop: pd.Timestamp | None) -> np.ndarray:
+        """Per-driver totals of the whole days `first <= date < stop` (drivers × columns)."""
+        lo = np.searchsorted(self._day_ns, first.value, side="left")
+        hi = len(self._day_ns) if stop is None else np.searchsorted(self._day_ns, stop.value, side="left")
+        return self._cum[max(lo, hi)] - self._cum[lo]
+
+    def _raw(self, sums: np.ndarray, start: pd.Timestamp, end: pd.Timestamp) -> None:
+        """Add the raw tickets of `start <= start_time < end` (inside one edge day) into `sums`."""
+        lo, hi = self.cube.store.bounds(start, end)
+        if lo == hi:
+            return
+        edge = self.cube.edge_cells(("date", "driver"), lo, hi, start.normalize())
+        pos = self.drivers.get_indexer(edge["driver"])
+        known = pos >= 0
+        sums[pos[known]] += edge.loc[known, self._measures].to_numpy(dtype="float64", na_value=0.0)
+
+    def window(self, start=None, end=None, *, day=None) -> pd.DataFrame:
+        """
+        Per-driver scorecard for `start <= start_time < end` (open-ended if
+        None), or one service `day`. Index: driver.
+        """
+        if day is not None:
+            start = pd.Timestamp(day).normalize()
+            end = start + _DAY
+        sums = np.zeros((len(self.drivers), len(self.columns)))
+        if start is None:
+            first = pd.Timestamp.min
+        else:
+            start = pd.Timestamp(start)
+            first = start.normalize()
+            if first != start:
+                edge_end = first + _DAY if end is None else min(first + _DAY, pd.Timestamp(end))
+                self._raw(sums, start, edge_end)
+                first += _DAY
+        stop = None
+        if end is not None:
+            end = pd.Timestamp(end)
+            stop = end.normalize()
+            if stop != end and stop >= first:
+                self._raw(sums, stop, end)
+        if stop is None or stop > first:
+            sums += self._days(first, stop)
+        seen = sums[:, self.columns.index("loads")] > 0
+        out = pd.DataFrame(sums[seen], index=self.drivers[seen], columns=self.columns)
+        counts = [c for c in ("loads", "wait_n") if c in out]
+        out[counts] = out[counts].round().astype("int64")
+        if out.empty:
+            return _derive(pd.DataFrame(columns=list(_SUMS.values()), dtype=float).rename_axis("driver"))
+        return _derive(out)
+
+
+def driver_scorecard(src: pd.DataFrame | CubeWindow) -> pd.DataFrame:
+    """Per-driver scorecard for a cube window (materialized) or a raw ticket frame."""
+    if isinstance(src, CubeWindow):
+        card = DriverScorecard.for_cube(src.cube)
+        kind, *rest = src.key[1:]
+        if kind == "day":
+            return card.window(day=rest[0])
+        if kind == "since":
+            return card.window(start=rest[0])
+        return card.window()
+    if not isinstance(src, pd.DataFrame):  # other windows (ticket_db.DbWindow) roll up themselves
+        return _derive(_by_driver(src.rollup("driver")))
+    return _derive(_raw_by_driver(src))
@@ -0,0 +1,176 @@
+# sharded_kpis.py – headline KPIs of a multi-depot history: per-plant (or tenant) partials on a process pool, merged
+# Opt-in: the app computes its KPIs with `coach_core.get_kpis`; call `get_kpis_sharded` for the headline
+# numbers (and `RANKINGS`) of a large multi-depot frame.
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from coach_core import _mins_col, window_rows
+from schema import compact, widen
+from topn import top_n
+
+KPI_WORKERS = int(os.getenv("COACH_KPI_WORKERS", "0")) or os.cpu_count() or 1
+
+# ranked lists kept alongside the headline KPIs: name -> (window, order column, n, columns shown)
+RANKINGS = {
+    "top_wait_48h": ("48h", "dur_waiting", 3, ["job_site", "dur_waiting"]),
+    "longest_distance_week": ("week", "distance_km", 10, ["job_site", "distance_km"]),
+    "slowest_washouts_week": ("week", "washout_duration_min", 5, ["ticket_id", "driver", "washout_duration_min"]),
+}
+
+_SUMS = {"fuel_L_today": "fuel_used_L", "distance_km_today": "distance_km", "m3_today": "load_volume_m3"}
+_DAY = pd.Timedelta(days=1)
+
+
+def _sum_count(s: pd.Series) -> tuple[float, int]:
+    return float(s.sum(skipna=True)), int(s.count())
+
+
+def partial_kpis(shard: pd.DataFrame, now: datetime, n: int | None = None) -> dict:
+    """
+    Additive pieces of `get_kpis` for one shard: loads, sums and non-null
+    counts, the distinct trucks of today and the distinct (date, truck)
+    pairs of the 7-day window, and each shard's `RANKINGS` candidates
+    (with `_ns` / `_pos` to rebuild the single-store row order).
+    `shard` is a slice of `_window_frame` (sorted by `start_time`, with a
+    `date` column) carrying `_pos`, its rows' positions in that frame; the
+    windows are binary searches on it, no `TicketStore` is built.
+    """
+    today = pd.Timestamp(now).normalize()
+    ns = shard["start_time"].to_numpy(dtype="datetime64[ns]").view("int64")
+    day_ns = shard["date"].to_numpy(dtype="datetime64[ns]").view("int64")
+
+    def day(d: pd.Timestamp) -> pd.DataFrame:
+        return shard.iloc[np.searchsorted(day_ns, d.value):np.searchsorted(day_ns, (d + _DAY).value)]
+
+    def since(start) -> pd.DataFrame:
+        return shard.iloc[np.searchsorted(ns, pd.Timestamp(start).value):]
+
+    t = day(today)
+    week = since(now - timedelta(days=7))
+    windows = {"week": week, "48h": since(now - timedelta(hours=48))}
+
+    def col(c: str) -> pd.Series:
+        return t[c] if c in t else pd.Series(pd.NaT, index=t.index, dtype="datetime64[ns]")
+
+    min_total = _mins_col(col("ignition_on"), col("ignition_off"))
+    min_prod = _mins_col(col("first_ticket"), col("last_return"))
+
+    part = {
+        "loads_today": len(t),
+        "loads_yesterday": len(day(today - _DAY)),
+        "trucks_today": np.asarray(t["truck"].dropna().unique()),
+        "cycle_today": float(t["cycle_time"].sum()),
+        "wait": _sum_count(t["dur_waiting"]) if "dur_waiting" in t else None,
+        "prod_ratio": _sum_count(min_prod / min_total * 100),
+        "min_prod": float(min_prod.sum(skipna=True)),
+        "min_total": float(min_total.sum(skipna=True)),
+        **{key: float(widen(t[col]).sum()) if col in t else None for key, col in _SUMS.items()},
+        "loads_week": len(week),
+        "cycle_week": float(week["cycle_time"].sum()),
+        "truck_days": week[["date", "truck"]].dropna().drop_duplicates(),
+        "top": {},
+    }
+    for name, (window, order, size, cols) in RANKINGS.items():
+        src = windows[window]
+        if order not in src:
+            continue
+        best = top_n(src, order, size if n is None else n)
+        part["top"][name] = best[[*dict.fromkeys([*cols, order]), "_pos"]].assign(
+            _ns=best["start_time"].to_numpy(dtype="datetime64[ns]").view("int64"))
+    return part
+
+
+def _window_frame(df: pd.DataFrame, now: datetime) -> pd.DataFrame:
+    """`window_rows` of `df` in `TicketStore` order and dtypes: compact, sorted by `start_time`, dated."""
+    frame = compact(window_rows(df, now))
+    start = pd.to_datetime(frame["start_time"])
+    if "date" not in frame or not pd.api.types.is_datetime64_any_dtype(frame["date"]):
+        frame = frame.assign(date=start.dt.normalize())
+    order = np.argsort(start.to_numpy(dtype="datetime64[ns]").view("int64"), kind="stable")
+    return frame.take(order).assign(start_time=start.take(order).to_numpy()).reset_index(drop=True)
+
+
+def _shard(frame: pd.DataFrame, idx: np.ndarray) -> pd.DataFrame:
+    """Rows `idx` of `frame`, tagged with their positions as `_pos`."""
+    return frame.take(idx).assign(_pos=idx)
+
+
+def _ratio(num: float, den: float) -> float:
+    return float(num / den) if den else float("nan")
+
+
+def merge_partials(parts: list[dict], op_minutes: int = 600, n: int | None = None) -> dict:
+    """Headline keys of `get_kpis` (plus `top`: the `RANKINGS` lists) from shard partials."""
+    def total(key):
+        vals = [p[key] for p in parts if p[key] is not None]
+        return float(sum(vals)) if vals else float("nan")
+
+    def mean(key):
+        pairs = [p[key] for p in parts if p[key] is not None]
+        return _ratio(sum(s for s, _ in pairs), sum(c for _, c in pairs)) if pairs else float("nan")
+
+    trucks = pd.unique(np.concatenate([p["trucks_today"].astype(object) for p in parts])) if parts else []
+    n_trucks = len(trucks)
+    truck_days = len(pd.concat([p["truck_days"] for p in parts]).drop_duplicates()) if parts else 0
+    loads_week = sum(p["loads_week"] for p in parts)
+    prod_min = total("min_prod")
+
+    top = {}
+    for name, (_, order, size, cols) in RANKINGS.items():
+        cands = [p["top"][name] for p in parts if name in p["top"]]
+        if not cands:
+            continue
+        # single-store order (start time, then position in the full frame) keeps its tie-breaking
+        cat = pd.concat(cands, ignore_index=True).sort_values(["_ns", "_pos"], kind="stable", ignore_index=True)
+        top[name] = top_n(cat, order, size if n is None else n, cols=cols).reset_index(drop=True)
+
+    return {
+        "loads_today": sum(p["loads_today"] for p in parts),
+        "loads_yesterday": sum(p["loads_yesterday"] for p in parts),
+        "utilization_pct": _ratio(total("cycle_today") * 100, op_minutes * n_trucks),
+        "utilization_7d_pct": _ratio(total("cycle_week") * 100, truck_days * op_minutes) if loads_week else float("nan"),
+        "avg_wait_min": mean("wait"),
+        "n_trucks": n_trucks,
+        "prod_ratio": mean("prod_ratio"),
+        "prod_prod_min": prod_min,
+        "prod_idle_min": total("min_total") - prod_min,
+        **{key: total(key) for key in _SUMS},
+        "top": top,
+    }
+
+
+def get_kpis_sharded(df: pd.DataFrame, by: str = "origin_plant", op_minutes: int = 600,
+                     now: datetime | None = None, workers: int | None = None, n: int | None = None) -> dict:
+    """
+    Headline KPIs of `get_kpis` for a frame split by `by` (plant, tenant, …).
+
+    The frame is cut to the rows the KPI windows can see (`window_rows`)
+    and split into shards in this process; each worker of a process pool
+    of `workers` (default `COACH_KPI_WORKERS` or the CPU count) receives
+    only its own shard and runs `partial_kpis` on it. The partials merge
+    in `merge_partials`. Counts and distinct-truck totals equal the
+    single-process dict exactly, float sums up to summation order. `top`
+    holds the `RANKINGS` lists as `top_n` on the whole window would return
+    them. Trucks shared between plants are counted once.
+
+    Against `get_kpis(df, window_only=True)` this only pays off with
+    several cores and shards big enough to outweigh the pool start-up.
+    """
+    now = now or datetime.now()
+    workers = workers or KPI_WORKERS
+    frame = _window_frame(df, now)
+    groups = list(frame.groupby(by, sort=True, observed=True, dropna=False).indices.values()) if len(frame) else []
+    # largest shards first, so one big depot does not start last
+    shards = sorted((_shard(frame, np.sort(idx)) for idx in groups), key=len, reverse=True) or [_shard(frame, np.empty(0, dtype=np.int64))]
+    if workers <= 1 or len(shards) == 1:
+        parts = [partial_kpis(shard, now, n) for shard in shards]
+        return {**merge_partials(parts, op_minutes, n), "shards": len(shards), "workers": 1}
+
+    workers = min(workers, len(shards))
+    with ProcessPoolExecutor(workers) as pool:
+        parts = list(pool.map(partial_kpis, shards, [now] * len(shards), [n] * len(shards)))
+    return {**merge_partials(parts, op_minutes, n), "shards": len(shards), "workers": workers}
@@ -0,0 +1,154 @@
+# stub_llm.py – local OpenAI-compatible stub server (offline benches / manual runs of the model chain)
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLM:
+    """
+    Serves `POST /v1/chat/completions` for a set of fake models.
+
+    `models` maps a model name to its behaviour: `status` (HTTP code, 200
+    by default), `latency_s` (delay before answering), `reply` (text) and,
+    `token_s` (generation time per word; streamed requests get it between
+    word deltas), `fail_after` (streamed: send an error event after that
+    many deltas) and `tool_calls` (`[{"name", "arguments"}]` asked for when
+    the request offers tools and carries no tool results yet).
+    Unknown models get a 404 like the real API. `requests` counts calls
+    per model; `set()` changes a model's behaviour while serving.
+
+        with StubLLM({"gpt-5-chat": {"status": 404}, "gpt-4o": {"latency_s": 0.05}}) as stub:
+            client = OpenAI(api_key="stub", base_url=stub.url)
+    """
+
+    def __init__(self, models: dict[str, dict], host: str = "127.0.0.1", port: int = 0):
+        self.models = {name: dict(spec) for name, spec in models.items()}
+        self.requests: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def set(self, model: str, **spec) -> None:
+        with self._lock:
+            self.models[model] = spec
+
+    def start(self) -> "StubLLM":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubLLM":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):  # keep bench output clean
+                pass
+
+            def _json(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, model: str, reply: str, spec: dict) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                words = reply.split(" ")
+                for i, word in enumerate(words):
+                    if i == spec.get("fail_after"):
+                        return self._event({"error": {"message": "stub stream interrupted", "type": "server_error"}})
+                    if i:
+                        time.sleep(spec.get("token_s", 0.0))
+                    delta = {"content": word if i == 0 else " " + word}
+                    self._event({"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                                 "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                self._event({"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def _event(self, body: dict) -> None:
+                self.wfile.write(b"data: " + json.dumps(body).encode() + b"\n\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                model = body.get("model", "")
+                with stub._lock:
+                    stub.requests[model] += 1
+                    spec = stub.models.get(model)
+                if spec is None:
+                    spec = {"status": 404}
+                time.sleep(spec.get("latency_s", 0.0))
+                status = spec.get("status", 200)
+                if status == 404:
+                    return self._json(404, {"error": {"message": f"The model `{model}` does not exist",
+                                                      "type": "invalid_request_error", "code": "model_not_found"}})
+                if status != 200:
+                    return self._json(status, {"error": {"message": f"stub error {status}", "type": "server_error"}})
+                reply = spec.get("reply", f"stub answer from {model}")
+                results = [m for m in body.get("messages", []) if m.get("role") == "tool"]
+                if spec.get("tool_calls") and body.get("tools") and not results:
+                    calls = [{"id": f"call_{i}", "type": "function",
+                              "function": {"name": c["name"], "arguments": json.dumps(c.get("arguments", {}))}}
+                             for i, c in enumerate(spec["tool_calls"])]
+                    return self._json(200, {
+                        "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "finish_reason": "tool_calls",
+                                     "message": {"role": "assistant", "content": None, "tool_calls": calls}}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    })
+                if results:
+                    reply += f" ({len(results)} tool results)"
+                if body.get("stream"):
+                    return self._stream(model, reply, spec)
+                time.sleep(spec.get("token_s", 0.0) * (len(reply.split(" ")) - 1))  # generated all the same
+                self._json(200, {
+                    "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": reply}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                })
+
+        return Handler
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(prog="stub_llm.py", description="run with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.3, help="seconds to the first token")
+    ap.add_argument("--token", type=float, default=0.03, help="seconds per streamed word")
+    args = ap.parse_args()
+    reply = "Stub coach reply: " + " ".join(["waits are down, keep staging loads early."] * 20)
+    spec = {"latency_s": args.latency, "token_s": args.token, "reply": reply}
+    stub = StubLLM({"gpt-4o": spec, "gpt-4o-mini": {**spec, "latency_s": args.latency / 2}}, port=args.port)
+    print(f"stub LLM on {stub.url} (gpt-5-chat -> 404)")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# telemetry.py – per-truck high-frequency drum RPM / hydraulic pressure samples
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+SIGNALS = ["drum_rpm", "hydraulic_pressure"]
+# normal operating band per signal; time outside it is what the intents report
+BANDS = {"drum_rpm": (4.0, 6.5), "hydraulic_pressure": (1850.0, 2150.0)}
+# a sample stands for the time until the next one, at most this long (dropouts are not "out of band")
+MAX_GAP_S = 60.0
+
+_US_PER_MIN = 60_000_000
+
+
+def _us(ts) -> np.ndarray:
+    return np.asarray(pd.to_datetime(ts), dtype="datetime64[us]").view("int64")
+
+
+def _summaries(values: dict, dt: np.ndarray, starts: np.ndarray) -> dict:
+    """min / max / mean / seconds below and above band per segment (`starts` = segment offsets)."""
+    out = {}
+    dt = dt.astype(np.float64)  # summaries in float64; only storage is float32
+    for sig, v in values.items():
+        lo, hi = BANDS.get(sig, (-np.inf, np.inf))
+        v = v.astype(np.float64)
+        out[f"{sig}_min"] = np.minimum.reduceat(v, starts)
+        out[f"{sig}_max"] = np.maximum.reduceat(v, starts)
+        out[f"{sig}_mean"] = np.add.reduceat(v, starts)
+        out[f"{sig}_low_s"] = np.add.reduceat(np.where(v < lo, dt, 0.0), starts)
+        out[f"{sig}_high_s"] = np.add.reduceat(np.where(v > hi, dt, 0.0), starts)
+    n = np.diff(np.r_[starts, len(dt)])
+    for sig in values:
+        out[f"{sig}_mean"] = out[f"{sig}_mean"] / n
+    out["n"] = n
+    out["covered_s"] = np.add.reduceat(dt, starts)
+    return out
+
+
+class SampleStore:
+    """
+    Columnar sample arrays (truck, µs timestamp, one float32 per signal)
+    sorted by truck then time, with per-truck offsets.
+
+    Appends are buffered and merged on the next read, so ingesting a
+    telematics feed in small batches costs one sort per query burst.
+    """
+
+    def __init__(self, signals: list[str] = SIGNALS):
+        self.signals = list(signals)
+        self._pending: list[tuple] = []
+        self._truck = np.empty(0, dtype=np.int32)
+        self._t = np.empty(0, dtype=np.int64)
+        self._values = {s: np.empty(0, dtype=np.float32) for s in self.signals}
+        self._dt = np.empty(0, dtype=np.float32)
+        self._keys = np.empty(0, dtype=np.int32)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._appended = 0
+        self._digest = hashlib.sha1()  # over every appended block, in append order
+
+    def append(self, truck, time, **values) -> None:
+        """Add samples: `truck` scalar or array, `time` datetimes, one array per signal."""
+        t = _us(time)
+        trucks = np.broadcast_to(np.asarray(truck, dtype=np.int32), t.shape)
+        missing = [s for s in self.signals if s not in values]
+        if missing:
+            raise ValueError(f"samples are missing signals: {missing}")
+        block = (trucks, t, {s: np.asarray(values[s], dtype=np.float32) for s in self.signals})
+        self._pending.append(block)
+        self._appended += len(t)
+        for a in (trucks, t, *block[2].values()):
+            self._digest.update(np.ascontiguousarray(a).tobytes())
+
+    # -------------------------
+    # Layout
+    # -------------------------
+    def _merge(self) -> None:
+        if not self._pending:
+            return
+        truck = np.concatenate([self._truck, *(p[0] for p in self._pending)])
+        t = np.concatenate([self._t, *(p[1] for p in self._pending)])
+        values = {s: np.concatenate([self._values[s], *(p[2][s] for p in self._pending)]) for s in self.signals}
+        self._pending = []
+        order = np.lexsort((t, truck))
+        self._truck, self._t = truck[order], t[order]
+        self._values = {s: v[order] for s, v in values.items()}
+
+        first = np.flatnonzero(np.r_[True, self._truck[1:] != self._truck[:-1]]) if len(t) else np.empty(0, dtype=np.int64)
+        self._keys = self._truck[first]
+        self._offsets = np.r_[first, len(t)]
+        # seconds each sample stands for: gap to the truck's next sample, capped
+        gap = np.diff(self._t, append=self._t[-1:]) / 1e6 if len(t) else np.empty(0)
+        gap[self._offsets[1:] - 1] = 0.0
+        period = np.median(gap[gap > 0]) if (gap > 0).any() else 0.0
+        gap[self._offsets[1:] - 1] = period  # last sample of each truck: the typical period
+        self._dt = np.minimum(gap, MAX_GAP_S).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self._t) + sum(len(p[1]) for p in self._pending)
+
+    @property
+    def version(self) -> str:
+        """Token for answer caches: the sample count and a hash of the appended data."""
+        return f"samples:{self._appended}:{self._digest.hexdigest()[:12]}"
+
+    @property
+    def trucks(self) -> np.ndarray:
+        self._merge()
+        return self._keys
+
+    def nbytes(self) -> int:
+        self._merge()
+        return int(self._truck.nbytes + self._t.nbytes + self._dt.nbytes + sum(v.nbytes for v in self._values.values()))
+
+    def _span(self, truck, start=None, end=None) -> tuple[int, int]:
+        """Positions of `truck`'s samples with `start <= time < end`."""
+        self._merge()
+        i = np.searchsorted(self._keys, truck)
+        if i == len(self._keys) or self._keys[i] != truck:
+            return 0, 0
+        lo, hi = int(self._offsets[i]), int(self._offsets[i + 1])
+        t = self._t[lo:hi]
+        a = 0 if start is None else int(np.searchsorted(t, _us(start), side="left"))
+        b = len(t) if end is None else int(np.searchsorted(t, _us(end), side="left"))
+        return lo + a, lo + max(a, b)
+
+    # -------------------------
+    # Queries
+    # -------------------------
+    def range(self, truck, start=None, end=None) -> pd.DataFrame:
+        """Raw samples of one truck with `start <= time < end`."""
+        lo, hi = self._span(truck, start, end)
+        return pd.DataFrame({
+            "time": self._t[lo:hi].astype("datetime64[us]"),
+            **{s: self._values[s][lo:hi] for s in self.signals},
+        })
+
+    def per_minute(self, truck=None, start=None, end=None) -> pd.DataFrame:
+        """
+        Samples downsampled to one row per (truck, minute): `<signal>_min/_max/_mean`,
+        seconds below / above band (`_low_s`, `_high_s`), `n`.
+        """
+        self._merge()
+        spans = [self._span(k, start, end) for k in (self._keys if truck is None else [truck])]
+        idx = np.concatenate([np.arange(lo, hi) for lo, hi in spans]) if spans else np.empty(0, dtype=np.int64)
+        if not len(idx):
+            return pd.DataFrame(columns=["truck", "minute"]).set_index(["truck", "minute"])
+        truck_, minute = self._truck[idx], self._t[idx] // _US_PER_MIN
+        starts = np.flatnonzero(np.r_[True, (truck_[1:] != truck_[:-1]) | (minute[1:] != minute[:-1])])
+        out = _summaries({s: self._values[s][idx] for s in self.signals}, self._dt[idx], starts)
+        out.pop("covered_s")
+        index = pd.MultiIndex.from_arrays(
+            [truck_[starts], (minute[starts] * _US_PER_MIN).astype("datetime64[us]")], names=["truck", "minute"])
+        return pd.DataFrame(out, index=index)
+
+    def per_ticket(self, tickets: pd.DataFrame) -> pd.DataFrame:
+        """
+        Summaries over each ticket's cycle (`start_time` + `cycle_time` minutes
+        on its truck), one row per row of `tickets` in its order, indexed by
+        ticket_id (a repeated ticket_id keeps one row per occurrence). A sample
+        belongs to the latest ticket its truck started before it; tickets
+        without samples get n=0.
+        """
+        self._merge()
+        cols = [f"{s}_{k}" for s in self.signals for k in ("min", "max", "mean", "low_s", "high_s")]
+        parts = []
+        if len(tickets):
+            start = _us(tickets["start_time"])
+            end = start + (tickets["cycle_time"].to_numpy(dtype=np.float64) * _US_PER_MIN).astype(np.int64)
+            truck = tickets["truck"].to_numpy()
+            dated = start != np.iinfo(np.int64).min  # NaT starts own no samples
+            for k in np.unique(truck):
+                mine = np.flatnonzero((truck == k) & dated)
+                if not len(mine):
+                    continue
+                mine = mine[np.argsort(start[mine], kind="stable")]
+                # only samples from the truck's first ticket start to its last ticket end
+                lo, hi = self._span(k, start[mine[0]].astype("datetime64[us]"), end[mine].max().astype("datetime64[us]"))
+                t = self._t[lo:hi]
+                owner = np.searchsorted(start[mine], t, side="right") - 1
+                keep = owner >= 0
+                keep[keep] = t[keep] < end[mine][owner[keep]]
+                if not keep.any():
+                    continue
+                pos = lo + np.flatnonzero(keep)
+                owner = owner[keep]
+                starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+                summ = _summaries({s: self._values[s][pos] for s in self.signals}, self._dt[pos], starts)
+                parts.append(pd.DataFrame(summ, index=mine[owner[starts]]))  # row positions: ids may repeat
+        found = pd.concat(parts) if parts else pd.DataFrame(columns=[*cols, "n", "covered_s"])
+        out = found.reindex(np.arange(len(tickets)))
+        out.index = pd.Index(tickets["ticket_id"].to_numpy(), name="ticket_id")
+        out["n"] = out["n"].fillna(0).astype(np.int64)
+        return out
+
+
+def out_of_band(summary: pd.DataFrame, signal: str, min_s: float = 60.0) -> dict:
+    """Loads with at least `min_s` seconds below / above the `BANDS` range, and the minutes involved."""
+    low, high = summary[f"{signal}_low_s"].fillna(0), summary[f"{signal}_high_s"].fillna(0)
+    return {
+        "band": BANDS[signal],
+        "low_loads": int((low >= min_s).sum()),
+        "high_loads": int((high >= min_s).sum()),
+        "low_min": round(float(low.sum()) / 60, 1),
+        "high_min": round(float(high.sum()) / 60, 1),
+        "sampled_loads": int((summary["n"] > 0).sum()),
+    }
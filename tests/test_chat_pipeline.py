@@ -0,0 +1,54 @@
+# test_chat_pipeline.py – one chat turn (rules, response cache, streamed LLM reply) against stub_llm
+import logging
+from datetime import datetime
+
+import pytest
+
+from chat_pipeline import ReplyStream, answer_question
+from coach_core import get_kpis
+from dummy_data_gen import load_data
+from model_utils import AsyncChat, ModelHealth
+from response_cache import ResponseCache
+from stub_llm import StubLLM
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+ASK = "What should I tell a customer who is upset about a late pour?"
+
+
+@pytest.fixture(scope="module")
+def kpis():
+    now = datetime.now().replace(hour=15, minute=0, second=0, microsecond=0)
+    return get_kpis(load_data(days_back=3, n_jobs_per_day=40), now=now)
+
+
+@pytest.fixture
+def pool():
+    with StubLLM({"gpt-4o": {"reply": "Own the delay and give a new ETA."}}) as stub:
+        chat = AsyncChat(chain=["gpt-4o"], health=ModelHealth(), api_key="stub", base_url=stub.url, max_retries=0)
+        yield chat
+        chat.close()
+
+
+def test_rule_answers_come_whole(kpis, pool):
+    timings = {}
+    reply = answer_question("how many loads today", kpis, [], call=pool, cache=ResponseCache(":memory:"),
+                            stream=True, timings=timings)
+    assert isinstance(reply, str) and timings["path"] == "rule"
+
+
+def test_stream_then_cache_hit(kpis, pool):
+    cache, timings = ResponseCache(":memory:"), {}
+    reply = answer_question(ASK, kpis, [], call=pool, cache=cache, stream=True, timings=timings)
+    assert isinstance(reply, ReplyStream)
+    assert "".join(reply) == "Own the delay and give a new ETA."
+    assert reply.reply == "_model: gpt-4o_\n\nOwn the delay and give a new ETA."
+    assert timings["model"] == "gpt-4o" and "total_s" in timings
+
+    again = answer_question(ASK, kpis, [], call=pool, cache=cache, stream=True)
+    assert again == "_model: gpt-4o (cached)_\n\nOwn the delay and give a new ETA."
+
+
+def test_calls_without_stream_come_whole(kpis):
+    call = lambda messages, temperature: ("gpt-4o", "Call the customer first.")
+    reply = answer_question(ASK, kpis, [], call=call, cache=ResponseCache(":memory:"), stream=True)
+    assert reply == "_model: gpt-4o_\n\nCall the customer first."
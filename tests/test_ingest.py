@@ -0,0 +1,43 @@
+# test_ingest.py – ticket id parsing and the telematics join in chunked ingest
+import pandas as pd
+
+from ingest import TelematicsIndex, TicketIngest, coerce
+
+
+def _tickets(ids) -> pd.DataFrame:
+    n = len(ids)
+    return pd.DataFrame({"ticket_id": ids, "start_time": ["2025-03-03 08:00"] * n, "cycle_time": ["95"] * n,
+                         "driver": ["Ana"] * n})
+
+
+def _tele(ids, fuel) -> pd.DataFrame:
+    return pd.DataFrame({"ticket_id": ids, "fuel_used_L": fuel})
+
+
+def test_numeric_ids_lose_the_prefix():
+    df, report = coerce(_tickets(["T10042", " 10043 ", ""]))
+    assert df["ticket_id"].tolist() == [10042, 10043]
+    assert report["rejected"]["bad_ticket_id"] == 1
+
+
+def test_free_form_ids_stay_strings():
+    df, _ = coerce(_tickets(["T0042", "T42", "TK-9"]))
+    assert df["ticket_id"].tolist() == ["T0042", "T42", "TK-9"]
+
+
+def test_padded_ids_are_not_merged():
+    ingest = TicketIngest()
+    kept = ingest.feed(_tickets(["T0042", "T42"]))
+    assert len(kept) == 2 and ingest.duplicates == 0
+
+
+def test_telematics_join_on_free_form_ids():
+    tele = TelematicsIndex()
+    try:
+        tele.add(coerce(_tele(["T42"], ["30.5"]), required=["ticket_id"])[0])
+        tele.add(coerce(_tele(["TK-9"], ["12.0"]), required=["ticket_id"])[0])  # switches to text keys
+        kept = TicketIngest().feed(_tickets(["T42", "TK-9", "T7"]), tele)
+    finally:
+        tele.close()
+    assert kept["fuel_used_L"].tolist()[:2] == [30.5, 12.0]
+    assert kept["fuel_used_L"].isna().tolist() == [False, False, True]
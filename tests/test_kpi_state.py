@@ -0,0 +1,44 @@
+# test_kpi_state.py – incremental KPI state against a full get_kpis recompute
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from coach_core import get_kpis
+from dummy_data_gen import load_data
+from kpi_state import KpiState
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+NOW = datetime.now().replace(hour=15, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture(scope="module")
+def tickets():
+    return load_data(days_back=10, n_jobs_per_day=60)
+
+
+def _same(a: dict, b: dict) -> bool:
+    return all((pd.isna(b[k]) and pd.isna(a[k])) or np.isclose(a[k], b[k], rtol=1e-9, atol=1e-6) for k in a)
+
+
+def test_headline_matches_get_kpis(tickets):
+    full = get_kpis(tickets, now=NOW)
+    assert _same(KpiState().apply(tickets).kpis(NOW), {k: full[k] for k in KpiState().kpis(NOW)})
+
+
+def test_one_ticket_at_a_time_matches_one_batch(tickets):
+    batch = KpiState().apply(tickets)
+    state = KpiState().apply(tickets.iloc[:-50])
+    for i in range(len(tickets) - 50, len(tickets)):
+        state.apply(tickets.iloc[i:i + 1])
+    assert _same(state.kpis(NOW), batch.kpis(NOW))
+    assert state.by("driver").round(6).equals(batch.by("driver").round(6))
+
+
+def test_undated_tickets_are_skipped(tickets):
+    undated = tickets.iloc[:3].assign(start_time=pd.NaT, ticket_id=[-1, -2, -3])
+    state = KpiState().apply(tickets)
+    assert _same(state.apply(undated).kpis(NOW), KpiState().apply(tickets).kpis(NOW))
+    assert state.n_tickets == len(tickets)
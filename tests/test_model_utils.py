@@ -0,0 +1,156 @@
+# test_model_utils.py – model chain fallback, circuit breaker and the pooled client against stub_llm
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from openai import OpenAI
+
+from model_utils import AsyncChat, ModelHealth, chat_call, chat_stream
+from stub_llm import StubLLM
+
+CHAIN = ["gpt-5-chat", "gpt-4o", "gpt-4o-mini"]
+MSGS = [{"role": "user", "content": "avg wait?"}]
+
+
+def _until(cond, timeout_s: float = 5.0) -> bool:
+    """Poll `cond` until it holds (background probes finish on their own thread)."""
+    deadline = time.monotonic() + timeout_s
+    while not cond():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def stub():
+    with StubLLM({"gpt-5-chat": {"status": 404}, "gpt-4o": {}, "gpt-4o-mini": {}}) as s:
+        yield s
+
+
+@pytest.fixture
+def client(stub):
+    return OpenAI(api_key="stub", base_url=stub.url, max_retries=0)
+
+
+@pytest.fixture
+def clock():
+    now = [0.0]
+    tick = lambda: now[0]
+    tick.advance = lambda s: now.__setitem__(0, now[0] + s)
+    return tick
+
+
+def test_missing_model_falls_through(stub, client):
+    model, text = chat_call(MSGS, client=client, chain=CHAIN, health=ModelHealth())
+    assert model == "gpt-4o" and text
+    assert stub.requests["gpt-5-chat"] == 1
+
+
+def test_fresh_health_walks_from_the_top(stub, client):
+    for _ in range(3):
+        chat_call(MSGS, client=client, chain=CHAIN, health=ModelHealth())
+    assert stub.requests["gpt-5-chat"] == 3
+
+
+def test_not_found_opens_the_breaker(stub, client, clock):
+    health = ModelHealth(cooldown_s=60, clock=clock)
+    used = [chat_call(MSGS, client=client, chain=CHAIN, health=health)[0] for _ in range(5)]
+    assert used == ["gpt-4o"] * 5
+    assert health.is_open("gpt-5-chat")
+    assert stub.requests["gpt-5-chat"] == 1
+
+
+def test_probe_closes_the_breaker_without_blocking_the_turn(stub, client, clock):
+    health = ModelHealth(cooldown_s=60, clock=clock)
+    chat_call(MSGS, client=client, chain=CHAIN, health=health)
+    stub.set("gpt-5-chat", latency_s=0.3)
+    clock.advance(61)
+
+    t0 = time.perf_counter()
+    model, _ = chat_call(MSGS, client=client, chain=CHAIN, health=health)
+    assert model == "gpt-4o"
+    assert time.perf_counter() - t0 < 0.3  # the probe runs in the background
+
+    assert _until(lambda: not health.is_open("gpt-5-chat"))
+    assert chat_call(MSGS, client=client, chain=CHAIN, health=health)[0] == "gpt-5-chat"
+
+
+def test_server_errors_trip_after_max_errors_and_recover(stub, client, clock):
+    health = ModelHealth(cooldown_s=60, max_errors=3, clock=clock)
+    stub.set("gpt-5-chat", status=500)
+    used = [chat_call(MSGS, client=client, chain=CHAIN, health=health)[0]]
+    for n in range(2, 4):  # later failures come from background probes once the cooldown passes
+        clock.advance(61)
+        used.append(chat_call(MSGS, client=client, chain=CHAIN, health=health)[0])
+        assert _until(lambda: health.stats()["gpt-5-chat"]["consecutive_errors"] == n)
+    assert set(used) == {"gpt-4o"}
+    assert health.is_open("gpt-5-chat")
+
+    stub.set("gpt-5-chat")
+    clock.advance(61)
+    chat_call(MSGS, client=client, chain=CHAIN, health=health)
+    assert _until(lambda: not health.is_open("gpt-5-chat"))
+    assert chat_call(MSGS, client=client, chain=CHAIN, health=health)[0] == "gpt-5-chat"
+
+
+def test_every_model_failing_raises(stub, client):
+    stub.set("gpt-4o", status=500)
+    stub.set("gpt-4o-mini", status=500)
+    with pytest.raises(RuntimeError, match="No usable model"):
+        chat_call(MSGS, client=client, chain=CHAIN, health=ModelHealth())
+
+
+@pytest.fixture
+def pool(stub):
+    stub.set("gpt-4o", latency_s=0.3, token_s=0.01, reply=" ".join(["load"] * 10))
+    chat = AsyncChat(chain=["gpt-4o"], health=ModelHealth(), max_concurrency=4, max_connections=4,
+                     api_key="stub", base_url=stub.url, max_retries=0)
+    yield chat
+    chat.close()
+
+
+def test_identical_calls_in_flight_share_one_request(stub, pool):
+    with ThreadPoolExecutor(16) as ex:
+        answers = list(ex.map(pool, [MSGS] * 16))
+    assert len(set(answers)) == 1 and answers[0][0] == "gpt-4o"
+    assert stub.requests["gpt-4o"] == 1
+    assert pool.stats()["coalesced"] == 15
+
+
+def test_distinct_calls_each_go_upstream(stub, client, pool):
+    asks = [[{"role": "user", "content": f"compare today's wait ({i})"}] for i in range(4)]
+    with ThreadPoolExecutor(4) as ex:
+        pooled = list(ex.map(pool, asks))
+    assert stub.requests["gpt-4o"] == 4
+    assert pooled == [chat_call(q, client=client, chain=["gpt-4o"], health=ModelHealth()) for q in asks]
+
+
+def test_calls_from_another_event_loop_coalesce(stub, pool):
+    async def gather():
+        return await asyncio.gather(*(pool.call(MSGS) for _ in range(8)))
+
+    assert len(set(asyncio.run(gather()))) == 1
+    assert stub.requests["gpt-4o"] == 1
+
+
+def test_identical_streams_share_one_upstream_stream(stub, client, pool):
+    ref = "".join(chat_stream(MSGS, client=client, chain=["gpt-4o"], health=ModelHealth()))
+    stub.requests.clear()
+    with ThreadPoolExecutor(8) as ex:
+        texts = list(ex.map(lambda q: "".join(pool.stream(q)), [MSGS] * 8))
+    assert set(texts) == {ref}
+    assert stub.requests["gpt-4o"] == 1
+
+
+def test_pooled_stream_falls_through_before_the_first_token(stub):
+    stub.set("gpt-4o", reply="staged")
+    chat = AsyncChat(chain=["gpt-5-chat", "gpt-4o"], health=ModelHealth(),
+                     api_key="stub", base_url=stub.url, max_retries=0)
+    try:
+        stream = chat.stream(MSGS)
+        assert "".join(stream) == "staged"
+        assert stream.model == "gpt-4o"
+    finally:
+        chat.close()
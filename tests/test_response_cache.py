@@ -0,0 +1,90 @@
+# test_response_cache.py – persistent LLM reply cache against stub_llm
+import pytest
+from openai import OpenAI
+
+from model_utils import ModelHealth, chat_call
+from response_cache import ResponseCache, cached_call, prompt_key
+from stub_llm import StubLLM
+
+SYSTEM = [{"role": "system", "content": "coach"}, {"role": "system", "content": "DATA SNAPSHOT (today)\n- Loads today: 412"}]
+ASK = SYSTEM + [{"role": "user", "content": "How do we cut washout time at plant 0?"}]
+
+
+@pytest.fixture
+def stub():
+    with StubLLM({"gpt-4o": {}}) as s:
+        yield s
+
+
+@pytest.fixture
+def call(stub):
+    client = OpenAI(api_key="stub", base_url=stub.url, max_retries=0)
+    return lambda m, t: chat_call(m, t, client=client, chain=["gpt-4o"], health=ModelHealth())
+
+
+def test_repeat_is_served_from_the_cache(stub, call, tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    first = cached_call(call, ASK, 0.3, cache)
+    again = cached_call(call, ASK, 0.3, cache)
+    assert not first[2] and again[2]
+    assert again[:2] == first[:2]
+    assert stub.requests["gpt-4o"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_reopened_cache_still_answers(call, tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    model, text, _ = cached_call(call, ASK, 0.3, ResponseCache(path))
+    assert ResponseCache(path).get(prompt_key(ASK, 0.3)) == (model, text)
+
+
+def test_key_ignores_whitespace_case_and_model_tags():
+    variant = SYSTEM + [{"role": "user", "content": "  how do we cut washout TIME at plant 0? "}]
+    assert prompt_key(variant, 0.3) == prompt_key(ASK, 0.3)
+    tagged = ASK + [{"role": "assistant", "content": "_model: gpt-4o_\n\nStage the washout."}]
+    untagged = ASK + [{"role": "assistant", "content": "Stage the washout."}]
+    assert prompt_key(tagged) == prompt_key(untagged)
+
+
+def test_key_changes_with_the_snapshot_and_temperature():
+    other = [SYSTEM[0], {"role": "system", "content": "DATA SNAPSHOT (today)\n- Loads today: 413"}, ASK[-1]]
+    assert prompt_key(other, 0.3) != prompt_key(ASK, 0.3)
+    assert prompt_key(ASK, 0.2) != prompt_key(ASK, 0.3)
+
+
+def test_entries_expire_after_ttl():
+    now = [0.0]
+    cache = ResponseCache(":memory:", ttl_s=60, max_bytes=10_000, clock=lambda: now[0])
+    cache.put("k", "gpt-4o", "reply")
+    now[0] = 59
+    assert cache.get("k") == ("gpt-4o", "reply")
+    now[0] = 61
+    assert cache.get("k") is None
+
+
+def test_size_bound_evicts_least_recently_used():
+    now = [0.0]
+    cache = ResponseCache(":memory:", ttl_s=3600, max_bytes=200, clock=lambda: now[0])
+    for i in range(4):  # 4 × 50 bytes: exactly the budget
+        cache.put(f"k{i}", "gpt-4o", "x" * 50)
+        now[0] += 1
+    cache.get("k0")
+    now[0] += 1
+    cache.put("k4", "gpt-4o", "x" * 50)
+    stats = cache.stats()
+    assert stats["entries"] == 4 and stats["bytes"] <= 200 and stats["evictions"] == 1
+    assert cache.get("k1") is None
+    assert all(cache.get(k) is not None for k in ("k0", "k2", "k3", "k4"))
+
+
+def test_empty_replies_are_not_cached(stub, call):
+    stub.set("gpt-4o", reply="")
+    cache = ResponseCache(":memory:")
+    cached_call(call, ASK, 0.3, cache)
+    assert cache.stats()["entries"] == 0
+
+
+def test_unused_cache_opens_no_database(tmp_path):
+    cache = ResponseCache(str(tmp_path / "never" / "responses.sqlite"))
+    assert cache.stats()["entries"] == 0
+    assert not (tmp_path / "never").exists()
@@ -0,0 +1,148 @@
+# ticket_archive.py – date-partitioned Arrow IPC ticket files, memory-mapped on read
+import os
+import shutil
+
+import pandas as pd
+
+from schema import compact
+from topn import TopN
+
+_PART = "part-{:05d}.arrow"
+
+
+def _pa():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+    except ImportError as e:  # optional dependency
+        raise ImportError("TicketArchive needs pyarrow: pip install pyarrow") from e
+    return pa
+
+
+class TicketArchive:
+    """
+    Tickets on disk as `<root>/date=YYYY-MM-DD/part-NNNNN.arrow` (Arrow IPC
+    file format, uncompressed, schema dtypes).
+
+    Reads prune partitions by date before opening anything and memory-map
+    the files they need, so a week's read costs a week of files regardless
+    of how much history sits next to it.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    # -------------------------
+    # Layout
+    # -------------------------
+    def _dir(self, day: pd.Timestamp) -> str:
+        return os.path.join(self.root, f"date={day:%Y-%m-%d}")
+
+    def dates(self) -> list[pd.Timestamp]:
+        """Partitions present, ascending."""
+        if not os.path.isdir(self.root):
+            return []
+        out = []
+        for name in os.listdir(self.root):
+            if name.startswith("date="):
+                out.append(pd.Timestamp(name[5:]))
+        return sorted(out)
+
+    def last_day(self) -> pd.Timestamp | None:
+        days = self.dates()
+        return days[-1] if days else None
+
+    # -------------------------
+    # Write
+    # -------------------------
+    def write(self, df: pd.DataFrame, overwrite: bool = False) -> int:
+        """
+        Append `df` as one new part file per service date it touches
+        (`overwrite=True` replaces those dates instead). Returns files written.
+        """
+        pa = _pa()
+        df = compact(df)
+        if "date" not in df:
+            df = df.assign(date=pd.to_datetime(df["start_time"]).dt.normalize())
+        written = 0
+        for day, part in df.groupby("date", sort=True):
+            folder = self._dir(pd.Timestamp(day))
+            if overwrite and os.path.isdir(folder):
+                shutil.rmtree(folder)
+            os.makedirs(folder, exist_ok=True)
+            n = sum(1 for f in os.listdir(folder) if f.endswith(".arrow"))
+            table = pa.Table.from_pandas(part.sort_values("start_time", kind="stable"), preserve_index=False)
+            with pa.OSFile(os.path.join(folder, _PART.format(n)), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            written += 1
+        return written
+
+    def write_chunks(self, chunks) -> int:
+        """Append an iterable of ticket frames (e.g. `dummy_data_gen.iter_ticket_chunks`)."""
+        return sum(self.write(chunk) for chunk in chunks)
+
+    # -------------------------
+    # Read
+    # -------------------------
+    def files(self, start=None, end=None) -> list[str]:
+        """Part files of service dates in `[start, end]` (dates, inclusive)."""
+        lo = None if start is None else pd.Timestamp(start).normalize()
+        hi = None if end is None else pd.Timestamp(end).normalize()
+        out = []
+        for day in self.dates():
+            if (lo is not None and day < lo) or (hi is not None and day > hi):
+                continue
+            folder = self._dir(day)
+            out.extend(os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.endswith(".arrow"))
+        return out
+
+    def read_table(self, start=None, end=None, columns: list[str] | None = None):
+        """Memory-mapped `pyarrow.Table` of the selected dates / columns."""
+        pa = _pa()
+        tables = []
+        for path in self.files(start, end):
+            reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+            table = reader.read_all()
+            tables.append(table.select(columns) if columns is not None else table)
+        if not tables:
+            return None
+        return pa.concat_tables(tables).unify_dictionaries()
+
+    def iter_frames(self, start=None, end=None, columns: list[str] | None = None):
+        """`read` one partition file at a time (out-of-core scans: `topn.TopN`, aggregate_chunks)."""
+        pa = _pa()
+        for path in self.files(start, end):
+            table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+            yield compact((table.select(columns) if columns is not None else table).to_pandas(split_blocks=True))
+
+    def top(self, order: str, n: int, cols: list[str], start=None, end=None, ascending: bool = False) -> pd.DataFrame:
+        """
+        Top `n` tickets by `order` over dates `start..end`: one pass over the
+        partitions, `n` rows held in memory. Only the `order` column is read
+        for a partition unless some of its rows make the cut.
+        """
+        pa = _pa()
+        acc = TopN(order, n, ascending=ascending, cols=cols)
+        need = list(dict.fromkeys([*cols, order]))
+        for path in self.files(start, end):
+            table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+            pos = acc.candidates(table.column(order).to_numpy(zero_copy_only=False))
+            if len(pos):
+                acc.push(compact(table.select(need).take(pos).to_pandas()))
+        return acc.result()
+
+    def read(self, start=None, end=None, columns: list[str] | None = None) -> pd.DataFrame:
+        """Tickets of service dates `start..end` (inclusive) as a schema-typed frame."""
+        table = self.read_table(start, end, columns)
+        if table is None:
+            return pd.DataFrame(columns=columns or [])
+        # split_blocks lets numeric columns without nulls stay zero-copy views of the map
+        return compact(table.to_pandas(split_blocks=True))
+
+    def read_days(self, days_back: int, columns: list[str] | None = None, now=None) -> pd.DataFrame:
+        """The last `days_back` service dates up to `now` (default: the newest partition)."""
+        last = pd.Timestamp(now).normalize() if now is not None else self.last_day()
+        if last is None:
+            return pd.DataFrame(columns=columns or [])
+        return self.read(last - pd.Timedelta(days=days_back - 1), last, columns)
@@ -0,0 +1,248 @@
+# ticket_db.py – embedded SQLite ticket store; windows push filters, top-N and roll-ups into SQL
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from rollup import CUBE_MEASURES
+from schema import SCHEMA, compact, widen
+
+INDEXED = ["start_time", "driver", "origin_plant", "job_site"]
+# timestamps are stored as integer microseconds since the epoch
+_TIMES = [c for c, (dtype, _) in SCHEMA.items() if dtype.startswith("datetime64")]
+_DAY = pd.Timedelta(days=1)
+_US = np.dtype("datetime64[us]")
+
+
+def _to_sql(df: pd.DataFrame) -> pd.DataFrame:
+    df = compact(df)
+    if "date" not in df:
+        df = df.assign(date=df["start_time"].dt.normalize())
+    if "hour" not in df:
+        df = df.assign(hour=df["start_time"].dt.hour.astype("int8"))
+    out = {}
+    for c in df.columns:
+        s = df[c]
+        if c in _TIMES:
+            us = s.to_numpy(dtype=_US).view("int64")
+            out[c] = pd.Series(us, index=df.index).where(s.notna().to_numpy())
+        elif isinstance(s.dtype, pd.CategoricalDtype):
+            out[c] = s.astype(object)
+        else:
+            out[c] = widen(s)  # float32 -> recorded decimals, so SQL sums match pandas
+    return pd.DataFrame(out, index=df.index)
+
+
+def _from_sql(df: pd.DataFrame) -> pd.DataFrame:
+    extra = {c: pd.to_datetime(df[c], unit="us") for c in df.columns if c in _TIMES}
+    if "hour" in df:
+        extra["hour"] = df["hour"].astype("int8")  # as TicketStore derives it
+    return compact(df.assign(**extra) if extra else df)
+
+
+def _us(ts) -> int:
+    return pd.Timestamp(ts).value // 1000
+
+
+class TicketDB:
+    """
+    Tickets in one SQLite table with indexes on `INDEXED`.
+
+    `window()` returns a `DbWindow` that answers roll-ups, filters and top-N
+    queries in SQL, so only result rows reach pandas however much history
+    the file holds.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()  # re-entered: `write` reads `columns` under it
+        self._columns: list[str] | None = None
+        self._version = None
+
+    # -------------------------
+    # Write
+    # -------------------------
+    @property
+    def columns(self) -> list[str]:
+        with self._lock:
+            if self._columns is None:
+                self._columns = [r[1] for r in self.conn.execute("PRAGMA table_info(tickets)")]
+            return self._columns
+
+    def write(self, df: pd.DataFrame) -> int:
+        """Append tickets (schema dtypes or raw); returns rows written."""
+        rows = _to_sql(df).sort_values("start_time", kind="stable")
+        with self._lock, self.conn:
+            if not self.columns:
+                rows.iloc[0:0].to_sql("tickets", self.conn, index=False)
+                for c in INDEXED:
+                    if c in rows:
+                        self.conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{c} ON tickets ("{c}")')
+                self._columns = None
+            new = [c for c in rows.columns if c not in self.columns]
+            for c in new:
+                self.conn.execute(f'ALTER TABLE tickets ADD COLUMN "{c}"')
+            self._columns = None
+            rows.to_sql("tickets", self.conn, index=False, if_exists="append", chunksize=50_000)
+            self._version = None
+        return len(rows)
+
+    # -------------------------
+    # Read
+    # -------------------------
+    def query(self, sql: str, params=()) -> pd.DataFrame:
+        with self._lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    @property
+    def version(self) -> str:
+        """Content token; changes with every write."""
+        with self._lock:
+            if self._version is None:
+                if not self.columns:
+                    return "empty"
+                n, last, t = self.conn.execute("SELECT COUNT(*), MAX(rowid), TOTAL(start_time) FROM tickets").fetchone()
+                self._version = hashlib.sha1(f"{self.path}|{n}|{last}|{t!r}".encode()).hexdigest()[:12]
+            return self._version
+
+    def _day(self, agg: str) -> pd.Timestamp | None:
+        with self._lock:
+            if not self.columns:
+                return None
+            (value,) = self.conn.execute(f"SELECT {agg}(start_time) FROM tickets").fetchone()
+        return None if value is None else pd.to_datetime(value, unit="us").normalize()
+
+    def first_day(self) -> pd.Timestamp | None:
+        return self._day("MIN")
+
+    def last_day(self) -> pd.Timestamp | None:
+        return self._day("MAX")
+
+    def window(self, *, day=None, since=None, end=None) -> "DbWindow":
+        """A service `day`, or `since <= start_time < end` (either bound optional)."""
+        if day is not None:
+            d = pd.Timestamp(day).normalize()
+            return DbWindow(self, d, d + _DAY, ("day", d))
+        since = None if since is None else pd.Timestamp(since)
+        end = None if end is None else pd.Timestamp(end)
+        return DbWindow(self, since, end, ("since", since, end) if since is not None or end is not None else ("all",))
+
+    def read_days(self, days_back: int, now=None) -> pd.DataFrame:
+        """The last `days_back` service dates up to `now` (default: the newest day) as a frame."""
+        last = pd.Timestamp(now).normalize() if now is not None else self.last_day()
+        if last is None:
+            return pd.DataFrame()
+        return self.window(since=last - pd.Timedelta(days=days_back - 1), end=last + _DAY).frame
+
+
+def db_window(db: TicketDB, period: str, now) -> "DbWindow":
+    """`rollup.kpis_window` for a `TicketDB`: today / yesterday / week / 48h."""
+    if period == "today":
+        return db.window(day=now)
+    if period == "yesterday":
+        return db.window(day=pd.Timestamp(now).normalize() - _DAY)
+    if period == "week":
+        return db.window(since=pd.Timestamp(now) - pd.Timedelta(days=7))
+    if period == "48h":
+        return db.window(since=pd.Timestamp(now) - pd.Timedelta(hours=48))
+    raise ValueError(f"unknown period: {period}")
+
+
+class DbWindow:
+    """
+    One time window of a `TicketDB`. Drop-in for a `CubeWindow` in the tools:
+    `rollup` / `select` run in SQL; `frame` materializes the raw rows.
+    """
+
+    def __init__(self, db: TicketDB, start: pd.Timestamp | None, end: pd.Timestamp | None, span: tuple):
+        self.db = db
+        self.start, self.end = start, end
+        self.key = (db.version, *span)
+        self._frame = None
+
+    def _from(self, extra: str = "") -> tuple[str, list]:
+        """` FROM tickets WHERE <window> [AND extra]` and its params."""
+        terms, params = [], []
+        if self.start is not None:
+            terms.append("start_time >= ?")
+            params.append(_us(self.start))
+        if self.end is not None:
+            terms.append("start_time < ?")
+            params.append(_us(self.end))
+        # the planner would rather walk a dimension index for GROUP BY order;
+        # a window is a small slice of history, so always range-scan start_time
+        source = " FROM tickets INDEXED BY ix_start_time" if terms else " FROM tickets"
+        if extra:
+            terms.append(extra)
+        return source + ((" WHERE " + " AND ".join(terms)) if terms else ""), params
+
+    @property
+    def empty(self) -> bool:
+        if not self.db.columns:
+            return True
+        where, params = self._from()
+        with self.db._lock:
+            (found,) = self.db.conn.execute(f"SELECT EXISTS(SELECT 1{where})", params).fetchone()
+        return not found
+
+    def __contains__(self, col: str) -> bool:
+        return col in self.db.columns
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """All rows of the window, in start_time order (loaded once)."""
+        if self._frame is None:
+            where, params = self._from()
+            self._frame = _from_sql(self.db.query(f"SELECT *{where} ORDER BY start_time, rowid", params))
+        return self._frame
+
+    def select(self, columns: list[str], *, where: str = "", params=(), order: str | None = None,
+               ascending: bool = False, limit: int | None = None) -> pd.DataFrame:
+        """
+        `columns` of rows matching `where` (SQL over column names, `?` params),
+        sorted by `order` with ties in start_time order, at most `limit` rows.
+        """
+        cond, args = self._from(where)
+        cols = ", ".join(f'"{c}"' for c in columns)
+        sql = f"SELECT {cols}{cond}"
+        if order is not None:
+            sql += f' ORDER BY "{order}" {"ASC" if ascending else "DESC"}, start_time, rowid'
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return _from_sql(self.db.query(sql, [*args, *params]))
+
+    def rollup(self, by: list[str] | str) -> pd.DataFrame:
+        """`rollup.aggregate` of the window's rows, grouped in SQL."""
+        by = [by] if isinstance(by, str) else list(by)
+        present = self.db.columns
+        by = [b for b in by if b in present]
+        exprs = {m: f'"{m}"' for m in CUBE_MEASURES if m in present}
+        if {"fuel_used_L", "distance_km"}.issubset(present):
+            exprs["l_per_km"] = '"fuel_used_L" * 1.0 / "distance_km"'
+        if {"load_volume_m3", "cycle_time"}.issubset(present):
+            exprs["m3_per_hr"] = '"load_volume_m3" / ("cycle_time" / 60.0)'
+        exprs.update({c: f'"{c}"' for c in present if c.startswith("dur_")})
+        keys = ", ".join(f'"{b}"' for b in by)
+        parts = ["COUNT(*) AS loads"]
+        parts += [f'TOTAL({e}) AS "{m}"' for m, e in exprs.items()]
+        parts += [f'COUNT({e}) AS "{m}_n"' for m, e in exprs.items()]
+        where, params = self._from(" AND ".join(f'"{b}" IS NOT NULL' for b in by))
+        sql = f"SELECT {', '.join(([keys] if by else []) + parts)}{where}"
+        if by:
+            sql += f" GROUP BY {keys} ORDER BY {keys}"
+        out = self.db.query(sql, params) if present else pd.DataFrame(columns=[*by, "loads"])
+        out = out.astype({c: np.int32 for c in out.columns if c == "loads" or c.endswith("_n")})
+        ints = [m for m in exprs if m in SCHEMA and SCHEMA[m][0].startswith("int") or m.startswith("dur_")]
+        # integer sums as pandas returns them; fractional minutes (see `schema._convert`) stay float
+        out = out.astype({m: np.int64 for m in ints if m in out and (out[m] % 1 == 0).all()})
+        if not by:
+            if out.empty:
+                out = pd.DataFrame([{"loads": 0, **{m: 0.0 for m in exprs}, **{f"{m}_n": 0 for m in exprs}}])
+            return out.reset_index(drop=True)
+        for b in by:
+            if b in _TIMES:
+                out[b] = pd.to_datetime(out[b], unit="us")
+        return out.set_index(by)
@@ -0,0 +1,98 @@
+# ticket_store.py – tickets sorted by start_time with a per-service-date partition index
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from schema import compact
+
+_DAY = pd.Timedelta(days=1)
+
+
+class TicketStore:
+    """
+    Immutable ticket frame sorted by `start_time`, partitioned by service date.
+
+    Window slices are two binary searches (`since`, `between`) or one
+    partition lookup (`day`) followed by a positional slice, so the cost
+    does not grow with history length.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        df = compact(df)
+        start = pd.to_datetime(df["start_time"])
+        ns = start.to_numpy(dtype="datetime64[ns]").view("int64")
+        if not (np.diff(ns) >= 0).all():
+            order = np.argsort(ns, kind="stable")
+            df, start, ns = df.iloc[order], start.iloc[order], ns[order]
+        df = df.reset_index(drop=True)
+        start = start.reset_index(drop=True)
+
+        extra = {}
+        if "date" not in df or not pd.api.types.is_datetime64_any_dtype(df["date"]):
+            extra["date"] = start.dt.normalize()
+        if "hour" not in df:
+            extra["hour"] = start.dt.hour.astype("int8")
+        if extra:
+            df = df.assign(**extra)
+
+        day_ns = df["date"].to_numpy(dtype="datetime64[ns]").view("int64")
+        first = np.flatnonzero(np.r_[True, day_ns[1:] != day_ns[:-1]]) if len(df) else np.array([], dtype=int)
+        self.frame = df
+        self._ns = ns
+        self._day_keys = day_ns[first]
+        self._day_offsets = np.r_[first, len(df)]
+        self._version = None
+        # slices inherit attrs, which lets caches tell which data a frame came from
+        df.attrs["data_version"] = self.version
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @property
+    def days(self) -> pd.DatetimeIndex:
+        """Service dates present, ascending."""
+        return pd.to_datetime(self._day_keys)
+
+    def day(self, date) -> pd.DataFrame:
+        """All tickets of one service date (partition lookup)."""
+        key = pd.Timestamp(date).normalize().value
+        i = np.searchsorted(self._day_keys, key)
+        if i == len(self._day_keys) or self._day_keys[i] != key:
+            return self.frame.iloc[0:0]
+        return self.frame.iloc[self._day_offsets[i]:self._day_offsets[i + 1]]
+
+    def bounds(self, start=None, end=None) -> tuple[int, int]:
+        """Row positions `lo:hi` of the tickets with `start <= start_time < end`."""
+        lo = 0 if start is None else int(np.searchsorted(self._ns, pd.Timestamp(start).value, side="left"))
+        hi = len(self._ns) if end is None else int(np.searchsorted(self._ns, pd.Timestamp(end).value, side="left"))
+        return lo, max(lo, hi)
+
+    def between(self, start=None, end=None) -> pd.DataFrame:
+        """Tickets with `start <= start_time < end` (either bound optional)."""
+        lo, hi = self.bounds(start, end)
+        return self.frame.iloc[lo:hi]
+
+    def since(self, start) -> pd.DataFrame:
+        return self.between(start, None)
+
+    def days_between(self, first, last) -> pd.DataFrame:
+        """Whole service dates `first..last` inclusive."""
+        return self.between(pd.Timestamp(first).normalize(), pd.Timestamp(last).normalize() + _DAY)
+
+    @property
+    def version(self) -> str:
+        """Content token: changes whenever rows or any numeric/time value changes."""
+        if self._version is None:
+            f = self.frame
+            parts = [str(len(f)), ",".join(f.columns)]
+            num = f.select_dtypes(include=["number", "bool"])
+            parts.append(np.array2string(num.sum(numeric_only=True).to_numpy(dtype=float), precision=17))
+            for c in f.select_dtypes(include=["datetime"]).columns:
+                ns = f[c].to_numpy(dtype="datetime64[ns]").view("int64")
+                parts.append(str(int(ns.sum(dtype=np.uint64))))
+            self._version = hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+        return self._version
+
+    def last_day(self) -> pd.Timestamp | None:
+        return pd.Timestamp(self._day_keys[-1]) if len(self._day_keys) else None
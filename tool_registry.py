@@ -0,0 +1,172 @@
+# tool_registry.py – exposes tools.py to the chat model (JSON schemas, parallel tool calls)
+import inspect
+import json
+import os
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import tools
+from model_utils import chat_completion
+from rollup import kpis_window
+
+# data arguments filled in from the kpis dict; the model only sees the rest
+SOURCES = {
+    "kpis": lambda k: k,
+    "df": lambda k: k["store"],
+    "df_today": lambda k: kpis_window(k, "today"),
+    "df_week": lambda k: kpis_window(k, "week"),
+    "df_48h": lambda k: kpis_window(k, "48h"),
+}
+
+DESCRIPTIONS = {
+    "compute_volume": "Delivered concrete volume (m³) today or yesterday.",
+    "compare_utilization": "Today's fleet utilization % against a benchmark.",
+    "wait_by_hour": "Average wait minutes per hour of today.",
+    "fuel_cost_today": "Fuel litres used today and their cost.",
+    "co2_from_fuel_today": "CO₂ (kg) from today's fuel use.",
+    "driver_efficiency_today": "Top drivers today by m³ per cycle hour.",
+    "driver_scorecard_period": "Driver ranking over the last N days by a scorecard metric "
+                               "(loads, m3, cycle_hr, m3_per_hr, avg_wait_min, water_L, l_per_km).",
+    "top_wait_jobs_48h": "Loads with the longest waits in the last 48 hours.",
+    "top_water_added_week": "Drivers adding the most water this week.",
+    "driver_shortest_wait_week": "Drivers with the shortest average wait this week.",
+    "cycle_by_plant": "Average cycle minutes per plant, today or this week.",
+    "rank_plants_by_cycle": "Plants ranked by average cycle minutes this week.",
+    "projects_exceed_target_m3_per_load": "Projects averaging more than a target m³ per load this week.",
+    "distance_over_km": "Loads this week driven farther than a distance (km).",
+    "success_rate_within_eta": "Share of today's arrivals within a tolerance of their ETA.",
+    "wait_compare_today_vs_7day": "Today's average wait against the 7-day average.",
+    "fuel_l_per_km_exceed_days": "Days this week with fuel L/km above a threshold.",
+    "jobs_cycle_time_over": "Loads this week with a cycle longer than N minutes.",
+    "signal_out_of_band": "Drum RPM / hydraulic pressure time outside the normal band, and the worst loads.",
+    "quick_wins_to_utilization": "Hotspots and suggestions to lift utilization to a target %.",
+}
+
+MAX_ITEMS = 20          # list entries per tool result sent back to the model
+MAX_ROUNDS = 3          # model <-> tools round trips per question
+TOOL_WORKERS = int(os.getenv("COACH_TOOL_WORKERS", "4"))
+
+_JSON_TYPES = {float: "number", int: "integer", str: "string", bool: "boolean"}
+
+
+def _schema(annotation, default) -> dict:
+    if typing.get_origin(annotation) is typing.Literal:
+        values = list(typing.get_args(annotation))
+        return {"type": _JSON_TYPES.get(type(values[0]), "string"), "enum": values, "default": default}
+    return {"type": _JSON_TYPES.get(annotation, "string"), "default": default}
+
+
+def _register() -> dict[str, dict]:
+    registry = {}
+    for name, description in DESCRIPTIONS.items():
+        fn = getattr(tools, name)
+        params = inspect.signature(fn).parameters
+        sources = [p for p in params if p in SOURCES]
+        props = {p.name: _schema(p.annotation, p.default) for p in params.values() if p.name not in SOURCES}
+        registry[name] = {
+            "fn": fn,
+            "sources": sources,
+            "schema": {"type": "function", "function": {
+                "name": name, "description": description,
+                "parameters": {"type": "object", "properties": props, "additionalProperties": False},
+            }},
+        }
+    return registry
+
+
+REGISTRY = _register()
+_POOL: ThreadPoolExecutor | None = None
+
+
+def tool_schemas(names: list[str] | None = None) -> list[dict]:
+    """OpenAI `tools=` entries for `names` (default: every registered tool)."""
+    return [REGISTRY[n]["schema"] for n in (names or REGISTRY)]
+
+
+def compact(value, max_items: int = MAX_ITEMS):
+    """Floats to 2 decimals, lists cut to `max_items` (with a count of what was left out)."""
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, dict):
+        return {k: compact(v, max_items) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        out = [compact(v, max_items) for v in value[:max_items]]
+        if len(value) > max_items:
+            out.append({"more": len(value) - max_items})
+        return out
+    return value
+
+
+def serialize(result: dict) -> str:
+    return json.dumps(compact(result), separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _prepare(kpis: dict) -> None:
+    """Build the lazily computed shared state once, before threads read it."""
+    if kpis.get("cube") is not None:
+        kpis["cube"].build()
+    if kpis.get("samples") is not None:
+        kpis["samples"].trucks
+
+
+def run_tool(name: str, arguments: str | dict, kpis: dict) -> dict:
+    """Call one registered tool with the model's (JSON) arguments; errors come back as `ok: False`."""
+    spec = REGISTRY.get(name)
+    if spec is None:
+        return {"ok": False, "error": f"unknown tool: {name}"}
+    try:
+        args = json.loads(arguments or "{}") if isinstance(arguments, str) else dict(arguments)
+        unknown = set(args) - set(spec["schema"]["function"]["parameters"]["properties"])
+        if unknown:
+            return {"ok": False, "error": f"unknown arguments: {sorted(unknown)}"}
+        data = {s: SOURCES[s](kpis) for s in spec["sources"]}
+        return spec["fn"](**data, **args)
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+def run_tool_calls(calls: list[dict], kpis: dict, parallel: bool = True) -> list[dict]:
+    """
+    Run the model's tool calls (`id`, `name`, `arguments`) concurrently on a
+    shared thread pool; the frames behind `kpis` are only read. Returns one
+    `role: tool` message per call, in call order.
+    """
+    global _POOL
+    _prepare(kpis)
+
+    def one(call):
+        t0 = time.perf_counter()
+        result = run_tool(call["name"], call["arguments"], kpis)
+        call["seconds"] = time.perf_counter() - t0
+        return {"role": "tool", "tool_call_id": call["id"], "content": serialize(result)}
+
+    if not parallel or len(calls) < 2:
+        return [one(c) for c in calls]
+    if _POOL is None:
+        _POOL = ThreadPoolExecutor(TOOL_WORKERS, thread_name_prefix="coach-tool")
+    return list(_POOL.map(one, calls))
+
+
+def chat_with_tools(messages: list[dict], kpis: dict, temperature: float = 0.2, *, names: list[str] | None = None,
+                    max_rounds: int = MAX_ROUNDS, parallel: bool = True, trace: list | None = None, **chat_kw):
+    """
+    `chat_call` with the registered tools offered to the model: tool calls
+    it asks for are run (`run_tool_calls`) and fed back until it answers.
+    Returns (model_used, text); `trace` receives the calls made.
+    """
+    messages = list(messages)
+    schemas = tool_schemas(names)
+    for round_ in range(max_rounds + 1):
+        model, message = chat_completion(messages, temperature, tools=schemas if round_ < max_rounds else None,
+                                         **chat_kw)
+        if not getattr(message, "tool_calls", None):
+            return model, (message.content or "").strip()
+        calls = [{"id": c.id, "name": c.function.name, "arguments": c.function.arguments} for c in message.tool_calls]
+        messages.append({"role": "assistant", "content": message.content or "", "tool_calls": [
+            {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+            for c in calls]})
+        messages.extend(run_tool_calls(calls, kpis, parallel))
+        if trace is not None:
+            trace.extend(calls)
+    return model, (message.content or "").strip()
@@ -3,116 +3,179 @@ from typing import Literal, Dict, Any, List
 import pandas as pd
 import numpy as np
 
-def _ensure_date(df: pd.DataFrame) -> pd.DataFrame:
-    if "date" not in df.columns:
-        df = df.copy()
-        df["date"] = pd.to_datetime(df["start_time"]).dt.date
-    return df
+from answer_cache import cached
+from intermediates import dated, hourly_wait, plant_cycle, scorecard, signal_summary, window_rollup
+from rollup import CubeWindow, kpis_window, mean, total
+from schema import for_display
+from scorecard import DriverScorecard
+from telemetry import BANDS, out_of_band
+import topn
+from ticket_db import DbWindow
+from ticket_store import TicketStore
+
+Frame = pd.DataFrame | CubeWindow | DbWindow
+
+def _rows(df: Frame) -> pd.DataFrame:
+    """Raw ticket rows (windows carry or load the matching slice)."""
+    return df if isinstance(df, pd.DataFrame) else df.frame
+
+def _top(df: Frame, cols: List[str], order: str, n: int, over: tuple[str, float] | None = None) -> pd.DataFrame:
+    """`n` rows with the largest `order` (ties in start_time order), optionally only where `over[0] > over[1]`.
+    SQL windows run the filter, sort and limit in the database."""
+    if isinstance(df, DbWindow):
+        where, params = (f'"{over[0]}" > ?', (over[1],)) if over else ("", ())
+        return df.select(cols, where=where, params=params, order=order, limit=n)
+    rows = _rows(df)
+    if over:
+        rows = rows[rows[over[0]] > over[1]]
+    return topn.top_n(rows, order, n, cols=cols)
+
+def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return for_display(df).to_dict("records")
 
 # ----------------- Core basics -----------------
 
-def compute_volume(df: pd.DataFrame, period: Literal["today", "yesterday"] = "today") -> Dict[str, Any]:
-    df = _ensure_date(df)
-    max_date = df["date"].max()
-    target_date = max_date if period == "today" else (pd.to_datetime(max_date) - pd.Timedelta(days=1)).date()
-    mask = df["date"] == target_date
-    m3 = float(df.loc[mask, "load_volume_m3"].sum())
-    return {"ok": True, "period": period, "date": str(target_date), "m3": m3}
+@cached()
+def compute_volume(df: pd.DataFrame | TicketStore, period: Literal["today", "yesterday"] = "today") -> Dict[str, Any]:
+    max_date = df.last_day() if isinstance(df, TicketStore) else (dated(df)["date"].max() if not df.empty else None)
+    if max_date is None or pd.isna(max_date):
+        return {"ok": True, "period": period, "date": None, "m3": 0.0}
+    target_date = max_date - pd.Timedelta(days=0 if period == "today" else 1)
+    if isinstance(df, TicketStore):  # partition lookup
+        rows = df.day(target_date)
+    else:
+        d = dated(df)
+        rows = d[d["date"] == target_date]
+    m3 = total(rows, "load_volume_m3") if not rows.empty else 0.0
+    return {"ok": True, "period": period, "date": f"{target_date:%Y-%m-%d}", "m3": m3}
 
+@cached()
 def compare_utilization(kpis: dict, benchmark: float = 85.0) -> Dict[str, float]:
     actual = float(kpis.get("utilization_pct") or 0.0)
     return {"ok": True, "actual_pct": actual, "benchmark_pct": float(benchmark), "delta_pct": actual - float(benchmark)}
 
-def wait_by_hour(df_today: pd.DataFrame) -> Dict[str, Any]:
+@cached()
+def wait_by_hour(df_today: Frame) -> Dict[str, Any]:
     if df_today.empty:
         return {"ok": True, "series": []}
-    g = df_today.groupby(df_today["start_time"].dt.hour)["dur_waiting"].mean().round(1)
+    g = hourly_wait(df_today).round(1)
     return {"ok": True, "series": [{"hour": int(h), "avg_wait_min": float(v)} for h, v in g.items()]}
 
 # --------------- Cost/CO₂ ----------------------
 
-def fuel_cost_today(df_today: pd.DataFrame, price_per_L: float = 1.8) -> Dict[str, Any]:
-    total_fuel = float(df_today["fuel_used_L"].sum() if not df_today.empty else 0.0)
+@cached()
+def fuel_cost_today(df_today: Frame, price_per_L: float = 1.8) -> Dict[str, Any]:
+    total_fuel = total(df_today, "fuel_used_L") if not df_today.empty else 0.0
     return {"ok": True, "fuel_L": total_fuel, "price_per_L": price_per_L, "cost": total_fuel * price_per_L}
 
-def co2_from_fuel_today(df_today: pd.DataFrame, kg_per_L: float = 2.68) -> Dict[str, Any]:
-    total_fuel = float(df_today["fuel_used_L"].sum() if not df_today.empty else 0.0)
+@cached()
+def co2_from_fuel_today(df_today: Frame, kg_per_L: float = 2.68) -> Dict[str, Any]:
+    total_fuel = total(df_today, "fuel_used_L") if not df_today.empty else 0.0
     return {"ok": True, "fuel_L": total_fuel, "kg_per_L": kg_per_L, "co2_kg": total_fuel * kg_per_L}
 
 # -------------- Drivers / Jobs -----------------
 
-def driver_efficiency_today(df_today: pd.DataFrame, top_n: int = 3) -> Dict[str, Any]:
+@cached()
+def driver_efficiency_today(df_today: Frame, top_n: int = 3) -> Dict[str, Any]:
     if df_today.empty:
         return {"ok": True, "ranking": []}
-    # m3 per hour (average per driver across their loads)
-    df = df_today.copy()
-    df["m3_per_hr"] = df["load_volume_m3"] / (df["cycle_time"] / 60.0)
+    # m3 per cycle hour (scorecard definition: total m3 / total cycle hours)
     ranking = (
-        df.groupby("driver")["m3_per_hr"]
-        .mean().sort_values(ascending=False).round(2)
+        scorecard(df_today)["m3_per_hr"]
+        .sort_values(ascending=False).round(2)
         .head(top_n)
         .reset_index().to_dict("records")
     )
     return {"ok": True, "metric": "m3_per_hr", "ranking": ranking}
 
-def top_wait_jobs_48h(df_48h: pd.DataFrame, n: int = 3) -> Dict[str, Any]:
+@cached()
+def driver_scorecard_period(kpis: dict, days: int = 7, metric: str = "m3_per_hr", top_n: int = 5) -> Dict[str, Any]:
+    start = pd.Timestamp(kpis["now"]) - pd.Timedelta(days=days)
+    if kpis.get("db") is not None:  # whole history in SQL
+        tbl = scorecard(kpis["db"].window(since=start))
+        first = kpis["db"].first_day()
+    else:
+        tbl = DriverScorecard.for_cube(kpis["cube"]).window(start=start)
+        loaded = kpis["cube"].store.days
+        first = loaded[0] if len(loaded) else None
+    if metric not in tbl:
+        return {"ok": False, "error": f"unknown metric: {metric}"}
+    cols = ["loads", "m3", "cycle_hr", "m3_per_hr", "avg_wait_min", "water_L", "l_per_km"]
+    top = tbl.sort_values(metric, ascending=metric in ("avg_wait_min", "l_per_km")).head(top_n)
+    rows = top[cols].round(2).reset_index().to_dict("records")
+    out = {"ok": True, "days": days, "metric": metric, "ranking": rows}
+    if first is not None and first > start:  # history starts inside the requested period
+        out["data_from"] = f"{first:%Y-%m-%d}"
+        out["note"] = f"only {(pd.Timestamp(kpis['now']) - first).days + 1} of the {days} days requested have data"
+    return out
+
+@cached()
+def top_wait_jobs_48h(df_48h: Frame, n: int = 3) -> Dict[str, Any]:
     if df_48h.empty:
         return {"ok": True, "items": []}
     cols = ["ticket_id", "job_site", "driver", "dur_waiting", "start_time"]
-    out = df_48h.sort_values("dur_waiting", ascending=False).head(n)[cols]
-    items = out.assign(dur_waiting=lambda x: x["dur_waiting"].round(1)).to_dict("records")
+    out = _top(df_48h, cols, "dur_waiting", n)
+    items = _records(out.assign(dur_waiting=lambda x: x["dur_waiting"].round(1)))
     return {"ok": True, "items": items}
 
-def top_water_added_week(df_week: pd.DataFrame, n: int = 3) -> Dict[str, Any]:
+@cached()
+def top_water_added_week(df_week: Frame, n: int = 3) -> Dict[str, Any]:
     if df_week.empty:
         return {"ok": True, "ranking": []}
-    s = df_week.groupby("driver")["water_added_L"].sum().sort_values(ascending=False).head(n)
+    s = scorecard(df_week)["water_L"].sort_values(ascending=False).head(n)
     ranking = [{"driver": idx, "water_added_L": float(val)} for idx, val in s.items()]
     return {"ok": True, "ranking": ranking}
 
-def driver_shortest_wait_week(df_week: pd.DataFrame, top_n: int = 1) -> Dict[str, Any]:
+@cached()
+def driver_shortest_wait_week(df_week: Frame, top_n: int = 1) -> Dict[str, Any]:
     if df_week.empty:
         return {"ok": True, "ranking": []}
-    s = df_week.groupby("driver")["dur_waiting"].mean().sort_values(ascending=True).head(top_n).round(1)
+    s = scorecard(df_week)["avg_wait_min"].sort_values(ascending=True).head(top_n).round(1)
     ranking = [{"driver": idx, "avg_wait_min": float(val)} for idx, val in s.items()]
     return {"ok": True, "ranking": ranking}
 
 # --------------- Plants / Projects -------------
 
+@cached()
 def cycle_by_plant(kpis: dict, period: Literal["today","week"]="today") -> Dict[str, Any]:
-    df = kpis["df_today"] if period == "today" else kpis["df_week"]
-    if df.empty:
+    win = kpis_window(kpis, period)
+    if win.empty:
         return {"ok": True, "rows": []}
-    s = df.groupby("origin_plant")["cycle_time"].mean().round(1).sort_values(ascending=True)
+    s = plant_cycle(win).round(1).sort_values(ascending=True)
     rows = [{"plant": p, "avg_cycle_min": float(v)} for p, v in s.items()]
     return {"ok": True, "period": period, "rows": rows}
 
-def rank_plants_by_cycle(df_week: pd.DataFrame) -> Dict[str, Any]:
+@cached()
+def rank_plants_by_cycle(df_week: Frame) -> Dict[str, Any]:
     if df_week.empty:
         return {"ok": True, "rows": []}
-    s = df_week.groupby("origin_plant")["cycle_time"].mean().round(1).sort_values()
+    s = plant_cycle(df_week).round(1).sort_values()
     rows = [{"plant": p, "avg_cycle_min": float(v)} for p, v in s.items()]
     return {"ok": True, "rows": rows}
 
-def projects_exceed_target_m3_per_load(df_week: pd.DataFrame, target: float = 7.6) -> Dict[str, Any]:
+@cached()
+def projects_exceed_target_m3_per_load(df_week: Frame, target: float = 7.6) -> Dict[str, Any]:
     if df_week.empty:
         return {"ok": True, "projects": []}
-    s = df_week.groupby("project")["load_volume_m3"].mean()
+    s = mean(window_rollup(df_week, "project"), "load_volume_m3")
     projects = [{"project": p, "avg_m3_per_load": float(v)} for p, v in s.items() if float(v) > target]
     return {"ok": True, "target": target, "projects": projects}
 
 # --------------- Routing / Distance ------------
 
-def distance_over_km(df_week: pd.DataFrame, km: float = 40.0) -> Dict[str, Any]:
+@cached()
+def distance_over_km(df_week: Frame, km: float = 40.0) -> Dict[str, Any]:
     if df_week.empty:
         return {"ok": True, "items": []}
-    sub = df_week[df_week["distance_km"] > km][["ticket_id","driver","origin_plant","job_site","distance_km"]]
-    items = sub.sort_values("distance_km", ascending=False).head(50).to_dict("records")
+    cols = ["ticket_id","driver","origin_plant","job_site","distance_km"]
+    items = _records(_top(df_week, cols, "distance_km", 50, over=("distance_km", km)))
     return {"ok": True, "km": km, "items": items}
 
 # --------------- ETA success / Wait compare ----
 
-def success_rate_within_eta(df_today: pd.DataFrame, tolerance_min: float = 10) -> Dict[str, Any]:
+@cached()
+def success_rate_within_eta(df_today: Frame, tolerance_min: float = 10) -> Dict[str, Any]:
+    df_today = _rows(df_today)
     if df_today.empty or "ETA" not in df_today or "actual_arrival" not in df_today:
         return {"ok": True, "rate_pct": 0.0, "counts": {"within": 0, "total": 0}}
     dif = (df_today["actual_arrival"] - df_today["ETA"]).dt.total_seconds().abs() / 60.0
@@ -121,47 +184,72 @@ def success_rate_within_eta(df_today: pd.DataFrame, tolerance_min: float = 10) -
     rate = (within / total * 100.0) if total else 0.0
     return {"ok": True, "rate_pct": round(rate, 1), "counts": {"within": within, "total": total}, "tolerance_min": tolerance_min}
 
-def wait_compare_today_vs_7day(df_today: pd.DataFrame, df_week: pd.DataFrame) -> Dict[str, Any]:
-    a = float(df_today["dur_waiting"].mean()) if not df_today.empty else 0.0
-    b = float(df_week["dur_waiting"].mean()) if not df_week.empty else 0.0
+@cached()
+def wait_compare_today_vs_7day(df_today: Frame, df_week: Frame) -> Dict[str, Any]:
+    a = float(mean(window_rollup(df_today, []), "dur_waiting").iloc[0]) if not df_today.empty else 0.0
+    b = float(mean(window_rollup(df_week, []), "dur_waiting").iloc[0]) if not df_week.empty else 0.0
     return {"ok": True, "avg_wait_today_min": round(a,1), "avg_wait_7day_min": round(b,1), "delta_min": round(a-b,1)}
 
 # --------------- Fuel L/km by day --------------
 
-def fuel_l_per_km_exceed_days(df_week: pd.DataFrame, threshold: float = 0.55) -> Dict[str, Any]:
+@cached()
+def fuel_l_per_km_exceed_days(df_week: Frame, threshold: float = 0.55) -> Dict[str, Any]:
     if df_week.empty:
         return {"ok": True, "days": []}
-    df = df_week.copy()
-    df["date"] = pd.to_datetime(df["start_time"]).dt.date
-    g = df.groupby("date")[["fuel_used_L","distance_km"]].sum()
-    g["L_per_km"] = g["fuel_used_L"] / g["distance_km"].replace(0, np.nan)
-    g = g[g["L_per_km"] > threshold].round(3)
-    days = [{"date": str(idx), "L_per_km": float(val)} for idx, val in g["L_per_km"].items()]
+    g = window_rollup(df_week, "date")
+    l_per_km = g["fuel_used_L"] / g["distance_km"].replace(0, np.nan)
+    g = l_per_km[l_per_km > threshold].round(3).rename("L_per_km").to_frame()
+    days = [{"date": f"{idx:%Y-%m-%d}", "L_per_km": float(val)} for idx, val in g["L_per_km"].items()]
     return {"ok": True, "threshold": threshold, "days": days}
 
 # --------------- Long cycles / anomalies -------
 
-def jobs_cycle_time_over(df_week: pd.DataFrame, minutes: float = 170.0, n: int = 10) -> Dict[str, Any]:
+@cached()
+def jobs_cycle_time_over(df_week: Frame, minutes: float = 170.0, n: int = 10) -> Dict[str, Any]:
     if df_week.empty:
         return {"ok": True, "items": []}
-    sub = df_week[df_week["cycle_time"] > minutes][["ticket_id","driver","origin_plant","job_site","cycle_time","distance_km","dur_waiting"]]
-    items = sub.sort_values("cycle_time", ascending=False).head(n).to_dict("records")
+    cols = ["ticket_id","driver","origin_plant","job_site","cycle_time","distance_km","dur_waiting"]
+    items = _records(_top(df_week, cols, "cycle_time", n, over=("cycle_time", minutes)))
     return {"ok": True, "minutes": minutes, "items": items, "count": len(items)}
 
+# --------------- Telematics samples ------------
+
+@cached()
+def signal_out_of_band(kpis: dict, signal: Literal["drum_rpm", "hydraulic_pressure"] = "drum_rpm",
+                       period: Literal["today", "week"] = "week", top_n: int = 5) -> Dict[str, Any]:
+    samples = kpis.get("samples")
+    if samples is None:
+        return {"ok": False, "error": "no telematics samples loaded"}
+    if signal not in BANDS:
+        return {"ok": False, "error": f"unknown signal: {signal}"}
+    tickets = kpis[f"df_{period}"]
+    summary = signal_summary(kpis, period)
+    oob_min = (summary[f"{signal}_low_s"].fillna(0) + summary[f"{signal}_high_s"].fillna(0)) / 60.0
+    worst = topn.top_n(
+        summary[[f"{signal}_min", f"{signal}_max", f"{signal}_mean"]]
+        .rename(columns=lambda c: c.removeprefix(f"{signal}_"))
+        .assign(truck=tickets["truck"].to_numpy(), out_of_band_min=oob_min),
+        "out_of_band_min", top_n,
+    ).round(1).reset_index()
+    worst = worst[worst["out_of_band_min"] > 0]
+    return {"ok": True, "signal": signal, "period": period, **out_of_band(summary, signal), "worst": _records(worst)}
+
 # --------------- Utilization “quick wins” ------
 
+@cached()
 def quick_wins_to_utilization(kpis: dict, target: float = 88.0) -> Dict[str, Any]:
     actual = float(kpis.get("utilization_pct") or 0.0)
     gap = max(0.0, target - actual)
     # Mine hotspots from today: top waiting hour + which plant has longest avg cycle
-    wb = wait_by_hour(kpis["df_today"])["series"]
-    top_hour = max(wb, key=lambda x: x["avg_wait_min"]) if wb else None
-
-    if not kpis["df_today"].empty:
-        plant_cycle = kpis["df_today"].groupby("origin_plant")["cycle_time"].mean().sort_values(ascending=False)
-        slowest_plant = {"plant": plant_cycle.index[0], "avg_cycle_min": float(round(plant_cycle.iloc[0],1))}
+    today = kpis_window(kpis, "today")
+    if not today.empty:
+        # same intermediates as wait_by_hour / cycle_by_plant("today")
+        wait = hourly_wait(today).round(1)
+        top_hour = {"hour": int(wait.idxmax()), "avg_wait_min": float(wait.max())}
+        cycle = plant_cycle(today).sort_values(ascending=False)
+        slowest_plant = {"plant": cycle.index[0], "avg_cycle_min": float(round(cycle.iloc[0],1))}
     else:
-        slowest_plant = None
+        top_hour = slowest_plant = None
 
     suggestions = []
     if top_hour:
@@ -0,0 +1,113 @@
+# topn.py – top-N rows without a full sort: partial selection in memory, a bounded heap over chunks
+import heapq
+from itertools import count
+
+import numpy as np
+import pandas as pd
+
+
+def _keys(values, ascending: bool) -> np.ndarray:
+    """float64 keys where smaller ranks first; NaN stays NaN."""
+    if isinstance(values, pd.Series):
+        v = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        v = np.asarray(values, dtype=np.float64)
+    return v if ascending else -v
+
+
+def top_positions(values: pd.Series | np.ndarray, n: int, ascending: bool = False) -> np.ndarray:
+    """
+    Positions of the first `n` rows of `values.sort_values(ascending=..., kind="stable")`
+    (ties in original order, NaN last), in rank order. O(len) plus O(n log n).
+    """
+    key = _keys(values, ascending)
+    if n <= 0 or not len(key):
+        return np.empty(0, dtype=np.int64)
+    valid = np.flatnonzero(~np.isnan(key))
+    if n < len(valid):
+        kth = np.partition(key[valid], n - 1)[n - 1]
+        better = valid[key[valid] < kth]
+        tied = valid[key[valid] == kth][: n - len(better)]  # stable: earliest ties win
+        chosen = np.concatenate([better, tied])
+    else:
+        chosen = valid
+    chosen = chosen[np.lexsort((chosen, key[chosen]))]
+    if len(chosen) < n:  # not enough values: NaN rows follow, as in sort_values
+        chosen = np.concatenate([chosen, np.flatnonzero(np.isnan(key))[: n - len(chosen)]])
+    return chosen
+
+
+def top_n(df: pd.DataFrame, order: str, n: int, *, ascending: bool = False,
+          cols: list[str] | None = None) -> pd.DataFrame:
+    """`df.sort_values(order, ascending=..., kind="stable").head(n)[cols]` by partial selection."""
+    out = df.iloc[top_positions(df[order], n, ascending)]
+    return out if cols is None else out[cols]
+
+
+class TopN:
+    """
+    Running top-`n` rows by `order` over frames fed one chunk at a time
+    (a multi-year archive read partition by partition).
+
+    Each chunk is cut to its own top `n` by partial selection, and only
+    rows beating the current n-th best are merged into a heap of at most
+    `n` rows, so memory is O(n) whatever the history size. Ties keep the
+    row seen first; NaN keys are skipped.
+    """
+
+    def __init__(self, order: str, n: int, *, ascending: bool = False, cols: list[str] | None = None):
+        self.order = order
+        self.n = n
+        self.ascending = ascending
+        self.cols = cols
+        self._heap: list[tuple] = []  # (rank key, -seq, row); heap[0] is the current worst
+        self._seq = count()
+        self._columns: list[str] | None = None
+        self._dtypes = None
+
+    def candidates(self, values: pd.Series | np.ndarray) -> np.ndarray:
+        """Positions in a chunk's `order` values that would enter the top rows, best first."""
+        pos = top_positions(values, self.n, self.ascending)
+        if len(self._heap) < self.n or not len(pos):
+            return pos
+        rank = -_keys(values, self.ascending)[pos]  # larger = better
+        return pos[rank > self._heap[0][0]]  # a tie with a row already held loses
+
+    def push(self, chunk: pd.DataFrame) -> None:
+        if chunk.empty or self.n <= 0:
+            return
+        best = chunk.iloc[self.candidates(chunk[self.order])]
+        keys = -_keys(best[self.order], self.ascending)  # larger = better
+        if self.cols is not None:
+            best = best[self.cols]
+        if self._columns is None:
+            self._columns = list(best.columns)
+            # categories differ between chunks: keep the kind, not the category list
+            self._dtypes = {c: "category" if isinstance(t, pd.CategoricalDtype) else t for c, t in best.dtypes.items()}
+        for k, row in zip(keys, best.itertuples(index=False, name=None)):
+            if np.isnan(k):
+                continue
+            item = (k, -next(self._seq), row)
+            if len(self._heap) < self.n:
+                heapq.heappush(self._heap, item)
+            elif item[:2] > self._heap[0][:2]:
+                heapq.heapreplace(self._heap, item)
+            else:
+                break  # `best` is ranked: the rest of the chunk is worse still
+
+    def result(self) -> pd.DataFrame:
+        """The top rows so far, best first."""
+        ranked = sorted(self._heap, key=lambda item: item[:2], reverse=True)
+        out = pd.DataFrame([row for *_, row in ranked], columns=self._columns or self.cols)
+        if self._dtypes is not None and len(out):
+            out = out.astype(self._dtypes)
+        return out
+
+
+def top_n_chunks(chunks, order: str, n: int, *, ascending: bool = False,
+                 cols: list[str] | None = None) -> pd.DataFrame:
+    """`top_n` of the concatenation of `chunks`, in one pass with O(n) memory."""
+    acc = TopN(order, n, ascending=ascending, cols=cols)
+    for chunk in chunks:
+        acc.push(chunk)
+    return acc.result()